@@ -95,23 +95,168 @@ const FRIENDSHIP_TYPES = {
 };
 
 /* --------------------------------------------------------------------------
-   題目資料（從 final_questions.json 動態載入）
+   題目資料（優先從 bundle/ 精簡分片載入，不存在時改讀 final_questions_new.json）
    -------------------------------------------------------------------------- */
 let QUESTIONS = [];
 
+/* 
+   抽題用的索引表與配額（由 scripts/sampling_plan.py 預先計算，
+   放在 bundle/manifest.json；未使用 bundle 時於載入後計算一次）
+*/
+let SAMPLING = null;
+
+/* 各題型的抽題比例（與 scripts/sampling_plan.py 的 TYPE_RATIOS 保持一致，順序即分配順序） */
+const TYPE_RATIOS = {
+  'detail-observation': 0.35,    // 細節觀察 -> 觀察力
+  'context-recall': 0.30,        // 情境回憶 -> 記憶力
+  'opinion-expression': 0.15,    // 評價觀點 -> 默契度
+  'action-motivation': 0.10,     // 行為動機 -> 同理心
+  'action-intention': 0.05,      // 行為意圖 -> 默契度
+  'preference-memory': 0.05      // 偏好記憶 -> 細心度
+};
+
+/**
+ * 計算題數 count 的各題型配額（與 scripts/sampling_plan.py 的 plan_quotas 相同）
+ * 前幾個題型取 floor(count × 比例)，最後一個題型分到剩餘名額；
+ * 題型題數不足時以 fill 從所有未選中的題目補足
+ * @param {number} count - 題數
+ * @param {Object} byType - 題型 → 索引陣列
+ * @returns {{types: Object, fill: number}}
+ */
+function planQuotas(count, byType) {
+  const types = {};
+  let allocated = 0;
+  let total = 0;
+  Object.values(byType).forEach(indices => { total += indices.length; });
+
+  const entries = Object.entries(TYPE_RATIOS);
+  entries.forEach(([type, ratio], index) => {
+    let wanted;
+    if (index === entries.length - 1) {
+      wanted = count - allocated;
+    } else {
+      wanted = Math.floor(count * ratio);
+      allocated += wanted;
+    }
+    types[type] = Math.min(wanted, (byType[type] || []).length);
+  });
+
+  const chosen = Object.values(types).reduce((sum, n) => sum + n, 0);
+  return { types, fill: Math.max(0, Math.min(count, total) - chosen) };
+}
+
+/**
+ * 建立依題型、難度分組的索引表（與 scripts/sampling_plan.py 的 sampling_tables 相同）
+ * @param {Array} questions - 依 ID 排序的題目
+ */
+function buildSamplingTables(questions) {
+  const byType = {};
+  const byDifficulty = {};
+  questions.forEach((q, i) => {
+    (byType[q.type] = byType[q.type] || []).push(i);
+    (byDifficulty[q.difficulty] = byDifficulty[q.difficulty] || []).push(i);
+  });
+  return { order: 'id', total: questions.length, byType, byDifficulty, ratios: TYPE_RATIOS, plans: {} };
+}
+
 /**
- * 從 final_questions.json 載入題目資料
+ * 將精簡訊息還原為 {date, time, datetime, user, content}
+ * （與 scripts/build_bundle.py 的 expand_message 相同）
+ */
+function expandMessage(row, date, users) {
+  if (!Array.isArray(row)) return row;
+  const msg = { date };
+  if (row.length > 2) {
+    msg.time = row[2];
+    msg.datetime = `${date} ${row[2]}`;
+  }
+  msg.user = users[row[0]];
+  msg.content = row[1];
+  return msg;
+}
+
+/**
+ * 將分片中的欄位陣列還原為完整題目
+ * （與 scripts/build_bundle.py 的 expand_question 相同）
+ */
+function expandQuestion(row, shard, manifest) {
+  const f = {};
+  manifest.fields.forEach((name, i) => { f[name] = row[i]; });
+  const type = f.type ?? shard.type;
+  const typeInfo = manifest.types[type];
+  return {
+    id: f.id,
+    type,
+    category: typeInfo.category,
+    dimension: typeInfo.dimension,
+    conversation: {
+      date: f.date,
+      context: f.messages.map(m => expandMessage(m, f.date, manifest.users)),
+      highlightIndex: f.highlightIndex
+    },
+    question: f.question,
+    options: f.options.map(([id, text]) => ({ id, text, isCorrect: id === f.correctAnswer })),
+    correctAnswer: f.correctAnswer,
+    explanation: f.explanation,
+    weight: f.weight,
+    difficulty: f.difficulty,
+    period: f.period ?? shard.period,
+    tags: f.tags.map(i => manifest.tags[i])
+  };
+}
+
+/**
+ * 從 bundle/ 載入所有分片（由 scripts/build_bundle.py 產生）
+ * @returns {Promise<Object|null>} {questions, sampling}；bundle 不存在時回傳 null
+ */
+async function loadQuestionBundle(baseUrl = './bundle/') {
+  const response = await fetch(`${baseUrl}manifest.json`);
+  if (!response.ok) return null;
+  const manifest = await response.json();
+  const shards = await Promise.all(manifest.shards.map(async shard => {
+    const res = await fetch(`${baseUrl}${shard.file}`);
+    if (!res.ok) throw new Error(`HTTP error! status: ${res.status} (${shard.file})`);
+    const rows = await res.json();
+    return rows.map(row => expandQuestion(row, shard, manifest));
+  }));
+  const questions = shards.flat().sort((a, b) => a.id - b.id);
+  // 分片與 manifest 來自不同次建立（例如部署到一半）時改讀完整題庫
+  if (questions.length !== manifest.total) {
+    throw new Error(`分片題數 ${questions.length} 與 manifest 的 ${manifest.total} 不符`);
+  }
+  return { questions, sampling: manifest.sampling || null };
+}
+
+/**
+ * 載入題目資料：優先使用 bundle/，不存在時改讀 final_questions_new.json
  * @returns {Promise<Array>} 題目陣列
  */
 async function loadQuestions() {
   try {
-    const response = await fetch('./final_questions_new.json');
-    if (!response.ok) {
-      throw new Error(`HTTP error! status: ${response.status}`);
+    let questions = null;
+    let sampling = null;
+    try {
+      const bundle = await loadQuestionBundle();
+      if (bundle) ({ questions, sampling } = bundle);
+    } catch (error) {
+      console.warn('⚠️ 載入精簡題庫失敗，改讀 final_questions_new.json:', error);
+    }
+    if (!questions) {
+      const response = await fetch('./final_questions_new.json');
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      const data = await response.json();
+      // 兼容两种格式：数组格式 或 {questions: [...]} 对象格式
+      questions = Array.isArray(data) ? data : data.questions;
+      questions = [...questions].sort((a, b) => a.id - b.id);
     }
-    const data = await response.json();
-    // 兼容两种格式：数组格式 或 {questions: [...]} 对象格式
-    QUESTIONS = Array.isArray(data) ? data : data.questions;
+    QUESTIONS = questions;
+    // 索引表對應依 ID 排序的題目；bundle 由 merge_ai_questions.py / question_store.py export
+    // 依來源題庫的雜湊自動重建，這裡只防範索引表與題目不一致的情況
+    SAMPLING = sampling && sampling.total === QUESTIONS.length
+      ? sampling
+      : buildSamplingTables(QUESTIONS);
     console.log(`✅ 成功載入 ${QUESTIONS.length} 道題目`);
     return QUESTIONS;
   } catch (error) {
@@ -298,6 +443,8 @@ class DataParser {
    -------------------------------------------------------------------------- */
 export { 
   QUESTIONS, 
+  SAMPLING,
+  TYPE_RATIOS,
   DIMENSIONS, 
   QUESTION_TYPES, 
   STAGES, 
@@ -306,5 +453,7 @@ export {
   MEMORY_PROFILE_TEMPLATES,
   DIMENSION_MAX_SCORES,
   DataParser,
-  loadQuestions
+  loadQuestions,
+  loadQuestionBundle,
+  planQuotas
 };
@@ -14,9 +14,41 @@ import {
   FRIENDSHIP_TYPES,
   MEMORY_PROFILE_TEMPLATES,
   DIMENSION_MAX_SCORES,
-  loadQuestions
+  SAMPLING,
+  loadQuestions,
+  planQuotas
 } from './data.js';
 
+/* --------------------------------------------------------------------------
+   不重複隨機抽樣類別
+   Fisher–Yates 洗牌只做到需要的前 k 個位置，被交換過的位置記在 Map 中，
+   因此抽 k 個只需 O(k) 時間，不必複製或洗整個陣列
+   -------------------------------------------------------------------------- */
+class PartialShuffle {
+  constructor(items) {
+    this.items = items;
+    this.swapped = new Map();
+    this.drawn = 0;
+  }
+
+  get remaining() {
+    return this.items.length - this.drawn;
+  }
+
+  at(position) {
+    return this.swapped.has(position) ? this.swapped.get(position) : this.items[position];
+  }
+
+  // 從尚未抽出的項目中等機率抽出一個
+  draw() {
+    const i = this.drawn + Math.floor(Math.random() * this.remaining);
+    const picked = this.at(i);
+    this.swapped.set(i, this.at(this.drawn));
+    this.drawn++;
+    return picked;
+  }
+}
+
 /* --------------------------------------------------------------------------
    遊戲狀態管理類別
    -------------------------------------------------------------------------- */
@@ -734,57 +766,38 @@ class FriendshipMemoryGame {
   }
 
   // 隨機選取題目（分層隨機抽樣）
+  // 使用預先計算的題型索引表與配額，每個題型以 Fisher–Yates 抽出配額，
+  // 不足的名額再從所有未選中的題目中等機率補足
   randomSelectQuestions(count) {
-    const result = [];
-
-    // 如果請求的題目數超過題庫總數，直接返回全部題目
+    // 如果請求的題目數超過題庫總數，直接返回全部題目（洗牌）
     if (count >= QUESTIONS.length) {
-      return [...QUESTIONS].sort(() => Math.random() - 0.5);
+      const all = new PartialShuffle(QUESTIONS);
+      return QUESTIONS.map(() => all.draw());
     }
 
-    // 新的題目類型對應（移除了 emotion-understanding 和 interaction-pattern）
-    // 新增了 opinion-expression、action-motivation、action-intention
-    const typeRatios = {
-      'detail-observation': 0.35,    // 細節觀察 -> 觀察力
-      'context-recall': 0.30,        // 情境回憶 -> 記憶力
-      'opinion-expression': 0.15,    // 評價觀點 -> 默契度
-      'action-motivation': 0.10,     // 行為動機 -> 同理心
-      'action-intention': 0.05,      // 行為意圖 -> 默契度
-      'preference-memory': 0.05      // 偏好記憶 -> 細心度
-    };
-
-    // 使用 Math.floor 避免四捨五入導致總數超出
-    let allocated = 0;
-    const typeSelections = [];
+    const plan = SAMPLING.plans[count] || planQuotas(count, SAMPLING.byType);
+    const pools = Object.entries(SAMPLING.byType).map(([type, indices]) => ({
+      type,
+      shuffle: new PartialShuffle(indices)
+    }));
+    const poolByType = Object.fromEntries(pools.map(pool => [pool.type, pool]));
 
-    Object.entries(typeRatios).forEach(([type, ratio], index, arr) => {
-      const typeQuestions = QUESTIONS.filter(q => q.type === type);
-
-      // 最後一個類型分配剩餘所有名額，避免四捨五入誤差
-      let selectCount;
-      if (index === arr.length - 1) {
-        selectCount = count - allocated;
-      } else {
-        selectCount = Math.floor(count * ratio);
-        allocated += selectCount;
+    const result = [];
+    Object.entries(plan.types).forEach(([type, quota]) => {
+      for (let i = 0; i < quota; i++) {
+        result.push(QUESTIONS[poolByType[type].shuffle.draw()]);
       }
-
-      // Fisher-Yates 洗牌
-      const shuffled = [...typeQuestions].sort(() => Math.random() - 0.5);
-      typeSelections.push(...shuffled.slice(0, Math.min(selectCount, shuffled.length)));
     });
 
-    result.push(...typeSelections);
-
-    // 如果結果不足（某些類型題目數不夠），從所有未選中的題目中隨機補充
-    while (result.length < count) {
-      const remaining = QUESTIONS.filter(q => !result.includes(q));
-      if (remaining.length === 0) break;
-      const randomQ = remaining[Math.floor(Math.random() * remaining.length)];
-      result.push(randomQ);
+    // 補足：依各題型剩餘題數加權選出題型，等同於從所有未選中的題目中等機率抽取
+    let remaining = pools.reduce((sum, pool) => sum + pool.shuffle.remaining, 0);
+    for (let i = 0; i < plan.fill && remaining > 0; i++, remaining--) {
+      let r = Math.floor(Math.random() * remaining);
+      const pool = pools.find(p => (r -= p.shuffle.remaining) < 0);
+      result.push(QUESTIONS[pool.shuffle.draw()]);
     }
 
-    return result.slice(0, count);
+    return result;
   }
 
   startGame() {
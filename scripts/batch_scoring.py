@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NumPy 批次視窗評分
+將一批日期的訊息遮罩打包成 (訊息數 × 64 位元字組) 矩陣，以逐列 OR 一次算出
+所有 2-5 則訊息視窗的分數，再依日期取最高分視窗；結果與 WindowScorer.best_window 相同
+"""
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 為選用套件，未安裝時只能使用純 Python 評分
+    np = None
+
+from window_scoring import LENGTH_MAJOR, MIN_WINDOW, MAX_WINDOW, WINDOW_BONUS, QUESTION_BONUS
+
+PYTHON_BACKEND = 'python'
+NUMPY_BACKEND = 'numpy'
+BACKENDS = (PYTHON_BACKEND, NUMPY_BACKEND)
+
+# 批次評分每個工作單元的日期數（較大的批次才能攤平 NumPy 的呼叫成本）
+BATCH_CHUNK_SIZE = 1024
+
+
+def numpy_available():
+    return np is not None
+
+
+def check_backend(backend):
+    """確認評分後端可用，否則拋出 ValueError"""
+    if backend not in BACKENDS:
+        raise ValueError(f'無效的評分後端: {backend}，請選擇 {list(BACKENDS)}')
+    if backend == NUMPY_BACKEND and np is None:
+        raise ValueError('numpy 評分後端需要安裝 NumPy（pip install numpy）')
+
+
+def _popcount(words):
+    """每列的位元數總和"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+    return np.unpackbits(words.view(np.uint8), axis=1).sum(axis=1, dtype=np.int64)
+
+
+class BatchWindowScorer:
+    """WindowScorer 的 NumPy 批次版本"""
+
+    def __init__(self, scorer):
+        check_backend(NUMPY_BACKEND)
+        self.scorer = scorer
+        self.words = max(1, (len(scorer.bits) + 63) // 64)
+        self._level_masks = [self._pack([level]) for level in scorer._level_masks]
+        self._question_mask = self._pack([scorer._question_mask])
+
+    def _pack(self, masks):
+        """Python 整數遮罩 → (列數 × 字組數) uint64 矩陣"""
+        size = self.words * 8
+        buffer = b''.join(mask.to_bytes(size, 'little') for mask in masks)
+        return np.frombuffer(buffer, dtype='<u8').reshape(len(masks), self.words)
+
+    def _scores(self, acc):
+        """視窗遮罩矩陣的分數（含問號與視窗長度加分）"""
+        scores = np.full(len(acc), WINDOW_BONUS, dtype=np.int64)
+        for level in self._level_masks:
+            scores += _popcount(acc & level)
+        scores += QUESTION_BONUS * (acc & self._question_mask).any(axis=1)
+        return scores
+
+    def best_windows(self, day_masks, order=LENGTH_MAJOR):
+        """
+        一次評分多個日期，回傳與 day_masks 對應的
+        (分數, 起點, 長度, 遮罩) 列表；訊息不足 2 則的日期為 None
+        """
+        counts = [len(masks) for masks in day_masks]
+        flat = [mask for masks in day_masks for mask in masks]
+        total = len(flat)
+        results = [None] * len(day_masks)
+        if total < MIN_WINDOW:
+            return results
+
+        packed = self._pack(flat)
+        day_ids = np.repeat(np.arange(len(day_masks)), counts)
+        lengths = range(MIN_WINDOW, MAX_WINDOW + 1)
+
+        # 排序鍵 = 分數 × span + (span - 1 - 列舉序)：同分時列舉序較前者鍵值較大
+        span = total * len(lengths) + 1
+        keys = np.full((total, len(lengths)), -1, dtype=np.int64)
+        starts = np.arange(total, dtype=np.int64)
+        acc = packed
+        for i, length in enumerate(lengths):
+            count = total - length + 1
+            if count <= 0:
+                break
+            acc = acc[:count] | packed[length - 1:]
+            valid = day_ids[:count] == day_ids[length - 1:]
+            if order == LENGTH_MAJOR:
+                rank = i * total + starts[:count]
+            else:
+                rank = starts[:count] * len(lengths) + i
+            key = self._scores(acc) * span + (span - 1 - rank)
+            keys[:count, i] = np.where(valid, key, -1)
+
+        row_best = keys.max(axis=1)
+        day_starts = np.cumsum([0] + counts[:-1])
+        scored = [d for d, count in enumerate(counts) if count >= MIN_WINDOW]
+        if not scored:
+            return results
+        # 跨日視窗的鍵值為 -1，因此各日期的區段最大值只會來自當日視窗
+        day_best = np.maximum.reduceat(row_best, day_starts[scored])
+
+        for d, key in zip(scored, day_best.tolist()):
+            score, remainder = divmod(key, span)
+            rank = span - 1 - remainder
+            if order == LENGTH_MAJOR:
+                i, start = divmod(rank, total)
+            else:
+                start, i = divmod(rank, len(lengths))
+            length = lengths[i]
+            mask = 0
+            for m in flat[start:start + length]:
+                mask |= m
+            results[d] = (score, start - int(day_starts[d]), length, mask)
+        return results
+
+
+_BATCH_SCORERS = {}
+
+
+def best_windows(scorer, day_masks, order=LENGTH_MAJOR, backend=PYTHON_BACKEND):
+    """依指定後端找出每個日期的最高分視窗；python 後端為逐日呼叫 best_window 的基準實作"""
+    if backend == PYTHON_BACKEND:
+        return [scorer.best_window(masks, order=order) for masks in day_masks]
+    batch = _BATCH_SCORERS.get(id(scorer))
+    if batch is None or batch.scorer is not scorer:
+        batch = _BATCH_SCORERS[id(scorer)] = BatchWindowScorer(scorer)
+    return batch.best_windows(day_masks, order)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+平行評分效能測試
+比較不同行程數下 browse_dates 與 extract_snippets 的評分時間，並確認結果與單行程一致
+"""
+
+import os
+import time
+import argparse
+from browse_dates import iter_scored_days, is_valid_message
+from extract_snippets import extract_snippets
+from chat_stream import iter_messages, iter_days
+from parallel import DEFAULT_CHUNK_SIZE
+
+
+def run_browse_scoring(filename, jobs, chunk_size):
+    """執行 browse_dates 的逐日評分（不使用快取），回傳結果列表"""
+    days = ((date, msgs) for date, msgs in iter_days(iter_messages(filename), keep=is_valid_message)
+            if len(msgs) >= 2)
+    return [(date, score, start, length)
+            for date, _, score, _, start, length in iter_scored_days(days, None, jobs, chunk_size)]
+
+
+def run_extract(filename, jobs):
+    """執行 extract_snippets，回傳挑選結果的摘要"""
+    return [(s['date'], s['score']) for s in extract_snippets(filename, 12, jobs)]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    """主執行流程"""
+    parser = argparse.ArgumentParser(description='平行評分效能測試')
+    parser.add_argument('file', help='原始對話資料（raw_data/chat_*.json）')
+    parser.add_argument('--jobs', default=f'1,4,{os.cpu_count() or 1}',
+                        help='要比較的行程數，以逗號分隔')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='每個工作單元的日期數')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='每種設定重複次數（取最快一次）')
+    args = parser.parse_args()
+
+    job_counts = sorted({max(1, int(j)) for j in args.jobs.split(',')})
+
+    print('=' * 80)
+    print(f'平行評分效能測試 - {args.file}')
+    print('=' * 80)
+    print()
+
+    for name, runner in [
+        ('browse_dates 評分', lambda jobs: run_browse_scoring(args.file, jobs, args.chunk_size)),
+        ('extract_snippets', lambda jobs: run_extract(args.file, jobs)),
+    ]:
+        print(f'{name}:')
+        baseline_time = None
+        baseline_result = None
+        for jobs in job_counts:
+            best = None
+            for _ in range(args.repeat):
+                elapsed, result = timed(runner, jobs)
+                best = elapsed if best is None else min(best, elapsed)
+
+            if baseline_result is None:
+                baseline_time, baseline_result = best, result
+            consistent = '✓' if result == baseline_result else '✗ 結果不一致'
+            print(f'  {jobs:>3} 行程: {best:7.3f} 秒  加速 {baseline_time / best:5.2f}x  {consistent}')
+        print()
+
+
+if __name__ == '__main__':
+    main()
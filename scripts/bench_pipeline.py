@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+挑選流程效能測試
+以 synthetic_chat.py 產生指定規模的合成對話，量測 filter_valid_messages、score_conversation、
+score_date 的累計耗時，以及 extract_snippets 與 browse_dates 的完整執行時間與記憶體峰值，
+結果寫成 JSON；指定 --baseline 時與先前的結果比較並標示變慢的階段
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import argparse
+from datetime import datetime
+
+from browse_dates import browse_dates, filter_valid_messages, score_date, PERIOD_FILES
+from extract_snippets import extract_snippets, score_conversation
+from chat_stream import iter_messages, iter_days
+from question_store import write_json_atomic
+from synthetic_chat import write_corpus, parse_count, add_corpus_arguments, corpus_options
+
+try:
+    import resource
+except ImportError:  # Windows 沒有 resource 模組，max_rss_kb 記為 None
+    resource = None
+
+BENCH_DIR = 'bench'
+RESULTS_VERSION = 1
+DEFAULT_SIZES = '10k,100k'
+DEFAULT_TOLERANCE = 0.2   # 比基準慢超過 20% 視為退步
+
+# 逐日呼叫的函式（同一次串流讀取中分別累計耗時），以及完整執行的流程
+DAY_STAGES = ('filter_valid_messages', 'score_conversation', 'score_date')
+END_TO_END_STAGES = ('extract_snippets', 'browse_dates')
+STAGES = DAY_STAGES + END_TO_END_STAGES
+
+
+def format_count(count):
+    for scale, suffix in ((1_000_000, 'm'), (1_000, 'k')):
+        if count >= scale and count % scale == 0:
+            return f'{count // scale}{suffix}'
+    return str(count)
+
+
+def format_bytes(size):
+    if size >= 1024 * 1024:
+        return f'{size / 1024 / 1024:.1f} MB'
+    return f'{size / 1024:.1f} KB'
+
+
+def corpus_files(corpus_dir):
+    return [os.path.join(corpus_dir, path) for path in PERIOD_FILES.values()
+            if os.path.exists(os.path.join(corpus_dir, path))]
+
+
+def prepare_corpus(root, size, seed, options, regenerate=False):
+    """產生（或沿用參數相同的）合成對話，回傳 (目錄, 統計, 產生耗時)"""
+    corpus_dir = os.path.join(root, 'corpus', f'{format_count(size)}_seed{seed}')
+    params_path = os.path.join(corpus_dir, 'params.json')
+    params = {'size': size, 'seed': seed, **options}
+    if not regenerate:
+        try:
+            with open(params_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved['params'] == params:
+                return corpus_dir, saved['stats'], None
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+
+    start = time.perf_counter()
+    stats = write_corpus(corpus_dir, size, seed, **options)
+    elapsed = time.perf_counter() - start
+    # 參數檔最後寫入：產生到一半中斷時下次會重新產生
+    write_json_atomic(params_path, {'params': params, 'stats': stats}, indent=2)
+    return corpus_dir, stats, elapsed
+
+
+def run_day_stages(files, stages, trace_memory=False):
+    """
+    串流讀取所有時期檔案，逐日呼叫各函式並分別累計耗時（不含讀取與解析）
+    回傳 {階段: {'seconds', 'cpu_seconds', 'items', 'peak_bytes'}}；
+    trace_memory 時記錄單次呼叫的記憶體峰值（相對於呼叫前）
+    """
+    wall = dict.fromkeys(stages, 0.0)
+    cpu = dict.fromkeys(stages, 0.0)
+    peak = dict.fromkeys(stages, 0)
+    items = dict.fromkeys(stages, 0)
+    clock, cpu_clock = time.perf_counter, time.process_time
+
+    def call(stage, func, arg):
+        if trace_memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        t0, c0 = clock(), cpu_clock()
+        result = func(arg)
+        wall[stage] += clock() - t0
+        cpu[stage] += cpu_clock() - c0
+        if trace_memory:
+            peak[stage] = max(peak[stage], tracemalloc.get_traced_memory()[1] - before)
+        return result
+
+    for path in files:
+        for _, day_msgs in iter_days(iter_messages(path)):
+            valid = day_msgs
+            if 'filter_valid_messages' in wall:
+                valid = call('filter_valid_messages', filter_valid_messages, day_msgs)
+                items['filter_valid_messages'] += len(day_msgs)
+            if len(valid) < 2:
+                continue
+            if 'score_conversation' in wall:
+                call('score_conversation', score_conversation, valid)
+                items['score_conversation'] += 1
+            if 'score_date' in wall:
+                call('score_date', score_date, valid)
+                items['score_date'] += 1
+
+    return {stage: {'seconds': wall[stage], 'cpu_seconds': cpu[stage], 'items': items[stage],
+                    'unit': 'messages' if stage == 'filter_valid_messages' else 'days',
+                    'peak_bytes': peak[stage] if trace_memory else None}
+            for stage in stages}
+
+
+def run_extract(corpus_dir, jobs):
+    for path in corpus_files(corpus_dir):
+        extract_snippets(path, 12, jobs)
+
+
+def run_browse(corpus_dir, jobs):
+    """在合成資料目錄中執行 browse_dates（所有時期，不使用快取、不排除已使用日期）"""
+    cwd = os.getcwd()
+    os.chdir(corpus_dir)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            browse_dates('all', limit=20, exclude_used=False, use_cache=False, jobs=jobs)
+    finally:
+        os.chdir(cwd)
+
+
+def run_end_to_end(stage, corpus_dir, jobs, trace_memory=False):
+    runner = run_extract if stage == 'extract_snippets' else run_browse
+    if trace_memory:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+    t0, c0 = time.perf_counter(), time.process_time()
+    runner(corpus_dir, jobs)
+    result = {'seconds': time.perf_counter() - t0, 'cpu_seconds': time.process_time() - c0,
+              'peak_bytes': None}
+    if trace_memory:
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1] - before
+    return result
+
+
+def measure(corpus_dir, messages, stages, jobs, repeat, trace_memory):
+    """各階段重複 repeat 次取最快者；記憶體另外以 tracemalloc 執行一次（追蹤會拖慢速度）"""
+    files = corpus_files(corpus_dir)
+    day_stages = [s for s in stages if s in DAY_STAGES]
+    runs = {stage: [] for stage in stages}
+
+    for _ in range(repeat):
+        if day_stages:
+            for stage, result in run_day_stages(files, day_stages).items():
+                runs[stage].append(result)
+        for stage in stages:
+            if stage in END_TO_END_STAGES:
+                runs[stage].append(dict(run_end_to_end(stage, corpus_dir, jobs),
+                                        items=messages, unit='messages'))
+
+    peaks = {}
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            if day_stages:
+                peaks.update((stage, result['peak_bytes'])
+                             for stage, result in run_day_stages(files, day_stages, True).items())
+            for stage in stages:
+                if stage in END_TO_END_STAGES:
+                    peaks[stage] = run_end_to_end(stage, corpus_dir, jobs, True)['peak_bytes']
+        finally:
+            tracemalloc.stop()
+
+    results = {}
+    for stage, stage_runs in runs.items():
+        best = min(stage_runs, key=lambda r: r['seconds'])
+        results[stage] = {
+            'seconds': best['seconds'],
+            'cpu_seconds': best['cpu_seconds'],
+            'seconds_all': [r['seconds'] for r in stage_runs],
+            'items': best['items'],
+            'unit': best['unit'],
+            'per_second': best['items'] / best['seconds'] if best['seconds'] else None,
+            'peak_bytes': peaks.get(stage),
+        }
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """與基準結果比較，回傳 [(規模, 階段, 基準秒數, 本次秒數, 倍率)] 中變慢超過容許值者，並列印比較表"""
+    base_runs = {run['size']: run['stages'] for run in baseline.get('runs', [])}
+    regressions = []
+    print(f"與基準比較（{baseline.get('created', '?')}，commit {baseline.get('commit') or '?'}）：")
+    for run in results['runs']:
+        base = base_runs.get(run['size'])
+        if base is None:
+            continue
+        for stage, result in run['stages'].items():
+            if stage not in base:
+                continue
+            old, new = base[stage]['seconds'], result['seconds']
+            ratio = new / old if old else float('inf')
+            mark = '✗' if ratio > 1 + tolerance else '✓'
+            if mark == '✗':
+                regressions.append((run['size'], stage, old, new, ratio))
+            print(f"  {mark} {format_count(run['size']):>5} {stage:<24}{old:9.3f} → {new:9.3f} 秒  {ratio:5.2f}x")
+    print()
+    return regressions
+
+
+def main():
+    """主執行流程"""
+    parser = argparse.ArgumentParser(description='以合成對話量測挑選流程的效能')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help='訊息規模，以逗號分隔（例如 10k,100k,1m,10m）')
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help=f'要量測的階段，以逗號分隔（{", ".join(STAGES)}）')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='每個階段重複次數（取最快一次）')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='extract_snippets 與 browse_dates 的行程數')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='不量測記憶體峰值（省去 tracemalloc 的額外一輪）')
+    parser.add_argument('--workdir', default=BENCH_DIR,
+                        help='合成資料與結果的目錄')
+    parser.add_argument('--regenerate', action='store_true',
+                        help='即使參數相同也重新產生合成資料')
+    parser.add_argument('--output',
+                        help='結果 JSON（預設為 <workdir>/results/<時間>.json）')
+    parser.add_argument('--baseline',
+                        help='先前的結果 JSON，比較並在變慢超過 --tolerance 時以狀態碼 1 結束')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='容許的變慢比例')
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        sizes = [parse_count(size) for size in args.sizes.split(',') if size.strip()]
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f'無效的階段: {", ".join(unknown)}')
+    options = corpus_options(args)
+
+    print('=' * 80)
+    print('挑選流程效能測試')
+    print('=' * 80)
+    print()
+
+    results = {
+        'version': RESULTS_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': {'seed': args.seed, **options, 'repeat': args.repeat, 'jobs': args.jobs},
+        'runs': [],
+    }
+
+    for size in sizes:
+        corpus_dir, stats, generate_seconds = prepare_corpus(args.workdir, size, args.seed, options,
+                                                             args.regenerate)
+        if generate_seconds is None:
+            print(f'{format_count(size)} 則訊息（沿用 {corpus_dir}）')
+        else:
+            print(f'{format_count(size)} 則訊息（產生 {corpus_dir}，{generate_seconds:.1f} 秒）')
+        print(f"  {stats['days']:,} 天，{format_bytes(stats['bytes'])}")
+
+        stage_results = measure(corpus_dir, stats['messages'], stages, args.jobs, args.repeat,
+                                not args.no_memory)
+        for stage, result in stage_results.items():
+            memory = (f"  峰值 {format_bytes(result['peak_bytes']):>10}"
+                      if result['peak_bytes'] is not None else '')
+            print(f"  {stage:<24}{result['seconds']:9.3f} 秒"
+                  f"  {result['per_second']:12,.0f} {result['unit']}/秒{memory}")
+        print()
+
+        results['runs'].append({
+            'size': size,
+            'corpus': {'messages': stats['messages'], 'days': stats['days'], 'bytes': stats['bytes'],
+                       'generate_seconds': generate_seconds},
+            'stages': stage_results,
+        })
+
+    results['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+    if args.jobs > 1 and not args.no_memory:
+        print('⊙ jobs > 1 時子行程的記憶體不計入峰值')
+        print()
+
+    output = args.output or os.path.join(args.workdir, 'results',
+                                         datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    write_json_atomic(output, results, indent=2)
+    print(f'✓ 結果已保存至: {output}')
+    print()
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f'✗ {len(regressions)} 個階段比基準慢超過 {args.tolerance:.0%}')
+            sys.exit(1)
+        print('✓ 沒有變慢的階段')
+
+
+if __name__ == '__main__':
+    main()
@@ -5,40 +5,84 @@
 幫助使用者從原始資料中探索並挑選日期
 """
 
+import os
+import re
 import json
+import time
+import heapq
 import argparse
+from functools import partial
 from collections import defaultdict
-from extract_snippets import score_conversation, KEYWORDS
+from extract_snippets import score_conversation, KEYWORDS, WINDOW_SCORER
+from window_scoring import LENGTH_MAJOR, window_count
+from chat_stream import iter_messages, iter_days
+from score_cache import ScoreCache, messages_digest
+from parallel import imap_chunks, resolve_jobs, DEFAULT_CHUNK_SIZE
+from snapshot import open_snapshot
+from batch_scoring import (best_windows, check_backend, BACKENDS, PYTHON_BACKEND,
+                           NUMPY_BACKEND, BATCH_CHUNK_SIZE)
+from message_filter import MessageFilter
+from near_duplicates import (LSHIndex, build_bank_index, load_questions, signature,
+                             DEFAULT_THRESHOLD as NEAR_DUP_THRESHOLD)
+from tag_index import load_tag_index, parse_tag_expression, matches_expression, expression_terms
+from instrumentation import PROFILER, ProfileSession, add_profile_arguments
+
+
+PERIOD_FILES = {
+    '2019-2020': 'raw_data/chat_2019_2020.json',
+    '2021-2022': 'raw_data/chat_2021_2022.json',
+    '2023-2025': 'raw_data/chat_2023_2025.json'
+}
+
+# 目前使用的訊息過濾器（--media-marker 可加入額外的媒體標記）
+MESSAGE_FILTER = MessageFilter()
+
+
+def period_file(period):
+    """取得時期對應的原始資料檔"""
+    if period not in PERIOD_FILES:
+        raise ValueError(f"無效時期: {period}，請選擇 {list(PERIOD_FILES.keys())}")
+    return PERIOD_FILES[period]
 
 
 def load_raw_data(period):
     """載入原始對話資料"""
-    files = {
-        '2019-2020': 'raw_data/chat_2019_2020.json',
-        '2021-2022': 'raw_data/chat_2021_2022.json',
-        '2023-2025': 'raw_data/chat_2023_2025.json'
-    }
+    with open(period_file(period), 'r', encoding='utf-8') as f:
+        return json.load(f)
 
-    if period not in files:
-        raise ValueError(f"無效時期: {period}，請選擇 {list(files.keys())}")
 
-    with open(files[period], 'r', encoding='utf-8') as f:
-        return json.load(f)
+def iter_period_days(period, dates=None, message_filter=None):
+    """
+    逐日產生 (日期, 有效訊息列表)；有最新的二進位快照時直接讀取快照，否則串流解析 JSON
+    dates: 只產生這些日期（快照可直接跳過其餘日期）
+    message_filter: 訊息過濾器，預設為 MESSAGE_FILTER
+    """
+    keep = PROFILER.timed_call('過濾訊息', message_filter or MESSAGE_FILTER)
+    source = period_file(period)
+    snapshot = open_snapshot(source)
+    if snapshot is not None:
+        return PROFILER.timed_iter('讀取快照', snapshot.iter_days(keep=keep, dates=dates))
+    messages = PROFILER.timed_iter('解析 JSON', iter_messages(source))
+    days = PROFILER.timed_iter('分組', iter_days(messages, keep=keep))
+    if dates is None:
+        return days
+    return ((date, messages) for date, messages in days if date in dates)
+
+
+def is_valid_message(m):
+    """判斷單則訊息是否有效"""
+    return MESSAGE_FILTER(m)
 
 
 def filter_valid_messages(messages):
     """過濾無效訊息"""
-    valid = []
-    for m in messages:
-        content = m.get('content', '')
-        if (content and
-            '[照片]' not in content and
-            '[貼圖]' not in content and
-            '[影片]' not in content and
-            '☎' not in content and
-            len(content) > 1):
-            valid.append(m)
-    return valid
+    return MESSAGE_FILTER.filter(messages)
+
+
+def set_media_markers(markers):
+    """加入額外的媒體標記（例如 [檔案]、[語音訊息]）"""
+    global MESSAGE_FILTER
+    MESSAGE_FILTER = MessageFilter(markers)
 
 
 def group_by_date(messages):
@@ -49,28 +93,184 @@ def group_by_date(messages):
     return by_date
 
 
+def score_date_window(messages):
+    """評分單個日期的對話，回傳 (分數, 標籤, 片段起點, 片段長度)"""
+    # 找最佳片段（每則訊息只比對一次，視窗分數由相鄰訊息合併）
+    masks = WINDOW_SCORER.masks(messages)
+    best = WINDOW_SCORER.best_window(masks, order=LENGTH_MAJOR)
+    return _window_result(messages, best)
+
+
+def _window_result(messages, best):
+    """由最高分視窗整理出 (分數, 標籤, 片段起點, 片段長度)"""
+    if best is None:
+        start_idx, length = 0, min(4, len(messages))
+        best_score, tags = score_conversation(messages[:length])
+    else:
+        best_score, start_idx, length, mask = best
+        tags = WINDOW_SCORER.mask_tags(mask)
+
+    return best_score, list(tags), start_idx, length
+
+
 def score_date(messages):
     """評分單個日期的對話"""
-    # 找最佳片段
-    best_score = -1
-    best_snippet = None
-
-    for length in range(2, min(6, len(messages) + 1)):
-        for start_idx in range(len(messages) - length + 1):
-            snippet = messages[start_idx:start_idx + length]
-            score, tags = score_conversation(snippet)
-
-            if score > best_score:
-                best_score = score
-                best_snippet = snippet
-
-    if best_snippet is None:
-        best_snippet = messages[:min(4, len(messages))]
-        best_score, tags = score_conversation(best_snippet)
-    else:
-        _, tags = score_conversation(best_snippet)
+    score, tags, start_idx, length = score_date_window(messages)
+    return score, tags, messages[start_idx:start_idx + length]
+
+
+def _score_chunk(chunk, backend=PYTHON_BACKEND):
+    """行程池工作單元：評分一批日期（None 表示已有快取結果）"""
+    if backend == PYTHON_BACKEND:
+        return [score_date_window(messages) if messages is not None else None
+                for messages in chunk]
+
+    pending = [messages for messages in chunk if messages is not None]
+    bests = iter(best_windows(WINDOW_SCORER, [WINDOW_SCORER.masks(m) for m in pending],
+                              LENGTH_MAJOR, backend))
+    return [_window_result(messages, next(bests)) if messages is not None else None
+            for messages in chunk]
+
+
+def iter_scored_days(days, cache=None, jobs=1, chunk_size=None, backend=PYTHON_BACKEND):
+    """
+    為 (日期, 訊息列表) 串流評分，依輸入順序產生
+    (日期, 訊息列表, 分數, 標籤, 片段起點, 片段長度)
+
+    內容未變動的日期直接沿用快取；jobs > 1 時以行程池平行評分其餘日期。
+    backend 為 numpy 時每批日期一次以矩陣運算評分，結果與純 Python 相同。
+    """
+    if chunk_size is None:
+        chunk_size = BATCH_CHUNK_SIZE if backend == NUMPY_BACKEND else DEFAULT_CHUNK_SIZE
+
+    def lookup():
+        for date, messages in days:
+            digest = entry = None
+            if cache is not None:
+                digest = messages_digest(messages)
+                entry = cache.get(date, digest)
+            yield date, messages, digest, entry
+
+    pending = PROFILER.timed_iter('快取查詢', lookup()) if cache is not None else lookup()
+    payload = lambda item: None if item[3] is not None else item[1]
+    profiling = PROFILER.enabled
+    for (date, messages, digest, entry), result in PROFILER.timed_iter('評分', imap_chunks(
+            partial(_score_chunk, backend=backend), pending, jobs, chunk_size, payload)):
+        if entry is not None:
+            score, tags = entry['score'], entry['tags']
+            start, length = entry['start'], entry['length']
+        else:
+            score, tags, start, length = result
+            if cache is not None:
+                cache.put(date, digest, score, tags, start, length, len(messages))
+            if profiling:
+                PROFILER.count('評分日期')
+                PROFILER.count('評分視窗', window_count(len(messages)))
+        yield date, messages, score, tags, start, length
+
+
+def iter_candidate_days(period, used_dates, stats, dates=None, since=None, until=None):
+    """
+    逐日產生可評分的日期（排除已使用日期與訊息不足的日期），並累計統計
+    since / until: 日期範圍（含端點，已正規化的 'YYYY/MM/DD' 前綴）
+    """
+    for date, messages in iter_period_days(period, dates):
+        if (since and date < since) or (until and date > until):
+            continue
+        stats['valid'] += len(messages)
+        stats['dates'] += 1
+
+        # 過濾已使用的日期
+        if date in used_dates:
+            stats['used'] += 1
+            continue
+
+        if len(messages) >= 2:
+            yield date, messages
+
+
+def resolve_periods(period):
+    """'all' 或單一時期 → 時期列表"""
+    if period == 'all':
+        return list(PERIOD_FILES)
+    period_file(period)
+    return [period]
+
+
+DATE_BOUND_PATTERN = re.compile(r'^(\d{4})(?:[/-](\d{1,2})(?:[/-](\d{1,2}))?)?$')
 
-    return best_score, list(tags), best_snippet
+
+def normalize_date_bound(value):
+    """
+    YYYY、YYYY/MM、YYYY/MM/DD（也可用 '-' 分隔，月日可不補零）→ 補零的 'YYYY/MM/DD' 前綴，
+    格式錯誤時拋出 ValueError
+    """
+    match = DATE_BOUND_PATTERN.match(value.strip())
+    if not match:
+        raise ValueError(f'無效的日期: {value}（請使用 YYYY、YYYY/MM 或 YYYY/MM/DD）')
+    year, month, day = match.groups()
+    if month is not None and not 1 <= int(month) <= 12:
+        raise ValueError(f'無效的月份: {value}')
+    if day is not None and not 1 <= int(day) <= 31:
+        raise ValueError(f'無效的日期: {value}')
+    return '/'.join([year] + [f'{int(part):02d}' for part in (month, day) if part is not None])
+
+
+def normalize_date_range(since=None, until=None):
+    """
+    正規化日期範圍（以字串比較 'YYYY/MM/DD'），until 只指定年或月時包含整年或整月；
+    格式錯誤時拋出 ValueError
+    """
+    since = normalize_date_bound(since) if since else None
+    until = normalize_date_bound(until) + '\uffff' if until else None
+    return since, until
+
+
+def _date_bound_arg(value):
+    try:
+        return normalize_date_bound(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def load_period_counts(question_file='final_questions_new.json'):
+    """題庫中各時期的題目數"""
+    counts = {period: 0 for period in PERIOD_FILES}
+    try:
+        with open(question_file, 'r', encoding='utf-8') as f:
+            for q in json.load(f):
+                if q.get('period') in counts:
+                    counts[q['period']] += 1
+    except FileNotFoundError:
+        pass
+    return counts
+
+
+def parse_quotas(spec, periods, total=20):
+    """
+    解析 --quota：
+      N                        每個時期最多 N 個日期
+      2019-2020=10,2023-2025=5 分別指定（未列出的時期不限）
+      auto                     依題庫現有題目數補足，使題庫加上前 total 名後各時期數量接近
+    回傳 {時期: 上限}，未限制的時期不列入
+    """
+    if not spec:
+        return {}
+    if spec == 'auto':
+        counts = load_period_counts()
+        target = -(-(sum(counts[p] for p in periods) + total) // len(periods))
+        return {p: max(0, target - counts[p]) for p in periods}
+    if spec.isdigit():
+        return {p: int(spec) for p in periods}
+
+    quotas = {}
+    for part in spec.split(','):
+        period, _, value = part.partition('=')
+        period = period.strip()
+        if period not in PERIOD_FILES or not value.strip().isdigit():
+            raise ValueError(f'無效的配額設定: {part}（格式：時期=數量）')
+        quotas[period] = int(value)
+    return quotas
 
 
 def load_used_dates(question_file='final_questions_new.json'):
@@ -85,16 +285,40 @@ def load_used_dates(question_file='final_questions_new.json'):
 
 
 def filter_by_tag(dates_data, tag):
-    """根據標籤過濾日期"""
+    """根據標籤條件過濾日期（支援 AND / OR / NOT，例如「溫馨 AND 特殊事件」）"""
+    expression = parse_tag_expression(tag)
     filtered = {}
     for date, data in dates_data.items():
-        if tag in data['tags']:
+        if matches_expression(expression, data['tags']):
             filtered[date] = data
     return filtered
 
 
-def browse_dates(period, tag_filter=None, limit=20, min_score=3, exclude_used=True, offset=0):
-    """瀏覽候選日期"""
+def snippet_keywords(messages):
+    """片段中命中的關鍵字"""
+    mask = 0
+    for m in WINDOW_SCORER.masks(messages):
+        mask |= m
+    return WINDOW_SCORER.mask_keywords(mask)
+
+
+def tag_candidates(period, expression):
+    """以標籤倒排索引找出可能符合條件的日期；None 表示需評分所有日期"""
+    # 索引一律以預設規則建立：額外的媒體標記只會排除更多訊息，候選範圍仍涵蓋所有可能
+    index, rebuilt = load_tag_index(period_file(period),
+                                    lambda: iter_period_days(period, message_filter=MessageFilter()))
+    if rebuilt:
+        print('  ✓ 已建立標籤索引')
+    return index.candidates(expression)
+
+
+def browse_dates(period, tag_filter=None, limit=20, min_score=3, exclude_used=True, offset=0,
+                 use_cache=True, jobs=1, backend=PYTHON_BACKEND, since=None, until=None, quota=None,
+                 near_dup=None):
+    """瀏覽候選日期（period 為 'all' 時所有時期合併排名）"""
+    periods = resolve_periods(period)
+    since, until = normalize_date_range(since, until)
+
     print('=' * 80)
     print(f'瀏覽候選日期 - {period}')
     print('=' * 80)
@@ -103,63 +327,177 @@ def browse_dates(period, tag_filter=None, limit=20, min_score=3, exclude_used=Tr
     # 載入已使用的日期
     used_dates = set()
     if exclude_used:
-        used_dates = load_used_dates()
+        with PROFILER.stage('載入已使用日期'):
+            used_dates = load_used_dates()
         print(f'載入已使用日期: {len(used_dates)} 個')
         print()
 
-    # 載入資料
-    print('載入資料...')
-    raw_data = load_raw_data(period)
-    all_messages = raw_data['messages']
-
-    # 過濾無效訊息
-    valid_messages = filter_valid_messages(all_messages)
-    print(f'  ✓ 有效訊息數: {len(valid_messages)}')
+    quotas = parse_quotas(quota, periods, offset + limit)
+    if quotas:
+        print('各時期配額: ' + '，'.join(f'{p} {quotas[p]} 個' for p in periods if p in quotas))
+        print()
 
-    # 按日期分組
-    by_date = group_by_date(valid_messages)
-    print(f'  ✓ 日期數: {len(by_date)}')
-    
-    # 過濾已使用的日期
+    expression = parse_tag_expression(tag_filter) if tag_filter else None
+    needs_keywords = expression is not None and bool(expression_terms(expression) - set(KEYWORDS))
+
+    # 串流載入並逐日評分（同一時間只保留單日訊息）
+    print('載入並評分日期...')
+    stats = {'valid': 0, 'dates': 0, 'used': 0}
+    MESSAGE_FILTER.reset()
+    hits = misses = 0
+    records = []
+    signatures = {}
+    period_counts = {p: 0 for p in periods}
+    high_count = 0
+    k = offset + limit
+    # 每個時期各一個最小堆積，只保留可能出現在前 offset+limit 名的片段內容
+    tops = {p: [] for p in periods}
+    for p in periods:
+        if len(periods) > 1 and not os.path.exists(PERIOD_FILES[p]):
+            print(f'  ⊙ {p}: 找不到 {PERIOD_FILES[p]}，略過')
+            continue
+
+        # 標籤條件先以倒排索引縮小範圍，只評分可能符合的日期
+        candidates = None
+        if expression is not None:
+            with PROFILER.stage('標籤索引'):
+                candidates = tag_candidates(p, expression)
+        if candidates is not None:
+            print(f'  ✓ {p} 標籤索引候選日期: {len(candidates)} 個')
+
+        cache = None
+        if use_cache:
+            with PROFILER.stage('載入快取'):
+                cache = ScoreCache(p)
+        top = tops[p]
+        cap = min(k, quotas.get(p, k))
+        days = iter_candidate_days(p, used_dates, stats, candidates, since, until)
+        for date, messages, score, tags, start, length in iter_scored_days(days, cache, jobs,
+                                                                           backend=backend):
+            if score < min_score:
+                continue
+            high_count += 1
+
+            # 索引只能排除不可能符合的日期，仍需以最佳片段的標籤與關鍵字確認
+            if expression is not None:
+                keywords = snippet_keywords(messages[start:start + length]) if needs_keywords else ()
+                if not matches_expression(expression, tags, keywords):
+                    continue
+
+            record = {
+                'seq': len(records),
+                'period': p,
+                'date': date,
+                'score': score,
+                'tags': tags,
+                'start': start,
+                'length': length,
+                'total_messages': len(messages)
+            }
+            records.append(record)
+            period_counts[p] += 1
+            if near_dup is not None:
+                signatures[record['seq']] = signature(messages[start:start + length])
+
+            # 同分時先出現者優先，新紀錄只有分數嚴格較高時才會擠掉堆積頂端
+            item = (score, -record['seq'], date, messages[start:start + length])
+            if len(top) < cap:
+                heapq.heappush(top, item)
+            elif cap and item[:2] > top[0][:2]:
+                heapq.heapreplace(top, item)
+
+        if cache is not None:
+            with PROFILER.stage('寫入快取'):
+                cache.save()
+            hits += cache.hits
+            misses += cache.misses
+
+    print(f'  ✓ 有效訊息數: {stats["valid"]}')
+    if MESSAGE_FILTER.rejected:
+        details = '，'.join(f'{rule} {count}' for rule, count in MESSAGE_FILTER.report())
+        print(f'  ✓ 排除無效訊息: {MESSAGE_FILTER.rejected} 則（{details}）')
+    print(f'  ✓ 日期數: {stats["dates"]}')
     if exclude_used:
-        original_count = len(by_date)
-        by_date = {date: msgs for date, msgs in by_date.items() if date not in used_dates}
-        filtered_count = original_count - len(by_date)
-        print(f'  ✓ 排除已使用日期: {filtered_count} 個')
+        print(f'  ✓ 排除已使用日期: {stats["used"]} 個')
+    if use_cache:
+        print(f'  ✓ 快取命中: {hits} 個，重新評分: {misses} 個')
+    print(f'  ✓ 找到 {high_count} 個高分日期（分數 >= {min_score}）')
     print()
 
-    # 評分每個日期
-    print('評分日期...')
-    dates_data = {}
-    for date, messages in by_date.items():
-        if len(messages) >= 2:
-            score, tags, snippet = score_date(messages)
-            if score >= min_score:
-                dates_data[date] = {
-                    'score': score,
-                    'tags': tags,
-                    'snippet': snippet,
-                    'total_messages': len(messages)
-                }
-    print(f'  ✓ 找到 {len(dates_data)} 個高分日期（分數 >= {min_score}）')
-    print()
-
-    # 根據標籤過濾
     if tag_filter:
-        dates_data = filter_by_tag(dates_data, tag_filter)
-        print(f'  ✓ 標籤過濾（{tag_filter}）: {len(dates_data)} 個日期')
+        print(f'  ✓ 標籤過濾（{tag_filter}）: {len(records)} 個日期')
         print()
 
-    # 排序（按分數降序）
-    sorted_dates = sorted(dates_data.items(), key=lambda x: x[1]['score'], reverse=True)
+    if len(periods) > 1:
+        print('各時期候選日期: ' + '，'.join(f'{p} {period_counts[p]} 個' for p in periods))
+        print()
 
-    # 計算分頁範圍
-    total_dates = len(sorted_dates)
+    PROFILER.count('有效訊息', MESSAGE_FILTER.accepted)
+    PROFILER.count('排除訊息', MESSAGE_FILTER.rejected)
+    if use_cache:
+        PROFILER.count('快取命中', hits)
+        PROFILER.count('快取未命中', misses)
+
+    if near_dup is not None:
+        with PROFILER.stage('相似片段過濾'):
+            records, bank_dups, pool_dups = drop_near_duplicates(records, signatures, near_dup)
+        print(f'  ✓ 相似片段過濾（門檻 {near_dup}）: 與題庫相似 {bank_dups} 個，'
+              f'與排名較前的候選相似 {pool_dups} 個')
+        print()
+        for p in periods:
+            period_counts[p] = sum(1 for r in records if r['period'] == p)
+
+    records = apply_quotas(records, quotas)
+    snippets = {(p, date): snippet for p, top in tops.items() for _, _, date, snippet in top}
+    ranking = DateRanking(period, records, snippets)
+    with PROFILER.stage('排序與輸出'):
+        print_page(ranking, offset, limit)
+    return ranking
+
+
+def drop_near_duplicates(records, signatures, threshold, question_file='final_questions_new.json'):
+    """
+    移除片段與題庫題目相似，或與排名較前的候選日期相似的日期
+    回傳 (保留的紀錄, 與題庫相似數, 與候選相似數)
+    """
+    try:
+        bank = build_bank_index(load_questions(question_file), threshold)
+    except FileNotFoundError:
+        bank = LSHIndex(threshold)
+    pool = LSHIndex(threshold)
+    kept = []
+    bank_dups = pool_dups = 0
+    for record in sorted(records, key=_rank_key):
+        sig = signatures[record['seq']]
+        if bank.query(sig):
+            bank_dups += 1
+        elif pool.query(sig):
+            pool_dups += 1
+        else:
+            pool.add(record['seq'], sig)
+            kept.append(record)
+    kept.sort(key=lambda r: r['seq'])
+    return kept, bank_dups, pool_dups
+
+
+def apply_quotas(records, quotas):
+    """每個時期只保留排名前 quotas[時期] 的日期（維持原本的出現順序）"""
+    if not quotas:
+        return records
+    kept = set()
+    for period, quota in quotas.items():
+        in_period = [r for r in records if r['period'] == period]
+        kept.update(r['seq'] for r in heapq.nsmallest(quota, in_period, key=_rank_key))
+    return [r for r in records if r['period'] not in quotas or r['seq'] in kept]
+
+
+def print_page(ranking, offset, limit):
+    """顯示一頁候選日期"""
+    page_dates = ranking.page(offset, limit)
+    total_dates = len(ranking)
     start_idx = offset
     end_idx = min(offset + limit, total_dates)
-    page_dates = sorted_dates[start_idx:end_idx]
-    
-    # 顯示候選日期
+
     print('=' * 80)
     if offset > 0:
         print(f'候選日期 ({start_idx + 1}-{end_idx} / 共 {total_dates} 個)')
@@ -169,7 +507,8 @@ def browse_dates(period, tag_filter=None, limit=20, min_score=3, exclude_used=Tr
     print()
 
     for i, (date, data) in enumerate(page_dates, start_idx + 1):
-        print(f"{i}. 日期: {date} | 分數: {data['score']} | 訊息數: {data['total_messages']}")
+        label = f"{date} ({data['period']})" if ranking.period == 'all' else date
+        print(f"{i}. 日期: {label} | 分數: {data['score']} | 訊息數: {data['total_messages']}")
         print(f"   標籤: {', '.join(data['tags'])}")
         print(f"   對話片段:")
 
@@ -178,10 +517,159 @@ def browse_dates(period, tag_filter=None, limit=20, min_score=3, exclude_used=Tr
 
         print()
 
-    return sorted_dates
 
+def _rank_key(record):
+    """排序鍵：分數降序，同分依出現順序"""
+    return (-record['score'], record['seq'])
+
+
+def load_snippets(period, wanted):
+    """重新串流讀取原始資料，取出指定日期的片段；wanted 為 {日期: (起點, 長度)}"""
+    snippets = {}
+    snapshot = open_snapshot(period_file(period))
+    if snapshot is not None:
+        # 快照有日期索引，只需讀取指定日期
+        for date, (start, length) in wanted.items():
+            messages = filter_valid_messages(snapshot.day(date))
+            snippets[date] = messages[start:start + length]
+        return snippets
+
+    for date, messages in iter_period_days(period):
+        if date in wanted:
+            start, length = wanted[date]
+            snippets[date] = messages[start:start + length]
+            if len(snippets) == len(wanted):
+                break
+    return snippets
+
+
+class DateRanking:
+    """
+    依分數排序的候選日期，只保留輕量紀錄，片段內容在需要時才載入
+    紀錄需含 period 欄位；snippets 以 (時期, 日期) 為鍵
+    """
+
+    def __init__(self, period, records, snippets=None, page_size=20):
+        self.period = period
+        self.records = records
+        self.page_size = page_size
+        self._snippets = dict(snippets or {})
+        self._ranked = []
+
+    def __len__(self):
+        return len(self.records)
+
+    def _ensure_ranked(self, count):
+        """確保前 count 名的順序已計算（以堆積選取，不需排序全部日期）"""
+        if count > len(self._ranked):
+            count = max(count, len(self._ranked) * 2)
+            self._ranked = heapq.nsmallest(count, self.records, key=_rank_key)
+
+    def page(self, offset, limit):
+        """取得一頁 (日期, 資料) 列表，缺少的片段會批次載入"""
+        self._ensure_ranked(offset + limit)
+        rows = self._ranked[offset:offset + limit]
+
+        missing = defaultdict(dict)
+        for r in rows:
+            if (r['period'], r['date']) not in self._snippets:
+                missing[r['period']][r['date']] = (r['start'], r['length'])
+        for period, wanted in missing.items():
+            for date, snippet in load_snippets(period, wanted).items():
+                self._snippets[(period, date)] = snippet
+
+        return [(r['date'], {
+            'period': r['period'],
+            'score': r['score'],
+            'tags': r['tags'],
+            'snippet': self._snippets.get((r['period'], r['date']), []),
+            'total_messages': r['total_messages']
+        }) for r in rows]
+
+    def __getitem__(self, idx):
+        if not 0 <= idx < len(self.records):
+            raise IndexError(idx)
+        page_start = idx - idx % self.page_size
+        return self.page(page_start, self.page_size)[idx - page_start]
+
+
+def query_index(args):
+    """以 SQLite 索引查詢候選日期（不需重新掃描原始資料）"""
+    # 延遲匯入：chat_index 本身依賴本模組的過濾與評分函式
+    from chat_index import INDEX_FILE, connect, query_days, load_snippet, index_markers
+
+    index_path = args.index or INDEX_FILE
+    if not os.path.exists(index_path):
+        print(f'錯誤：找不到索引 {index_path}')
+        print('請先執行 chat_index.py 建立索引')
+        return
+
+    # 索引表只記錄最佳片段的標籤，查詢模式僅支援以 AND 組合的標籤
+    tags = []
+    if args.tag:
+        expression = parse_tag_expression(args.tag)
+        if not _is_tag_conjunction(expression):
+            print('錯誤：--query 模式的 --tag 僅支援以 AND 組合的標籤')
+            return
+        tags = sorted(expression_terms(expression))
+
+    since, until = normalize_date_range(args.since, args.until)
+    used_dates = sorted(load_used_dates()) if not args.include_used else []
+    conn = connect(index_path)
+
+    # 索引中的有效訊息、片段與分數依建立時的媒體標記計算，標記不同時結果會包含應排除的訊息
+    markers = sorted(MessageFilter(args.media_marker).markers)
+    indexed = index_markers(conn)
+    if markers != indexed:
+        conn.close()
+        print('錯誤：--media-marker 與建立索引時排除的媒體標記不同')
+        print(f"  索引: {' '.join(indexed)}")
+        print(f"  查詢: {' '.join(markers)}")
+        print('請以相同的 --media-marker 查詢，或重新建立索引：')
+        print('  python3 scripts/chat_index.py'
+              + ''.join(f" --media-marker '{m}'" for m in args.media_marker))
+        return
+    started = time.perf_counter()
+    rows, total = query_days(
+        conn,
+        keywords=args.keyword or [],
+        tags=tags,
+        since=since,
+        until=until,
+        users=args.user or [],
+        min_messages=args.min_messages,
+        min_score=args.min_score,
+        periods=[args.period] if args.period and args.period != 'all' else None,
+        exclude_dates=used_dates,
+        limit=args.limit,
+        offset=args.offset
+    )
+    elapsed = (time.perf_counter() - started) * 1000
+
+    print('=' * 80)
+    print(f'索引查詢結果 ({args.offset + 1}-{args.offset + len(rows)} / 共 {total} 個，{elapsed:.1f} ms)')
+    print('=' * 80)
+    print()
 
-def interactive_select(sorted_dates, period='2019-2020', output_file=None):
+    for i, (period, date, score, tags, n_valid, start, length) in enumerate(rows, args.offset + 1):
+        print(f"{i}. 日期: {date} ({period}) | 分數: {score} | 訊息數: {n_valid}")
+        print(f"   標籤: {', '.join(tags)}")
+        print(f"   對話片段:")
+        for msg in load_snippet(conn, period, date, start, length):
+            print(f"     {msg['user']}: {msg['content']}")
+        print()
+    conn.close()
+
+
+def _is_tag_conjunction(expression):
+    """條件是否只由標籤以 AND 組合"""
+    if expression[0] == 'term':
+        return expression[1] in KEYWORDS
+    return expression[0] == 'and' and all(_is_tag_conjunction(e) for e in expression[1:])
+
+
+def interactive_select(sorted_dates, period='2019-2020', output_file=None, next_offset=None,
+                       page_size=20):
     """互動式選擇日期"""
     print('=' * 80)
     print('互動式選擇模式')
@@ -190,6 +678,7 @@ def interactive_select(sorted_dates, period='2019-2020', output_file=None):
     print('指令：')
     print('  輸入數字 - 查看該日期詳細資訊')
     print('  s <數字> - 選擇該日期')
+    print('  n - 顯示下一頁候選日期')
     print('  l - 列出已選日期')
     print('  c - 清除已選日期')
     print('  w - 寫入檔案並結束')
@@ -216,6 +705,16 @@ def interactive_select(sorted_dates, period='2019-2020', output_file=None):
             except (IndexError, ValueError):
                 print("無效指令，格式: s <數字>")
 
+        elif cmd == 'n':
+            if next_offset is None:
+                next_offset = page_size
+            if next_offset >= len(sorted_dates):
+                print("已經是最後一頁")
+                continue
+            # 下一頁的片段在此時才載入
+            print_page(sorted_dates, next_offset, page_size)
+            next_offset += page_size
+
         elif cmd == 'l':
             if selected_dates:
                 print(f"\n已選擇 {len(selected_dates)} 個日期:")
@@ -275,11 +774,12 @@ def interactive_select(sorted_dates, period='2019-2020', output_file=None):
 def main():
     """主執行流程"""
     parser = argparse.ArgumentParser(description='瀏覽候選日期輔助工具')
-    parser.add_argument('--period', default='2019-2020',
-                        choices=['2019-2020', '2021-2022', '2023-2025'],
-                        help='時期選擇')
+    parser.add_argument('--period', default=None,
+                        choices=['all'] + list(PERIOD_FILES.keys()),
+                        help='時期選擇，all 表示所有時期合併排名（預設 2019-2020；--query 模式預設查詢所有時期）')
     parser.add_argument('--tag', default=None,
-                        help='標籤過濾（笑点/温馨/特殊事件/有梗/認真）')
+                        help='標籤條件（笑点/温馨/特殊事件/有梗/認真 或關鍵字，'
+                             '可用 AND / OR / NOT 與括號組合，例如「溫馨 AND 特殊事件」）')
     parser.add_argument('--limit', type=int, default=20,
                         help='顯示數量限制')
     parser.add_argument('--offset', type=int, default=0,
@@ -292,22 +792,94 @@ def main():
                         help='輸出檔案路徑')
     parser.add_argument('--include-used', action='store_true',
                         help='包含已使用的日期（預設會排除）')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='不使用評分快取（cache/），每個日期重新評分')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='平行評分的行程數（0 表示使用所有 CPU 核心）')
+    parser.add_argument('--since', type=_date_bound_arg, default=None,
+                        help='起始日期（YYYY、YYYY/MM 或 YYYY/MM/DD，含當日）')
+    parser.add_argument('--until', type=_date_bound_arg, default=None,
+                        help='結束日期（YYYY、YYYY/MM 或 YYYY/MM/DD，含當日）')
+    parser.add_argument('--quota', default=None,
+                        help='各時期日期數上限：N、2019-2020=10,2023-2025=5，'
+                             '或 auto（依題庫現有題目數平衡各時期）')
+    parser.add_argument('--near-dup', type=float, nargs='?', const=NEAR_DUP_THRESHOLD, default=None,
+                        metavar='THRESHOLD',
+                        help='排除片段與題庫或較高分候選相似的日期（MinHash 相似度門檻，預設 0.5）')
+    parser.add_argument('--media-marker', action='append', default=[],
+                        help='額外排除含此標記的訊息，例如 [檔案]、[語音訊息]（可重複指定）')
+    parser.add_argument('--backend', default=PYTHON_BACKEND, choices=BACKENDS,
+                        help='評分後端：python（基準實作）或 numpy（批次矩陣運算，需安裝 NumPy）')
+
+    query_group = parser.add_argument_group('索引查詢（需先執行 chat_index.py）')
+    query_group.add_argument('--query', action='store_true',
+                             help='以 SQLite 索引查詢，不重新掃描原始資料')
+    query_group.add_argument('--keyword', action='append',
+                             help='當日對話須包含的字詞（可重複指定）')
+    query_group.add_argument('--user', action='append',
+                             help='當日須有此使用者的訊息（可重複指定）')
+    query_group.add_argument('--min-messages', type=int, default=0,
+                             help='當日最少有效訊息數')
+    query_group.add_argument('--index', default=None,
+                             help='索引資料庫路徑')
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
 
-    # 瀏覽日期
-    sorted_dates = browse_dates(
-        period=args.period,
-        tag_filter=args.tag,
-        limit=args.limit,
-        min_score=args.min_score,
-        exclude_used=not args.include_used,
-        offset=args.offset
-    )
+    try:
+        check_backend(args.backend)
+    except ValueError as e:
+        print(f'錯誤：{e}')
+        return
+
+    if args.media_marker:
+        set_media_markers(args.media_marker)
+
+    if args.tag:
+        try:
+            parse_tag_expression(args.tag)
+        except ValueError as e:
+            print(f'錯誤：{e}')
+            return
+
+    if args.query:
+        query_index(args)
+        return
+
+    if args.period is None:
+        args.period = '2019-2020'
+
+    session = ProfileSession(args, 'browse_dates')
+    try:
+        session.start()
+    except ValueError as e:
+        print(f'錯誤：{e}')
+        return
+
+    # 瀏覽日期（互動式選擇等待輸入，不計入效能分析）
+    try:
+        sorted_dates = browse_dates(
+            period=args.period,
+            tag_filter=args.tag,
+            limit=args.limit,
+            min_score=args.min_score,
+            exclude_used=not args.include_used,
+            offset=args.offset,
+            use_cache=not args.no_cache,
+            jobs=resolve_jobs(args.jobs),
+            backend=args.backend,
+            since=args.since,
+            until=args.until,
+            quota=args.quota,
+            near_dup=args.near_dup
+        )
+    finally:
+        session.finish()
 
     # 互動式選擇
     if args.interactive:
-        interactive_select(sorted_dates, period=args.period, output_file=args.output)
+        interactive_select(sorted_dates, period=args.period, output_file=args.output,
+                           next_offset=args.offset + args.limit, page_size=args.limit)
 
 
 if __name__ == '__main__':
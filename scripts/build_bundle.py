@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+建立網頁用的精簡題庫（bundle/）
+預設為單一檔案（也可依時期／題型分片），題目以欄位陣列儲存；使用者名稱與標籤集中成表，
+訊息省略可由對話日期推得的 date / datetime，isCorrect 由 correctAnswer 推得。
+manifest.json 記錄欄位順序、對照表、各分片的題數、抽題用的索引表及配額，
+以及來源題庫的雜湊；題庫更新後 refresh_bundle 依此判斷是否需要重建
+"""
+
+import gzip
+import json
+import os
+import argparse
+
+from question_store import write_bytes_atomic, load_target, file_sha256
+from sampling_plan import sampling_tables
+
+BUNDLE_DIR = 'bundle'
+BUNDLE_VERSION = 1
+
+QUESTION_FIELDS = ['id', 'question', 'options', 'correctAnswer', 'explanation',
+                   'difficulty', 'weight', 'tags', 'date', 'highlightIndex', 'messages']
+MESSAGE_FIELDS = ['user', 'content', 'time']
+
+# 分片方式：分片鍵以外的 period / type 會附加在每題的欄位最後
+SHARD_KEYS = {
+    'period-type': ('period', 'type'),
+    'period': ('period',),
+    'type': ('type',),
+    'none': (),
+}
+# 前端目前會下載所有分片，多個小檔案各自壓縮反而比單一檔案大，因此預設不分片
+DEFAULT_SHARDING = 'none'
+DEFAULT_SOURCE = 'final_questions_new.json'
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def _gzip_size(content):
+    return len(gzip.compress(content.encode('utf-8'), compresslevel=9, mtime=0))
+
+
+class Interner:
+    """字串對照表：相同字串只存一次，題目中以索引代替"""
+
+    def __init__(self):
+        self.values = []
+        self._index = {}
+
+    def __call__(self, value):
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+
+def compact_message(msg, date, users):
+    """[使用者索引, 內容, 時間]；date / datetime 與對話日期不一致的訊息保留原格式"""
+    time = msg.get('time')
+    expected = {'date': date, 'user': msg.get('user'), 'content': msg.get('content')}
+    if time is not None:
+        expected.update(time=time, datetime=f'{date} {time}')
+    if msg != expected:
+        return msg
+    row = [users(msg['user']), msg['content']]
+    if time is not None:
+        row.append(time)
+    return row
+
+
+def expand_message(row, date, users):
+    if isinstance(row, dict):
+        return row
+    msg = {'date': date}
+    if len(row) > 2:
+        msg.update(time=row[2], datetime=f'{date} {row[2]}')
+    msg.update(user=users[row[0]], content=row[1])
+    return msg
+
+
+def compact_question(q, users, tags, extra_fields=()):
+    conversation = q['conversation']
+    date = conversation['date']
+    row = [
+        q['id'],
+        q['question'],
+        [[opt['id'], opt['text']] for opt in q['options']],
+        q['correctAnswer'],
+        q['explanation'],
+        q['difficulty'],
+        q['weight'],
+        [tags(tag) for tag in q.get('tags', [])],
+        date,
+        conversation.get('highlightIndex', 0),
+        [compact_message(msg, date, users) for msg in conversation['context']],
+    ]
+    row.extend(q[field] for field in extra_fields)
+    return row
+
+
+def expand_question(row, shard, manifest):
+    """compact_question 的反向轉換（與 data.js 的 expandQuestion 相同）"""
+    fields = dict(zip(manifest['fields'], row))
+    users, tags = manifest['users'], manifest['tags']
+    type_name = fields.get('type', shard.get('type'))
+    q_type = manifest['types'][type_name]
+    date = fields['date']
+    return {
+        'id': fields['id'],
+        'type': type_name,
+        'category': q_type['category'],
+        'dimension': q_type['dimension'],
+        'conversation': {
+            'date': date,
+            'context': [expand_message(m, date, users) for m in fields['messages']],
+            'highlightIndex': fields['highlightIndex'],
+        },
+        'question': fields['question'],
+        'options': [{'id': oid, 'text': text, 'isCorrect': oid == fields['correctAnswer']}
+                    for oid, text in fields['options']],
+        'correctAnswer': fields['correctAnswer'],
+        'explanation': fields['explanation'],
+        'weight': fields['weight'],
+        'difficulty': fields['difficulty'],
+        'period': fields.get('period', shard.get('period')),
+        'tags': [tags[i] for i in fields['tags']],
+    }
+
+
+def shard_name(key):
+    return '.'.join(key or ('questions',)) + '.json'
+
+
+def build_bundle(questions, sharding=DEFAULT_SHARDING, source=None):
+    """
+    回傳 (manifest, {分片檔名: 題目列表})；分片與分片內的題目維持題庫原順序
+    source: 來源題庫檔案，其雜湊記錄在 manifest 中
+    """
+    shard_keys = SHARD_KEYS[sharding]
+    extra_fields = [field for field in ('period', 'type') if field not in shard_keys]
+    users, tags = Interner(), Interner()
+    types = {}
+    shards = {}
+    for q in questions:
+        types.setdefault(q['type'], {'category': q['category'], 'dimension': q['dimension']})
+        key = tuple(q[field] for field in shard_keys)
+        shards.setdefault(key, []).append(compact_question(q, users, tags, extra_fields))
+
+    manifest = {
+        'version': BUNDLE_VERSION,
+        'source': {'file': os.path.basename(source), 'sha256': file_sha256(source)} if source else None,
+        'sharding': sharding,
+        'total': len(questions),
+        'fields': QUESTION_FIELDS + extra_fields,
+        'messageFields': MESSAGE_FIELDS,
+        'users': users.values,
+        'tags': tags.values,
+        'types': types,
+        'shards': [dict(zip(shard_keys, key), file=shard_name(key), count=len(rows))
+                   for key, rows in shards.items()],
+        'sampling': sampling_tables(questions),
+    }
+    files = {shard_name(key): rows for key, rows in shards.items()}
+    return manifest, files
+
+
+def expand_bundle(manifest, files):
+    """由 bundle 還原完整題目（依題目 ID 排序）"""
+    questions = [expand_question(row, shard, manifest)
+                 for shard in manifest['shards'] for row in files[shard['file']]]
+    return sorted(questions, key=lambda q: q['id'])
+
+
+def write_bundle(manifest, files, output_dir=BUNDLE_DIR):
+    """寫入 bundle 目錄並刪除已不存在的舊分片，回傳 {檔名: 內容}"""
+    os.makedirs(output_dir, exist_ok=True)
+    contents = {'manifest.json': _dumps(manifest)}
+    contents.update((name, _dumps(rows)) for name, rows in files.items())
+    for name, content in contents.items():
+        write_bytes_atomic(os.path.join(output_dir, name), content.encode('utf-8'))
+    for name in os.listdir(output_dir):
+        if name.endswith('.json') and name not in contents:
+            os.remove(os.path.join(output_dir, name))
+    return contents
+
+
+def load_manifest(output_dir=BUNDLE_DIR):
+    try:
+        with open(os.path.join(output_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def bundle_is_current(source=DEFAULT_SOURCE, output_dir=BUNDLE_DIR, manifest=None):
+    """bundle 是否由目前的題庫檔建立（舊版 manifest 沒有雜湊，視為過期）"""
+    manifest = manifest or load_manifest(output_dir)
+    recorded = (manifest or {}).get('source') or {}
+    return recorded.get('sha256') == file_sha256(source)
+
+
+def rebuild_bundle(source=DEFAULT_SOURCE, output_dir=BUNDLE_DIR, sharding=DEFAULT_SHARDING):
+    """由題庫檔重建 bundle，回傳 (manifest, {檔名: 內容})；無法完整還原時拋出 ValueError"""
+    questions = load_target(source)
+    if not questions:
+        raise ValueError(f'{source} 沒有題目')
+    manifest, files = build_bundle(questions, sharding, source)
+    if expand_bundle(manifest, files) != sorted(questions, key=lambda q: q['id']):
+        raise ValueError('還原後的題目與原題庫不一致，未寫入')
+    return manifest, write_bundle(manifest, files, output_dir)
+
+
+def refresh_bundle(source=DEFAULT_SOURCE, output_dir=BUNDLE_DIR):
+    """
+    題庫更新後呼叫：已建立過 bundle 且已過期時，以原本的分片方式重建
+    回傳 None（沒有 bundle）、False（已是最新）或重建後的 manifest
+    """
+    manifest = load_manifest(output_dir)
+    if manifest is None:
+        return None
+    if bundle_is_current(source, output_dir, manifest):
+        return False
+    sharding = manifest.get('sharding')
+    if sharding not in SHARD_KEYS:
+        sharding = DEFAULT_SHARDING
+    manifest, _ = rebuild_bundle(source, output_dir, sharding)
+    return manifest
+
+
+def print_refresh(source=DEFAULT_SOURCE, output_dir=BUNDLE_DIR):
+    """refresh_bundle 並列印結果（merge_ai_questions.py / question_store.py 匯出後共用）"""
+    try:
+        manifest = refresh_bundle(source, output_dir)
+    except ValueError as e:
+        print(f'  ✗ 重建 {output_dir}/ 失敗：{e}')
+        return
+    if manifest:
+        print(f"  ✓ 已重建 {output_dir}/（{manifest['total']} 道題目，{len(manifest['shards'])} 個分片）")
+    elif manifest is False:
+        print(f'  ✓ {output_dir}/ 已是最新')
+
+
+def main():
+    """主執行流程"""
+    parser = argparse.ArgumentParser(description='建立網頁用的精簡分片題庫')
+    parser.add_argument('--source', default=DEFAULT_SOURCE,
+                        help='題庫檔案')
+    parser.add_argument('--output', default=BUNDLE_DIR,
+                        help='輸出目錄')
+    parser.add_argument('--shard-by', default=DEFAULT_SHARDING, choices=list(SHARD_KEYS.keys()),
+                        help='分片方式（none 為單一檔案）')
+    args = parser.parse_args()
+
+    print('=' * 80)
+    print('建立精簡題庫')
+    print('=' * 80)
+    print()
+
+    # 寫入前確認可完整還原
+    try:
+        manifest, contents = rebuild_bundle(args.source, args.output, args.shard_by)
+    except ValueError as e:
+        print(f'✗ {e}')
+        return
+    print(f"✓ {manifest['total']} 道題目 → {len(manifest['shards'])} 個分片（{args.output}/）")
+    print()
+
+    with open(args.source, 'r', encoding='utf-8') as f:
+        original = f.read()
+    original_bytes = len(original.encode('utf-8'))
+    original_gzip = _gzip_size(original)
+    sizes = {name: (len(content.encode('utf-8')), _gzip_size(content))
+             for name, content in contents.items()}
+    bundle_bytes = sum(raw for raw, _ in sizes.values())
+    bundle_gzip = sum(gz for _, gz in sizes.values())
+    # 分片很小時各自壓縮的效果較差，另列出整個 bundle 一起壓縮的大小作為對照
+    combined_gzip = _gzip_size(''.join(contents.values()))
+
+    print(f"{'檔案':<44}{'位元組':>10}{'gzip':>10}")
+    print('-' * 64)
+    for name, (raw, gz) in sizes.items():
+        print(f'{name:<44}{raw:>10,}{gz:>10,}')
+    print('-' * 64)
+    print(f"{args.source:<44}{original_bytes:>10,}{original_gzip:>10,}")
+    print(f"{'bundle 合計（各檔分別壓縮）':<44}{bundle_bytes:>10,}{bundle_gzip:>10,}")
+    print(f"{'bundle 合計（一起壓縮）':<44}{bundle_bytes:>10,}{combined_gzip:>10,}")
+    print()
+    print(f'  位元組: {bundle_bytes / original_bytes:.1%}，'
+          f'gzip: {bundle_gzip / original_gzip:.1%}（分別下載）/ '
+          f'{combined_gzip / original_gzip:.1%}（一起壓縮）')
+
+
+if __name__ == '__main__':
+    main()
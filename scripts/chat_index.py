@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+對話紀錄的 SQLite 全文索引
+將所有時期的訊息載入本機 SQLite（FTS5 trigram 分詞，適合中文），
+並預先計算每日統計、最佳片段與關鍵字命中，供 browse_dates.py --query 快速查詢。
+有效訊息依建立時的媒體標記判斷，標記記錄在 meta 中，查詢時的 --media-marker 須與之相同
+"""
+
+import json
+import os
+import sqlite3
+import argparse
+
+from browse_dates import PERIOD_FILES, is_valid_message, score_date_window
+from chat_stream import iter_messages, iter_days
+from extract_snippets import KEYWORDS, WINDOW_SCORER
+from message_filter import MessageFilter, DEFAULT_MEDIA_MARKERS
+from score_cache import scoring_fingerprint
+from snapshot import open_snapshot, source_digest
+
+INDEX_FILE = 'raw_data/chat_index.sqlite'
+SCHEMA_VERSION = 1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    period TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT,
+    user TEXT,
+    content TEXT,
+    vidx INTEGER            -- 當日有效訊息中的序號；無效訊息為 NULL
+);
+CREATE INDEX IF NOT EXISTS messages_day ON messages (period, date, vidx);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (
+    content, content='messages', content_rowid='id', tokenize='trigram'
+);
+CREATE TABLE IF NOT EXISTS days (
+    period TEXT NOT NULL,
+    date TEXT NOT NULL,
+    n_messages INTEGER NOT NULL,
+    n_valid INTEGER NOT NULL,
+    score INTEGER,          -- 有效訊息少於 2 則時為 NULL（browse_dates 不評分）
+    tags TEXT,
+    snippet_start INTEGER,
+    snippet_length INTEGER,
+    seq INTEGER NOT NULL,   -- 日期在時期內的出現順序（同分排序用）
+    PRIMARY KEY (period, date)
+);
+CREATE INDEX IF NOT EXISTS days_score ON days (score DESC);
+CREATE TABLE IF NOT EXISTS day_tags (
+    period TEXT NOT NULL,
+    date TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (tag, period, date)
+);
+CREATE TABLE IF NOT EXISTS day_keywords (
+    period TEXT NOT NULL,
+    date TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    PRIMARY KEY (keyword, period, date)
+);
+CREATE TABLE IF NOT EXISTS day_users (
+    period TEXT NOT NULL,
+    date TEXT NOT NULL,
+    user TEXT NOT NULL,
+    n_messages INTEGER NOT NULL,
+    PRIMARY KEY (user, period, date)
+);
+'''
+
+PERIOD_TABLES = ('messages', 'days', 'day_tags', 'day_keywords', 'day_users')
+
+
+def connect(path=INDEX_FILE):
+    """開啟（必要時建立）索引資料庫"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _get_meta(conn, key):
+    row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _set_meta(conn, key, value):
+    conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+
+def _iter_source_days(source):
+    """逐日產生所有訊息（含無效訊息）；有最新快照時直接讀取快照"""
+    snapshot = open_snapshot(source)
+    if snapshot is not None:
+        return snapshot.iter_days()
+    return iter_days(iter_messages(source))
+
+
+def index_markers(conn):
+    """建立索引時排除的媒體標記（排序後；未記錄的舊索引使用預設標記）"""
+    value = _get_meta(conn, 'media_markers')
+    return json.loads(value) if value else sorted(DEFAULT_MEDIA_MARKERS)
+
+
+def index_period(conn, period, source, keep=is_valid_message):
+    """重建單一時期的索引資料（keep 判斷訊息是否有效）"""
+    for table in PERIOD_TABLES:
+        if table == 'messages':
+            # 外部內容 FTS 表需以 'delete' 指令同步移除
+            conn.execute('''
+                INSERT INTO messages_fts (messages_fts, rowid, content)
+                SELECT 'delete', id, content FROM messages WHERE period = ?
+            ''', (period,))
+        conn.execute(f'DELETE FROM {table} WHERE period = ?', (period,))
+
+    message_count = 0
+    for seq, (date, messages) in enumerate(_iter_source_days(source)):
+        valid = []
+        rows = []
+        user_counts = {}
+        for m in messages:
+            vidx = None
+            if keep(m):
+                vidx = len(valid)
+                valid.append(m)
+                user_counts[m.get('user', '')] = user_counts.get(m.get('user', ''), 0) + 1
+            rows.append((period, date, m.get('time'), m.get('user'), m.get('content'), vidx))
+        conn.executemany('''
+            INSERT INTO messages (period, date, time, user, content, vidx)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+        message_count += len(rows)
+
+        score = tags = start = length = None
+        if len(valid) >= 2:
+            score, tag_list, start, length = score_date_window(valid)
+            tags = json.dumps(tag_list, ensure_ascii=False)
+            conn.executemany('INSERT INTO day_tags (period, date, tag) VALUES (?, ?, ?)',
+                             [(period, date, tag) for tag in tag_list])
+
+        conn.execute('''
+            INSERT INTO days (period, date, n_messages, n_valid, score, tags,
+                              snippet_start, snippet_length, seq)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (period, date, len(messages), len(valid), score, tags, start, length, seq))
+
+        day_mask = 0
+        for mask in WINDOW_SCORER.masks(valid):
+            day_mask |= mask
+        conn.executemany('INSERT INTO day_keywords (period, date, keyword) VALUES (?, ?, ?)',
+                         [(period, date, kw) for kw in WINDOW_SCORER.mask_keywords(day_mask)])
+        conn.executemany('INSERT INTO day_users (period, date, user, n_messages) VALUES (?, ?, ?, ?)',
+                         [(period, date, user, n) for user, n in user_counts.items()])
+
+    conn.execute('''
+        INSERT INTO messages_fts (rowid, content)
+        SELECT id, content FROM messages WHERE period = ?
+    ''', (period,))
+    return message_count
+
+
+def build_index(path=INDEX_FILE, periods=None, force=False, media_markers=()):
+    """
+    建立或更新索引；來源檔、評分規則與媒體標記都未變動的時期會略過
+    media_markers: 預設以外額外排除的媒體標記；與現有索引不同時所有時期重建
+    回傳 {時期: 訊息數或 None（略過）}
+    """
+    conn = connect(path)
+    results = {}
+    fingerprint = scoring_fingerprint()
+    message_filter = MessageFilter(media_markers)
+    markers = sorted(message_filter.markers)
+    if (_get_meta(conn, 'scoring') != fingerprint or _get_meta(conn, 'schema') != str(SCHEMA_VERSION)
+            or index_markers(conn) != markers):
+        force = True
+
+    with conn:
+        for period in periods or PERIOD_FILES:
+            source = PERIOD_FILES[period]
+            if not os.path.exists(source):
+                results[period] = None
+                continue
+            digest = source_digest(source).hex()
+            if not force and _get_meta(conn, f'source:{period}') == digest:
+                results[period] = None
+                continue
+            results[period] = index_period(conn, period, source, message_filter)
+            _set_meta(conn, f'source:{period}', digest)
+        _set_meta(conn, 'scoring', fingerprint)
+        _set_meta(conn, 'media_markers', json.dumps(markers, ensure_ascii=False))
+        _set_meta(conn, 'schema', str(SCHEMA_VERSION))
+    conn.close()
+    return results
+
+
+def _fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def query_days(conn, keywords=(), tags=(), since=None, until=None, users=(),
+               min_messages=0, min_score=None, periods=None, exclude_dates=(), limit=20, offset=0):
+    """
+    依條件查詢日期，依分數降序（同分依時期與出現順序）回傳
+    [(時期, 日期, 分數, 標籤, 有效訊息數, 片段起點, 片段長度)] 與符合總數
+
+    keywords: 當日有效訊息須包含每個關鍵字（KEYWORDS 中的字詞使用預先計算的命中表，
+              其他字詞以 FTS5 trigram 查詢，不足 3 字時改為逐則比對）
+    tags: 最佳片段須包含每個標籤（與 browse_dates --tag 相同）
+    users: 當日須有任一指定使用者的有效訊息
+    exclude_dates: 排除的日期（例如題庫已使用的日期）
+    """
+    known_keywords = {kw for words in KEYWORDS.values() for kw in words}
+    where = ['1 = 1']
+    params = []
+
+    if periods:
+        where.append(f"d.period IN ({', '.join('?' * len(periods))})")
+        params.extend(periods)
+    if since:
+        where.append('d.date >= ?')
+        params.append(since)
+    if until:
+        where.append('d.date <= ?')
+        params.append(until)
+    if min_messages:
+        where.append('d.n_valid >= ?')
+        params.append(min_messages)
+    if min_score is not None:
+        where.append('d.score >= ?')
+        params.append(min_score)
+
+    if exclude_dates:
+        where.append(f"d.date NOT IN ({', '.join('?' * len(exclude_dates))})")
+        params.extend(exclude_dates)
+
+    for tag in tags:
+        where.append('EXISTS (SELECT 1 FROM day_tags t WHERE t.tag = ? '
+                     'AND t.period = d.period AND t.date = d.date)')
+        params.append(tag)
+
+    for keyword in keywords:
+        if keyword in known_keywords:
+            where.append('EXISTS (SELECT 1 FROM day_keywords k WHERE k.keyword = ? '
+                         'AND k.period = d.period AND k.date = d.date)')
+            params.append(keyword)
+        elif len(keyword) >= 3:
+            where.append('(d.period, d.date) IN (SELECT m.period, m.date FROM messages_fts f '
+                         'JOIN messages m ON m.id = f.rowid '
+                         'WHERE messages_fts MATCH ? AND m.vidx IS NOT NULL)')
+            params.append(_fts_phrase(keyword))
+        else:
+            where.append("EXISTS (SELECT 1 FROM messages m WHERE m.period = d.period "
+                         "AND m.date = d.date AND m.vidx IS NOT NULL AND instr(m.content, ?) > 0)")
+            params.append(keyword)
+
+    if users:
+        where.append(f"EXISTS (SELECT 1 FROM day_users u WHERE u.user IN ({', '.join('?' * len(users))}) "
+                     "AND u.period = d.period AND u.date = d.date)")
+        params.extend(users)
+
+    period_order = 'CASE d.period ' + ' '.join(
+        f"WHEN '{p}' THEN {i}" for i, p in enumerate(PERIOD_FILES)) + ' END'
+    condition = ' AND '.join(where)
+
+    total = conn.execute(f'SELECT COUNT(*) FROM days d WHERE {condition}', params).fetchone()[0]
+    rows = conn.execute(f'''
+        SELECT d.period, d.date, d.score, d.tags, d.n_valid, d.snippet_start, d.snippet_length
+        FROM days d
+        WHERE {condition}
+        ORDER BY d.score IS NULL, d.score DESC, {period_order}, d.seq
+        LIMIT ? OFFSET ?
+    ''', params + [limit, offset]).fetchall()
+
+    return [(period, date, score, json.loads(tags) if tags else [], n_valid, start, length)
+            for period, date, score, tags, n_valid, start, length in rows], total
+
+
+def load_snippet(conn, period, date, start, length):
+    """取得片段訊息（有效訊息中的 [start, start + length)）"""
+    if start is None:
+        return []
+    rows = conn.execute('''
+        SELECT user, content FROM messages
+        WHERE period = ? AND date = ? AND vidx >= ? AND vidx < ?
+        ORDER BY vidx
+    ''', (period, date, start, start + length)).fetchall()
+    return [{'user': user, 'content': content} for user, content in rows]
+
+
+def main():
+    """主執行流程"""
+    parser = argparse.ArgumentParser(description='建立對話紀錄 SQLite 全文索引')
+    parser.add_argument('--period', default='all',
+                        choices=['all'] + list(PERIOD_FILES.keys()),
+                        help='要建立索引的時期')
+    parser.add_argument('--index', default=INDEX_FILE,
+                        help='索引資料庫路徑')
+    parser.add_argument('--force', action='store_true',
+                        help='來源未變動也重新建立')
+    parser.add_argument('--media-marker', action='append', default=[],
+                        help='額外排除含此標記的訊息，例如 [檔案]、[語音訊息]（可重複指定；'
+                             '查詢時 browse_dates.py --query 須指定相同的標記）')
+    args = parser.parse_args()
+
+    periods = None if args.period == 'all' else [args.period]
+    print('建立索引...')
+    for period, count in build_index(args.index, periods, args.force, args.media_marker).items():
+        if count is None:
+            print(f'  ⊙ {period}: 來源未變動或不存在，略過')
+        else:
+            print(f'  ✓ {period}: {count} 則訊息')
+    print(f'✓ 索引已保存至: {args.index}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+串流讀取原始對話匯出檔
+逐則解析 raw_data/chat_*.json 的 messages 陣列，並按日期逐日分組，
+記憶體用量只與單日訊息量有關，而非整個檔案大小
+"""
+
+import io
+import json
+import re
+
+CHUNK_SIZE = 1 << 20
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class JsonStreamReader:
+    """以固定大小區塊讀取 JSON 文字，逐值解碼"""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE, base_bytes=0):
+        """base_bytes: 檔案開頭到目前讀取位置的位元組數（供 byte_offset 使用）"""
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+        # (緩衝區位置, 檔案位元組位移)：byte_offset 只需編碼上次呼叫之後的文字
+        self._mark = (0, base_bytes)
+
+    def _fill(self):
+        """讀入下一個區塊（丟棄已解析的部分）"""
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self._mark = (0, self.byte_offset())
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def byte_offset(self):
+        """目前讀取位置在檔案中的位元組位移（檔案需以 newline='' 開啟）"""
+        mark_pos, mark_bytes = self._mark
+        offset = mark_bytes + len(self.buf[mark_pos:self.pos].encode('utf-8'))
+        self._mark = (self.pos, offset)
+        return offset
+
+    def skip_whitespace(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return
+            self._fill()
+
+    def peek(self):
+        """回傳下一個非空白字元（檔案結尾時回傳空字串）"""
+        self.skip_whitespace()
+        return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise ValueError(f'JSON 格式錯誤：預期 {ch!r}，實際 {self.peek()!r}')
+        self.pos += 1
+
+    def decode_value(self):
+        """解碼下一個完整的 JSON 值"""
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            # 數字等值可能剛好被區塊邊界截斷，需確認後面還有字元
+            if end == len(self.buf) and not self.eof:
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self):
+        """逐一產生陣列元素（讀取位置需在 '[' 之前）"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.decode_value()
+            sep = self.peek()
+            self.pos += 1
+            if sep == ']':
+                return
+            if sep != ',':
+                raise ValueError(f'JSON 格式錯誤：陣列中出現 {sep!r}')
+
+
+def _seek_messages(reader, path):
+    """讀取至頂層物件 messages 陣列的 '[' 之前"""
+    reader.expect('{')
+    if reader.peek() == '}':
+        raise ValueError(f'{path} 中找不到 messages 欄位')
+
+    while True:
+        key = reader.decode_value()
+        reader.expect(':')
+        if key == 'messages':
+            return
+        # 其他欄位（匯出資訊等）直接略過
+        reader.decode_value()
+        sep = reader.peek()
+        reader.pos += 1
+        if sep == '}':
+            raise ValueError(f'{path} 中找不到 messages 欄位')
+        if sep != ',':
+            raise ValueError(f'JSON 格式錯誤：物件中出現 {sep!r}')
+
+
+def iter_messages(path, chunk_size=CHUNK_SIZE):
+    """逐則產生匯出檔 messages 陣列中的訊息"""
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = JsonStreamReader(f, chunk_size)
+        _seek_messages(reader, path)
+        yield from reader.iter_array()
+
+
+def iter_messages_with_offsets(path, resume_offset=None, chunk_size=CHUNK_SIZE):
+    """
+    逐則產生 (訊息, 結束位移)：結束位移為該訊息 JSON 結尾的下一個位元組
+
+    resume_offset: 先前取得的某則訊息結束位移；指定時直接從該位置繼續讀取後面的訊息，
+    不需解析前面的內容（呼叫端需自行確認檔案前段未變動）
+    """
+    with open(path, 'rb') as raw:
+        raw.seek(resume_offset or 0)
+        f = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        reader = JsonStreamReader(f, chunk_size, base_bytes=resume_offset or 0)
+        if resume_offset is None:
+            _seek_messages(reader, path)
+            reader.expect('[')
+            if reader.peek() == ']':
+                return
+            sep = ','
+        else:
+            sep = reader.peek()
+            reader.pos += 1
+
+        while sep != ']':
+            if sep != ',':
+                raise ValueError(f'JSON 格式錯誤：陣列中出現 {sep!r}')
+            msg = reader.decode_value()
+            yield msg, reader.byte_offset()
+            sep = reader.peek()
+            reader.pos += 1
+
+
+def iter_days(messages, keep=None):
+    """
+    將依時間排序的訊息串流按日期分組，逐日產生 (日期, 訊息列表)
+
+    keep: 選用的過濾函式（傳入單則訊息，回傳是否保留）；
+    過濾後沒有任何訊息的日期不會產生。
+    匯出檔按時間排序，同一日期的訊息必定相鄰；若日期重複出現則視為資料錯誤。
+    """
+    current_date = None
+    current = []
+    seen = set()
+
+    for msg in messages:
+        date = msg['date']
+        if date != current_date:
+            if current:
+                yield current_date, current
+            if date in seen:
+                raise ValueError(f'訊息未依日期排序：{date} 重複出現')
+            seen.add(date)
+            current_date = date
+            current = []
+        if keep is None or keep(msg):
+            current.append(msg)
+
+    if current:
+        yield current_date, current
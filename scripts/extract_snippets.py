@@ -1,6 +1,16 @@
 import json
 import re
-from collections import defaultdict
+import heapq
+import argparse
+from functools import partial
+from keyword_matcher import KeywordMatcher
+from window_scoring import WindowScorer, START_MAJOR, window_count
+from chat_stream import iter_messages, iter_days
+from parallel import imap_chunks, resolve_jobs, DEFAULT_CHUNK_SIZE
+from message_filter import MessageFilter
+from batch_scoring import (best_windows, check_backend, BACKENDS, PYTHON_BACKEND,
+                           NUMPY_BACKEND, BATCH_CHUNK_SIZE)
+from instrumentation import PROFILER, ProfileSession, add_profile_arguments
 
 KEYWORDS = {
     '笑点': ['哈哈', '笑死', '好笑', '有趣', 'XDDD', 'XD', '笑', '爆笑', '笑慘', '搞笑', '哭笑'],
@@ -10,7 +20,27 @@ KEYWORDS = {
     '認真': ['討論', '認真', '專業', '分析', '研究', '解釋', '原因', '理由', '看法', '意見', '建議', '方案', '計畫', '議題', '事件', '問題', '解決', '方法', '策略', '目標', '方向', '規劃'],
 }
 
+KEYWORD_MATCHER = KeywordMatcher(KEYWORDS)
+QUESTION_MARKS = ('?', '？')
+WINDOW_SCORER = WindowScorer(KEYWORD_MATCHER, QUESTION_MARKS)
+
 def score_conversation(messages):
+    text = ' '.join([m.get('content', '') for m in messages])
+    hits = KEYWORD_MATCHER.match(text)
+    score, tags = KEYWORD_MATCHER.score_hits(hits)
+    
+    if 2 <= len(messages) <= 5:
+        score += 2
+    
+    # 問號本身也是關鍵字，且關鍵字不含空白、不會跨訊息命中，
+    # 因此「任一訊息含問號」等同於命中問號關鍵字
+    if any(mark in hits for mark in QUESTION_MARKS):
+        score += 1
+    
+    return score, tags
+
+def score_conversation_reference(messages):
+    """逐一掃描關鍵字的原始實作，作為比對基準"""
     score = 0
     tags = set()
     text = ' '.join([m.get('content', '') for m in messages])
@@ -53,106 +83,130 @@ def get_question_types(messages):
     
     return types[:2] if types else ['context-recall']
 
-def extract_snippets(filename, target_count=12):
-    with open(filename, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    messages = data['messages']
-    by_date = defaultdict(list)
-    for msg in messages:
-        by_date[msg['date']].append(msg)
-    
-    snippets = []
-    
-    for date, day_msgs in by_date.items():
-        valid_msgs = [m for m in day_msgs if m.get('content') and 
-                     '[照片]' not in m['content'] and 
-                     '[貼圖]' not in m['content'] and
-                     '[影片]' not in m['content'] and
-                     '☎' not in m['content'] and
-                     len(m['content']) > 1]
+def _iter_valid_days(filename, message_filter):
+    # 串流逐日讀取，不需一次載入整個匯出檔；過濾規則與 browse_dates 共用
+    filter_day = PROFILER.timed_call('過濾訊息', message_filter.filter)
+    messages = PROFILER.timed_iter('解析 JSON', iter_messages(filename))
+    for date, day_msgs in PROFILER.timed_iter('分組', iter_days(messages)):
+        valid_msgs = filter_day(day_msgs)
         
-        if len(valid_msgs) < 2:
-            continue
+        if len(valid_msgs) >= 2:
+            yield date, valid_msgs
+
+def _best_window_chunk(chunk, backend=PYTHON_BACKEND):
+    # 行程池工作單元：找出每個日期的最高分視窗（同分取最先列舉者）
+    return best_windows(WINDOW_SCORER, [WINDOW_SCORER.masks(valid_msgs) for valid_msgs in chunk],
+                        START_MAJOR, backend)
+
+def extract_snippets(filename, target_count=12, jobs=1, message_filter=None, backend=PYTHON_BACKEND):
+    snippets = []
+    message_filter = message_filter or MessageFilter()
+    chunk_size = BATCH_CHUNK_SIZE if backend == NUMPY_BACKEND else DEFAULT_CHUNK_SIZE
+    
+    # 每個日期只需保留最高分視窗，排序後的挑選結果不變
+    days = _iter_valid_days(filename, message_filter)
+    profiling = PROFILER.enabled
+    for (date, valid_msgs), best in PROFILER.timed_iter('評分', imap_chunks(
+            partial(_best_window_chunk, backend=backend), days, jobs, chunk_size, payload=lambda day: day[1])):
+        score, start_idx, length, mask = best
+        if profiling:
+            PROFILER.count('評分日期')
+            PROFILER.count('評分視窗', window_count(len(valid_msgs)))
         
-        for start_idx in range(len(valid_msgs) - 1):
-            for length in [2, 3, 4, 5]:
-                if start_idx + length <= len(valid_msgs):
-                    snippet = valid_msgs[start_idx:start_idx + length]
-                    score, tags = score_conversation(snippet)
-                    
-                    if score > 2:
-                        snippets.append({
-                            'date': date,
-                            'messages': snippet,
-                            'score': score,
-                            'tags': list(tags),
-                            'question_types': get_question_types(snippet)
-                        })
-    
-    snippets.sort(key=lambda x: x['score'], reverse=True)
-    
-    selected = []
-    used_dates = set()
-    
-    for snippet in snippets:
-        if snippet['date'] not in used_dates and len(selected) < target_count:
-            selected.append(snippet)
-            used_dates.add(snippet['date'])
+        if score > 2:
+            snippets.append({
+                'date': date,
+                'messages': valid_msgs[start_idx:start_idx + length],
+                'score': score,
+                'tags': list(WINDOW_SCORER.mask_tags(mask))
+            })
+    
+    # 每個日期已只剩一個片段；nsmallest 與穩定排序後取前 N 個的結果相同
+    with PROFILER.stage('挑選片段'):
+        selected = heapq.nsmallest(target_count, snippets, key=lambda x: -x['score'])
+        for snippet in selected:
+            snippet['question_types'] = get_question_types(snippet['messages'])
     
     return selected
 
 if __name__ == '__main__':
-    files = {
-        '2019-2020': 'chat_2019_2020.json',
-        '2021-2022': 'chat_2021_2022.json',
-        '2023-2025': 'chat_2023_2025.json'
-    }
+    parser = argparse.ArgumentParser(description='提取有趣对话片段')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='平行评分的进程数（0 表示使用所有 CPU 核心）')
+    parser.add_argument('--media-marker', action='append', default=[],
+                        help='额外排除含此标记的消息，例如 [檔案]、[語音訊息]（可重复指定）')
+    parser.add_argument('--backend', default=PYTHON_BACKEND, choices=BACKENDS,
+                        help='评分后端：python（基准实现）或 numpy（批量矩阵运算，需安装 NumPy）')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    jobs = resolve_jobs(args.jobs)
+    session = ProfileSession(args, 'extract_snippets')
+    try:
+        check_backend(args.backend)
+        session.start()
+    except ValueError as e:
+        print(f'錯誤：{e}')
+        raise SystemExit(1)
 
-    all_results = {}
+    # 執行失敗時仍寫出已收集的效能分析結果
+    try:
+        files = {
+            '2019-2020': 'chat_2019_2020.json',
+            '2021-2022': 'chat_2021_2022.json',
+            '2023-2025': 'chat_2023_2025.json'
+        }
 
-    for period, filename in files.items():
-        print(f'正在处理 {period}...')
-        snippets = extract_snippets(filename, 12)
-        all_results[period] = snippets
-        print(f'找到 {len(snippets)} 个片段\n')
+        all_results = {}
 
-    print('='*80)
-    print('36个有趣对话片段')
-    print('='*80)
+        for period, filename in files.items():
+            print(f'正在处理 {period}...')
+            message_filter = MessageFilter(args.media_marker)
+            snippets = extract_snippets(filename, 12, jobs, message_filter, args.backend)
+            all_results[period] = snippets
+            PROFILER.count('有效訊息', message_filter.accepted)
+            PROFILER.count('排除訊息', message_filter.rejected)
+            print(f'过滤无效消息 {message_filter.rejected} 条：'
+                  + '，'.join(f'{rule} {count}' for rule, count in message_filter.report()))
+            print(f'找到 {len(snippets)} 个片段\n')
 
-    for period, snippets in all_results.items():
-        print(f'\n\n【{period}】共 {len(snippets)} 个片段\n')
+        print('='*80)
+        print('36个有趣对话片段')
+        print('='*80)
+
+        for period, snippets in all_results.items():
+            print(f'\n\n【{period}】共 {len(snippets)} 个片段\n')
         
-        for idx, snippet in enumerate(snippets, 1):
-            print(f'{idx}. 日期：{snippet["date"]}')
-            print(f'   趣味性：{snippet["score"]} 分 | 标签：{", ".join(snippet["tags"])}')
-            print(f'   建议题型：{", ".join(snippet["question_types"])}')
-            print(f'   对话内容：')
+            for idx, snippet in enumerate(snippets, 1):
+                print(f'{idx}. 日期：{snippet["date"]}')
+                print(f'   趣味性：{snippet["score"]} 分 | 标签：{", ".join(snippet["tags"])}')
+                print(f'   建议题型：{", ".join(snippet["question_types"])}')
+                print(f'   对话内容：')
             
-            for msg in snippet['messages']:
-                user = msg['user']
-                content = msg['content']
-                print(f'     {user}：{content}')
+                for msg in snippet['messages']:
+                    user = msg['user']
+                    content = msg['content']
+                    print(f'     {user}：{content}')
             
-            reasons = []
-            if '笑点' in snippet['tags']:
-                reasons.append('包含笑点')
-            if '温馨' in snippet['tags']:
-                reasons.append('温馨互动')
-            if '特殊事件' in snippet['tags']:
-                reasons.append('特殊时刻')
-            if '有梗' in snippet['tags']:
-                reasons.append('有趣的反应')
-            if '認真' in snippet['tags']:
-                reasons.append('认真讨论')
+                reasons = []
+                if '笑点' in snippet['tags']:
+                    reasons.append('包含笑点')
+                if '温馨' in snippet['tags']:
+                    reasons.append('温馨互动')
+                if '特殊事件' in snippet['tags']:
+                    reasons.append('特殊时刻')
+                if '有梗' in snippet['tags']:
+                    reasons.append('有趣的反应')
+                if '認真' in snippet['tags']:
+                    reasons.append('认真讨论')
             
-            print(f'   说明：{" + ".join(reasons) if reasons else "有记忆点的对话"}')
-            print()
+                print(f'   说明：{" + ".join(reasons) if reasons else "有记忆点的对话"}')
+                print()
 
-    print('\n总计：', sum(len(s) for s in all_results.values()), '个片段')
-    
-    # 保存为JSON
-    with open('curated_snippets.json', 'w', encoding='utf-8') as f:
-        json.dump(all_results, f, ensure_ascii=False, indent=2)
-    print('\n结果已保存到 curated_snippets.json')
+        print('\n总计：', sum(len(s) for s in all_results.values()), '个片段')
+    
+        # 保存为JSON
+        with open('curated_snippets.json', 'w', encoding='utf-8') as f:
+            json.dump(all_results, f, ensure_ascii=False, indent=2)
+        print('\n结果已保存到 curated_snippets.json')
+    finally:
+        session.finish()
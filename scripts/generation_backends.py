@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+題目生成後端
+後端只需實作 async generate(prompt) -> 回應文字（JSON）；
+StubBackend 為本機的確定性模擬模型，不需 API 金鑰即可測試流程與量測吞吐量
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+
+STUB_BACKEND = 'stub'
+GEMINI_BACKEND = 'gemini'
+GENERATION_BACKENDS = (STUB_BACKEND, GEMINI_BACKEND)
+
+DEFAULT_MODEL = 'gemini-1.5-flash'
+
+
+class TransientBackendError(Exception):
+    """暫時性錯誤（逾時、配額、伺服器忙碌），可重試"""
+
+
+class GenerationBackend:
+    """生成後端介面"""
+
+    name = None
+
+    async def generate(self, prompt):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode('utf-8'))
+        h.update(b'\0')
+    return int.from_bytes(h.digest()[:8], 'big')
+
+
+class StubBackend(GenerationBackend):
+    """
+    確定性的模擬模型：相同提示詞永遠產生相同題目
+    latency 為平均延遲秒數（實際延遲在 0.5–1.5 倍之間），
+    failure_rate 為每次呼叫發生暫時性錯誤的機率（由提示詞與呼叫次數決定，重試可成功）
+    """
+
+    name = STUB_BACKEND
+
+    def __init__(self, latency=0.5, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = {}
+
+    async def generate(self, prompt):
+        attempt = self.calls.get(prompt, 0)
+        self.calls[prompt] = attempt + 1
+        seed = _digest(prompt)
+        await asyncio.sleep(self.latency * (0.5 + (seed % 1000) / 1000))
+        if _digest(prompt, attempt) % 10000 < self.failure_rate * 10000:
+            raise TransientBackendError('模擬的暫時性錯誤')
+        return json.dumps(self._answer(prompt, seed), ensure_ascii=False)
+
+    @staticmethod
+    def _answer(prompt, seed):
+        """從提示詞中的對話片段組出題目"""
+        messages = [line.split(': ', 1) for line in prompt.splitlines()
+                    if line.startswith('[') and '] ' in line and ': ' in line]
+        messages = [(head.split('] ', 1)[-1], content) for head, content in messages]
+        if not messages:
+            messages = [('', '')]
+        index = seed % len(messages)
+        user, content = messages[index]
+        others = [c for i, (_, c) in enumerate(messages) if i != index] or ['（無）']
+        wrong = [f'{others[(seed >> s) % len(others)][:12]}' for s in (8, 16, 24)]
+        wrong = [w if w != content[:12] else f'{w}？' for w in wrong]
+        return {
+            'question': f'{user}在這段對話中說了什麼？',
+            'correct_answer': content[:12],
+            'wrong_answers': list(dict.fromkeys(wrong + ['都不是', '忘記了']))[:3],
+            'explanation': f'{user}說「{content}」。',
+            'highlight_index': index,
+        }
+
+
+class GeminiBackend(GenerationBackend):
+    """Google Gemini API（需要 google-genai 套件與 GOOGLE_API_KEY 環境變數）"""
+
+    name = GEMINI_BACKEND
+
+    def __init__(self, model=DEFAULT_MODEL, temperature=0.7, max_tokens=1500):
+        try:
+            from google import genai
+        except ImportError:
+            raise ValueError('gemini 後端需要安裝 google-genai（pip install google-genai）')
+        api_key = os.environ.get('GOOGLE_API_KEY')
+        if not api_key:
+            raise ValueError('請設定 GOOGLE_API_KEY 環境變數')
+        self.client = genai.Client(api_key=api_key)
+        self.model = model
+        self.config = {
+            'temperature': temperature,
+            'max_output_tokens': max_tokens,
+            'response_mime_type': 'application/json',
+        }
+
+    async def generate(self, prompt):
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=self.model, contents=prompt, config=self.config)
+        except Exception as e:  # SDK 的錯誤類型隨版本變動，一律視為可重試
+            raise TransientBackendError(str(e)) from e
+        return response.text
+
+
+def create_backend(name, api=None, stub_latency=0.5, stub_failure_rate=0.0):
+    """依名稱建立後端；api 為 ai_generation_config.json 的 api 區段"""
+    api = api or {}
+    if name == STUB_BACKEND:
+        return StubBackend(stub_latency, stub_failure_rate)
+    if name == GEMINI_BACKEND:
+        return GeminiBackend(api.get('model', DEFAULT_MODEL), api.get('temperature', 0.7),
+                             api.get('max_tokens', 1500))
+    raise ValueError(f'無效的生成後端: {name}，請選擇 {list(GENERATION_BACKENDS)}')
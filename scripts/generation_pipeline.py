@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+非同步批次生成題目
+依 config/selected_dates_ai.json 的日期，同時以多個工作協程呼叫生成後端：
+- 同時進行的請求數有上限（--concurrency）
+- 以權杖桶限制每分鐘請求數（--rpm）
+- 暫時性錯誤以指數退避重試
+- 每完成一個日期就附加到進度檔，中斷後重新執行會略過已完成的日期
+- 回應存入快取，片段、題型、難度、範例與提示詞都沒變時直接沿用（--refresh 可指定重新生成的日期）
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+import argparse
+from collections import Counter
+
+from browse_dates import PERIOD_FILES, iter_period_days, score_date
+from generation_backends import (GENERATION_BACKENDS, STUB_BACKEND, TransientBackendError,
+                                 create_backend)
+from merge_ai_questions import TYPE_MAPPING, DIFFICULTY_WEIGHTS
+from question_store import write_json_atomic, load_target
+from response_cache import CACHE_FILE, DEFAULT_MAX_BYTES, ResponseCache, response_key
+
+SELECTED_DATES_FILE = 'config/selected_dates_ai.json'
+GENERATION_CONFIG_FILE = 'config/ai_generation_config.json'
+DRAFT_FILE = 'intermediate/ai_generated_questions_draft.json'
+PROGRESS_FILE = 'intermediate/ai_generation_progress.jsonl'
+QUESTION_FILE = 'final_questions_new.json'
+
+# 提示詞範本有變動時遞增，使快取的舊回應失效
+PROMPT_VERSION = 1
+FEW_SHOT_PER_TYPE = 1
+
+# 未提供 ai_generation_config.json 時的分布（與 AI_GENERATION_README.md 相同）
+DEFAULT_DIFFICULTY_DISTRIBUTION = {'困难': 6, '中等': 6, '简单': 3}
+DEFAULT_TYPE_DISTRIBUTION = {
+    'context-recall': 3,
+    'detail-observation': 2,
+    'preference-memory': 3,
+    'opinion-expression': 2,
+    'action-motivation': 3,
+    'action-intention': 2,
+}
+
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 1.0     # 第 n 次重試前等待 BACKOFF_BASE × 2^(n-1) 秒（再加上隨機抖動）
+BACKOFF_MAX = 30.0
+
+
+class TokenBucket:
+    """權杖桶限速：每秒補充 rate 個權杖，最多累積 capacity 個"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, cost=1):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= cost:
+                    self.tokens -= cost
+                    return
+                await asyncio.sleep((cost - self.tokens) / self.rate)
+
+
+def period_of_date(date):
+    """日期所屬的時期（依 PERIOD_FILES 的年份範圍）"""
+    year = int(date[:4])
+    for period in PERIOD_FILES:
+        first, last = (int(y) for y in period.split('-'))
+        if first <= year <= last:
+            return period
+    raise ValueError(f'日期 {date} 不屬於任何時期')
+
+
+def load_json(path, default=None):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        if default is None:
+            raise
+        return default
+
+
+def expand_distribution(distribution, count):
+    """將 {值: 數量} 展開成長度 count 的列表（不足時依比例循環）"""
+    values = [value for value, n in distribution.items() for _ in range(n)]
+    if not values:
+        raise ValueError('分布設定不可為空')
+    return [values[i % len(values)] for i in range(count)]
+
+
+def plan_jobs(dates, generation_config):
+    """為每個日期指定題型與難度，回傳工作列表"""
+    types = expand_distribution(
+        generation_config.get('type_distribution', DEFAULT_TYPE_DISTRIBUTION), len(dates))
+    difficulties = expand_distribution(
+        generation_config.get('difficulty_distribution', DEFAULT_DIFFICULTY_DISTRIBUTION),
+        len(dates))
+    for q_type in types:
+        if q_type not in TYPE_MAPPING:
+            raise ValueError(f'未知題型: {q_type}')
+    for difficulty in difficulties:
+        if difficulty not in DIFFICULTY_WEIGHTS:
+            raise ValueError(f'未知難度: {difficulty}')
+    return [{'date': date, 'period': period_of_date(date), 'type': q_type, 'difficulty': difficulty}
+            for date, q_type, difficulty in zip(dates, types, difficulties)]
+
+
+def attach_snippets(jobs):
+    """每個時期只串流讀取一次，為工作加上最佳對話片段與標籤；找不到的日期回傳在列表中"""
+    wanted = {}
+    for job in jobs:
+        wanted.setdefault(job['period'], {})[job['date']] = job
+    missing = []
+    for period, by_date in wanted.items():
+        for date, messages in iter_period_days(period, dates=set(by_date)):
+            if len(messages) < 2:
+                continue
+            score, tags, snippet = score_date(messages)
+            by_date[date].update(conversation=snippet, tags=tags)
+        missing.extend(date for date, job in by_date.items() if 'conversation' not in job)
+    return missing
+
+
+def load_few_shot_examples(question_file=QUESTION_FILE, per_type=FEW_SHOT_PER_TYPE):
+    """從現有題庫為每個題型取前 per_type 題作為範例，回傳 {題型: [範例]}"""
+    examples = {}
+    for q in load_target(question_file):
+        bucket = examples.setdefault(q['type'], [])
+        if len(bucket) >= per_type:
+            continue
+        correct = next((opt['text'] for opt in q['options'] if opt.get('isCorrect')), '')
+        bucket.append({
+            'conversation': [f"{m['user']}: {m['content']}" for m in q['conversation']['context']],
+            'question': q['question'],
+            'correct_answer': correct,
+            'explanation': q['explanation'],
+        })
+    return examples
+
+
+def build_prompt(job, examples=()):
+    """生成題目的提示詞"""
+    category = TYPE_MAPPING[job['type']]['category']
+    lines = [
+        '你是友誼記憶測驗的出題者。請根據下面的對話片段，出一道四選一的選擇題。',
+        f"題型：{category}（{job['type']}）",
+        f"難度：{job['difficulty']}",
+        f"日期：{job['date']}",
+        '',
+    ]
+    for example in examples:
+        lines.append('範例對話：')
+        lines += [f'  {line}' for line in example['conversation']]
+        lines += [
+            f"範例題目：{example['question']}",
+            f"範例答案：{example['correct_answer']}",
+            f"範例解釋：{example['explanation']}",
+            '',
+        ]
+    lines.append('對話片段：')
+    lines += [f"[{i}] {msg['user']}: {msg['content']}" for i, msg in enumerate(job['conversation'])]
+    lines += [
+        '',
+        '請使用繁體中文，只輸出 JSON：',
+        '{"question": "題目", "correct_answer": "正確答案", "wrong_answers": ["錯誤1", "錯誤2", "錯誤3"], '
+        '"explanation": "引用對話的解釋", "highlight_index": 關鍵訊息的編號}',
+    ]
+    return '\n'.join(lines)
+
+
+def parse_response(text, job):
+    """解析後端回應；格式錯誤時拋出 ValueError（會重試）"""
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f'回應不是有效的 JSON: {e}')
+    if not isinstance(data, dict):
+        raise ValueError(f'回應不是 JSON 物件: {type(data).__name__}')
+    required = ('question', 'correct_answer', 'wrong_answers', 'explanation')
+    missing = [key for key in required if not data.get(key)]
+    if missing:
+        raise ValueError(f'回應缺少欄位: {missing}')
+    wrong_answers = data['wrong_answers']
+    if not isinstance(wrong_answers, list) or not all(isinstance(w, str) for w in wrong_answers):
+        raise ValueError('wrong_answers 不是文字列表')
+    if len(wrong_answers) < 3:
+        raise ValueError('錯誤選項少於 3 個')
+    index = data.get('highlight_index', 0)
+    if type(index) is not int or not 0 <= index < len(job['conversation']):
+        index = 0
+    return {
+        'question': data['question'],
+        'correct_answer': data['correct_answer'],
+        'wrong_answers': data['wrong_answers'][:3],
+        'explanation': data['explanation'],
+        'highlight_index': index,
+    }
+
+
+def draft_record(job, question_data):
+    """初稿格式（review_ai_questions.py 讀取的格式）"""
+    return {
+        'date': job['date'],
+        'period': job['period'],
+        'type': job['type'],
+        'difficulty': job['difficulty'],
+        'tags': job.get('tags', []),
+        'conversation': job['conversation'],
+        'question_data': question_data,
+    }
+
+
+class ProgressLog:
+    """
+    進度檔（JSONL）：每完成或放棄一個日期附加一行
+    以 (日期, 題型, 難度) 判斷是否已完成；設定改變的日期會重新生成
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # 中斷時寫到一半的最後一行
+                    if entry.get('status') == 'ok':
+                        self.done[self._key(entry['record'])] = entry['record']
+        except FileNotFoundError:
+            pass
+        self._file = None
+
+    @staticmethod
+    def _key(job):
+        return job['date'], job['type'], job['difficulty']
+
+    def completed(self, job):
+        return self.done.get(self._key(job))
+
+    def append(self, entry):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._file = open(self.path, 'a+', encoding='utf-8')
+            # 上次中斷時最後一行可能沒寫完，先換行避免與新紀錄接在一起
+            if self._file.tell() > 0:
+                self._file.seek(self._file.tell() - 1)
+                if self._file.read(1) != '\n':
+                    self._file.write('\n')
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._file.flush()
+        if entry.get('status') == 'ok':
+            self.done[self._key(entry['record'])] = entry['record']
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class GenerationPipeline:
+    """有界並行的生成流程"""
+
+    def __init__(self, backend, progress, concurrency=4, rpm=None, max_attempts=MAX_ATTEMPTS,
+                 backoff_base=BACKOFF_BASE, cache=None, examples=None, refresh=()):
+        self.backend = backend
+        self.progress = progress
+        self.cache = cache
+        self.examples = examples or {}
+        self.refresh = set(refresh)
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rpm / 60.0, capacity=max(1.0, concurrency)) if rpm else None
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.stats = Counter()
+
+    def _cache_key(self, job, examples):
+        return response_key(job['conversation'], job['type'], job['difficulty'], examples,
+                            PROMPT_VERSION, self.backend.name, getattr(self.backend, 'model', None))
+
+    async def _generate(self, job):
+        """
+        呼叫後端直到成功或用盡重試次數，回傳 (題目資料, 嘗試次數)
+        使用快取的回應時嘗試次數為 0
+        """
+        examples = self.examples.get(job['type'], [])
+        prompt = build_prompt(job, examples)
+        key = None
+        if self.cache is not None:
+            key = self._cache_key(job, examples)
+            cached = None if job['date'] in self.refresh else self.cache.get(key)
+            if cached is not None:
+                try:
+                    return parse_response(cached, job), 0
+                except ValueError:
+                    self.cache.discard(key)
+
+        for attempt in range(1, self.max_attempts + 1):
+            if self.bucket is not None:
+                await self.bucket.acquire()
+            self.stats['requests'] += 1
+            try:
+                text = await self.backend.generate(prompt)
+                question_data = parse_response(text, job)
+                if key is not None:
+                    self.cache.put(key, text, job['date'])
+                return question_data, attempt
+            except (TransientBackendError, ValueError):
+                if attempt == self.max_attempts:
+                    raise
+                self.stats['retries'] += 1
+                delay = min(BACKOFF_MAX, self.backoff_base * 2 ** (attempt - 1))
+                await asyncio.sleep(delay * (0.5 + random.random() / 2))
+
+    async def _worker(self, queue, total, report):
+        while True:
+            index, job = await queue.get()
+            try:
+                question_data, attempts = await self._generate(job)
+            except Exception as e:
+                # 非預期的錯誤也記為失敗，避免工作者結束後 queue.join() 永遠等不到
+                error = str(e)
+                if not isinstance(e, (TransientBackendError, ValueError)):
+                    error = f'{type(e).__name__}: {error}'
+                self.stats['failed'] += 1
+                self.progress.append({'status': 'failed', 'date': job['date'], 'error': error})
+                report(index, total, job, None, error)
+            else:
+                self.stats['generated' if attempts else 'cached'] += 1
+                record = draft_record(job, question_data)
+                self.progress.append({'status': 'ok', 'attempts': attempts, 'record': record})
+                report(index, total, job, attempts, None)
+            finally:
+                queue.task_done()
+
+    async def run(self, jobs, report=lambda *args: None):
+        """生成所有未完成的工作，回傳依工作順序排列的初稿（含先前已完成者）"""
+        queue = asyncio.Queue()
+        pending = [job for job in jobs
+                   if job['date'] in self.refresh or self.progress.completed(job) is None]
+        self.stats['resumed'] = len(jobs) - len(pending)
+        for item in enumerate(pending):
+            queue.put_nowait(item)
+        workers = [asyncio.create_task(self._worker(queue, len(pending), report))
+                   for _ in range(min(self.concurrency, len(pending)))]
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await self.backend.close()
+        return [record for record in map(self.progress.completed, jobs) if record is not None]
+
+
+def print_report(index, total, job, attempts, error):
+    label = f"{job['date']} ({job['type']}, {job['difficulty']})"
+    if error is None:
+        if attempts == 0:
+            note = '（快取）'
+        else:
+            note = f'，重試 {attempts - 1} 次' if attempts > 1 else ''
+        print(f'  ✓ {label}{note}')
+    else:
+        print(f'  ✗ {label}: {error}')
+
+
+def main():
+    """主執行流程"""
+    parser = argparse.ArgumentParser(description='非同步批次生成題目')
+    parser.add_argument('--dates', default=SELECTED_DATES_FILE,
+                        help='選定日期檔案')
+    parser.add_argument('--config', default=GENERATION_CONFIG_FILE,
+                        help='生成配置檔案（題型、難度分布與 API 設定）')
+    parser.add_argument('--output', default=DRAFT_FILE,
+                        help='初稿輸出檔案')
+    parser.add_argument('--progress', default=PROGRESS_FILE,
+                        help='進度檔（中斷後重新執行會略過已完成的日期）')
+    parser.add_argument('--restart', action='store_true',
+                        help='忽略並清除進度檔，全部重新生成')
+    parser.add_argument('--backend', default=STUB_BACKEND, choices=GENERATION_BACKENDS,
+                        help='生成後端（stub 為本機模擬模型）')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='同時進行的請求數上限')
+    parser.add_argument('--rpm', type=float, default=60,
+                        help='每分鐘請求數上限（0 表示不限制）')
+    parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS,
+                        help='每個日期最多嘗試次數')
+    parser.add_argument('--backoff', type=float, default=BACKOFF_BASE,
+                        help='第一次重試前的等待秒數（之後每次加倍）')
+    parser.add_argument('--refresh', action='append', default=[], metavar='DATE',
+                        help='忽略快取與進度，重新生成此日期（可重複指定）')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='不使用回應快取')
+    parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help='回應快取大小上限（MB），超過時淘汰最久未用的回應')
+    parser.add_argument('--stub-latency', type=float, default=0.5,
+                        help='stub 後端的平均延遲秒數')
+    parser.add_argument('--stub-failure-rate', type=float, default=0.0,
+                        help='stub 後端的暫時性錯誤機率（0-1）')
+    args = parser.parse_args()
+
+    print('=' * 80)
+    print('非同步批次生成題目')
+    print('=' * 80)
+    print()
+
+    print('載入配置...')
+    selected = load_json(args.dates)
+    generation_config = load_json(args.config, default={})
+    jobs = plan_jobs(list(dict.fromkeys(selected['dates'])), generation_config)
+    print(f'  ✓ 選定 {len(jobs)} 個日期')
+
+    missing = attach_snippets(jobs)
+    if missing:
+        print(f"  ⊙ 找不到對話的日期（略過）: {', '.join(missing)}")
+        jobs = [job for job in jobs if 'conversation' in job]
+    examples = load_few_shot_examples()
+    print(f'  ✓ 載入 {len(examples)} 種題型的範例')
+    print()
+
+    if args.restart and os.path.exists(args.progress):
+        os.remove(args.progress)
+    progress = ProgressLog(args.progress)
+    backend = create_backend(args.backend, generation_config.get('api'),
+                             args.stub_latency, args.stub_failure_rate)
+    cache = None if args.no_cache else ResponseCache(CACHE_FILE, int(args.cache_max_mb * 1024 * 1024))
+    pipeline = GenerationPipeline(backend, progress, args.concurrency, args.rpm,
+                                  args.max_attempts, args.backoff, cache, examples, args.refresh)
+
+    print(f'開始生成（後端: {args.backend}，並行: {args.concurrency}，'
+          f"每分鐘上限: {args.rpm or '不限'}）...")
+    started = time.perf_counter()
+    try:
+        drafts = asyncio.run(pipeline.run(jobs, print_report))
+    except KeyboardInterrupt:
+        print()
+        print(f'⊙ 已中斷，進度保存在 {args.progress}，重新執行即可繼續')
+        return
+    finally:
+        progress.close()
+        if cache is not None:
+            cache.close()
+    elapsed = time.perf_counter() - started
+
+    stats = pipeline.stats
+    print()
+    print('=' * 80)
+    print('生成結果統計')
+    print('=' * 80)
+    print()
+    print(f'總題目數: {len(drafts)}/{len(jobs)}')
+    print(f"本次生成: {stats['generated']}（沿用快取: {stats['cached']}，先前已完成: {stats['resumed']}）")
+    print(f"失敗: {stats['failed']}")
+    print(f"請求數: {stats['requests']}（重試: {stats['retries']}）")
+    rate = stats['generated'] / elapsed if elapsed > 0 else 0
+    print(f'耗時: {elapsed:.2f} 秒（{rate:.2f} 題/秒）')
+    print()
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    write_json_atomic(args.output, drafts, indent=2)
+    print(f'✓ 題目已保存至: {args.output}')
+    if stats['failed']:
+        print(f'⊙ {stats["failed"]} 個日期生成失敗，重新執行會再次嘗試')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量評分與監看模式
+記錄上次讀到的位置（最後一天之前的最後一則訊息結尾）與該段內容的 SHA-256，
+匯出檔只在尾端新增訊息時直接從該位置續讀；只評分新增或內容變動的日期，
+合併進保存的排名，並列出新的候選日期
+"""
+
+import hashlib
+import heapq
+import json
+import os
+import time
+import argparse
+from bisect import bisect_left
+
+from browse_dates import (PERIOD_FILES, period_file, iter_scored_days, load_used_dates,
+                          set_media_markers, _rank_key)
+import browse_dates
+from chat_stream import iter_messages_with_offsets
+from score_cache import CACHE_DIR, scoring_fingerprint, messages_digest
+from batch_scoring import BACKENDS, PYTHON_BACKEND, check_backend
+from parallel import resolve_jobs
+
+STATE_VERSION = 1
+
+
+def state_path(period, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f'ingest_{period}.json')
+
+
+def prefix_hash(path, end, start=0, h=None, chunk_size=1 << 20):
+    """檔案 [start, end) 位元組的 SHA-256（h 為前段的雜湊物件時接續計算）"""
+    h = h or hashlib.sha256()
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            h.update(chunk)
+            remaining -= len(chunk)
+    return h
+
+
+class IngestState:
+    """單一時期的增量狀態：續讀位置與所有日期的評分紀錄"""
+
+    def __init__(self, period, cache_dir=CACHE_DIR):
+        self.period = period
+        self.path = state_path(period, cache_dir)
+        self.settings = {
+            'version': STATE_VERSION,
+            'fingerprint': scoring_fingerprint(),
+            'media_markers': list(browse_dates.MESSAGE_FILTER.markers),
+        }
+        self.size = None
+        self.mtime_ns = None
+        self.checkpoint = None
+        self.prefix_sha256 = None
+        self.dates = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        # 評分規則或過濾規則變動時，所有日期都需重新評分
+        if data.get('settings') != self.settings:
+            return
+        self.size = data['size']
+        self.mtime_ns = data['mtime_ns']
+        self.checkpoint = data['checkpoint']
+        self.prefix_sha256 = data['prefix_sha256']
+        self.dates = data['dates']
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'settings': self.settings,
+                'size': self.size,
+                'mtime_ns': self.mtime_ns,
+                'checkpoint': self.checkpoint,
+                'prefix_sha256': self.prefix_sha256,
+                'dates': self.dates,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def is_unchanged(self, source):
+        stat = os.stat(source)
+        return (self.size, self.mtime_ns) == (stat.st_size, stat.st_mtime_ns)
+
+    def verify_prefix(self, source):
+        """
+        來源檔前段與上次相同時回傳 (續讀位置, 前段雜湊物件)，否則回傳 (None, None)
+        匯出檔只在尾端新增訊息時，續讀位置之前的位元組不會改變
+        """
+        if self.checkpoint is None or os.path.getsize(source) < self.checkpoint:
+            return None, None
+        h = prefix_hash(source, self.checkpoint)
+        if h.hexdigest() != self.prefix_sha256:
+            return None, None
+        return self.checkpoint, h
+
+
+def _iter_days_with_offsets(messages):
+    """將 (訊息, 結束位移) 串流按日期分組，產生 (日期, 訊息列表, 當日最後一則的結束位移)"""
+    current_date = None
+    current = []
+    end = None
+    for msg, offset in messages:
+        if msg['date'] != current_date:
+            if current:
+                yield current_date, current, end
+            current_date = msg['date']
+            current = []
+        current.append(msg)
+        end = offset
+    if current:
+        yield current_date, current, end
+
+
+def ingest(period, state, jobs=1, backend=PYTHON_BACKEND):
+    """
+    讀取來源檔的新增部分並評分新增或變動的日期，回傳 (變動日期列表, 片段, 統計)
+
+    片段只保留變動日期中的最佳片段；最後一天可能在下次匯出時增加訊息，
+    因此續讀位置固定設在最後一天之前。
+    """
+    source = period_file(period)
+    stat = os.stat(source)
+    stats = {'resumed': False, 'days': 0, 'unchanged': 0, 'removed': 0}
+
+    resume, h = state.verify_prefix(source)
+    known = state.dates
+    if resume is None:
+        state.dates = {}
+    else:
+        stats['resumed'] = True
+    # 續讀時只有上次的最後一天可能出現在新增部分
+    last_known = next(reversed(known), None) if resume is not None else None
+
+    changed = []
+    last_end = resume
+    checkpoint = resume
+
+    def changed_days():
+        nonlocal last_end, checkpoint
+        seen = set()
+        for date, messages, end in _iter_days_with_offsets(iter_messages_with_offsets(source, resume)):
+            if date in seen or (resume is not None and date in known and date != last_known):
+                raise ValueError(f'訊息未依日期排序：{date} 重複出現')
+            seen.add(date)
+            # 續讀位置：目前最後一天之前的最後一則訊息結尾
+            checkpoint = last_end
+            last_end = end
+            stats['days'] += 1
+
+            valid = browse_dates.MESSAGE_FILTER.filter(messages)
+            digest = messages_digest(valid)
+            previous = known.get(date)
+            if previous is not None and previous['digest'] == digest:
+                stats['unchanged'] += 1
+                state.dates[date] = previous
+                continue
+            if len(valid) < 2:
+                state.dates[date] = {'digest': digest, 'score': None, 'tags': [],
+                                     'start': 0, 'length': 0, 'total_messages': len(valid)}
+                continue
+            # 先佔位以保持日期的出現順序（同分排序依此順序）
+            state.dates[date] = None
+            yield date, valid
+
+    snippets = {}
+    for date, messages, score, tags, start, length in iter_scored_days(changed_days(), None, jobs,
+                                                                       backend=backend):
+        state.dates[date] = {'digest': messages_digest(messages), 'score': score, 'tags': tags,
+                             'start': start, 'length': length, 'total_messages': len(messages)}
+        changed.append(date)
+        snippets[date] = messages[start:start + length]
+
+    if resume is None:
+        stats['removed'] = len(set(known) - set(state.dates))
+
+    # 前段雜湊由上次的續讀位置接續計算，不需重新讀取整個前段
+    state.checkpoint = checkpoint
+    if checkpoint is None:
+        state.prefix_sha256 = None
+    elif resume is not None:
+        state.prefix_sha256 = prefix_hash(source, checkpoint, resume, h).hexdigest()
+    else:
+        state.prefix_sha256 = prefix_hash(source, checkpoint).hexdigest()
+    state.size, state.mtime_ns = stat.st_size, stat.st_mtime_ns
+    return changed, snippets, stats
+
+
+def ranking_positions(state, dates):
+    """指定日期在整體排名中的名次（分數降序，同分依出現順序）"""
+    records = [dict(record, date=date, seq=seq)
+               for seq, (date, record) in enumerate(state.dates.items())
+               if record['score'] is not None]
+    keys = {r['date']: _rank_key(r) for r in records}
+    ordered = sorted(keys.values())
+    positions = {date: bisect_left(ordered, keys[date]) + 1 for date in dates if date in keys}
+    return positions, len(records)
+
+
+def run_once(period, min_score=3, exclude_used=True, jobs=1, backend=PYTHON_BACKEND, limit=20):
+    """執行一次增量評分並列出新的候選日期"""
+    source = period_file(period)
+    state = IngestState(period)
+
+    print('=' * 80)
+    print(f'增量評分 - {period}（{time.strftime("%Y-%m-%d %H:%M:%S")}）')
+    print('=' * 80)
+
+    if state.is_unchanged(source):
+        print('⊙ 來源檔未變動，略過')
+        print()
+        return []
+
+    started = time.perf_counter()
+    try:
+        changed, snippets, stats = ingest(period, state, jobs, backend)
+    except ValueError as e:
+        if state.checkpoint is None:
+            raise
+        # 既有日期的內容被改寫（不只是尾端新增），改為完整重讀
+        print(f'  ⊙ {e}，改為完整重讀')
+        state = IngestState(period)
+        state.checkpoint = None
+        changed, snippets, stats = ingest(period, state, jobs, backend)
+    state.save()
+    elapsed = time.perf_counter() - started
+
+    mode = '從上次位置續讀' if stats['resumed'] else '完整讀取'
+    print(f'  ✓ {mode}：讀取 {stats["days"]} 個日期（{elapsed:.2f} 秒）')
+    print(f'  ✓ 新增或變動: {len(changed)} 個，未變動: {stats["unchanged"]} 個')
+    if stats['removed']:
+        print(f'  ⊙ 已自排名移除: {stats["removed"]} 個日期')
+
+    used_dates = load_used_dates() if exclude_used else set()
+    candidates = [date for date in changed
+                  if state.dates[date]['score'] >= min_score and date not in used_dates]
+    positions, total = ranking_positions(state, candidates)
+    top = heapq.nsmallest(limit, candidates, key=lambda d: positions[d])
+    print(f'  ✓ 新候選日期（分數 >= {min_score}）: {len(candidates)} 個')
+    print()
+
+    for date in top:
+        record = state.dates[date]
+        print(f"{date} | 分數: {record['score']} | 排名: {positions[date]} / {total} | "
+              f"訊息數: {record['total_messages']}")
+        print(f"   標籤: {', '.join(record['tags'])}")
+        print(f"   對話片段:")
+        for msg in snippets[date]:
+            print(f"     {msg['user']}: {msg['content']}")
+        print()
+    if len(candidates) > len(top):
+        print(f'...（其餘 {len(candidates) - len(top)} 個未顯示）')
+        print()
+    return candidates
+
+
+def main():
+    """主執行流程"""
+    parser = argparse.ArgumentParser(description='增量評分：只處理新匯出或變動的日期')
+    parser.add_argument('--period', default='2023-2025', choices=list(PERIOD_FILES.keys()),
+                        help='時期選擇')
+    parser.add_argument('--min-score', type=int, default=3,
+                        help='最低分數閾值')
+    parser.add_argument('--limit', type=int, default=20,
+                        help='每次最多顯示的新候選日期數')
+    parser.add_argument('--include-used', action='store_true',
+                        help='包含已使用的日期（預設會排除）')
+    parser.add_argument('--watch', type=float, default=None, metavar='SECONDS',
+                        help='持續監看來源檔，每隔指定秒數檢查一次')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='平行評分的行程數（0 表示使用所有 CPU 核心）')
+    parser.add_argument('--backend', default=PYTHON_BACKEND, choices=BACKENDS,
+                        help='評分後端')
+    parser.add_argument('--media-marker', action='append', default=[],
+                        help='額外排除含此標記的訊息（可重複指定）')
+    args = parser.parse_args()
+
+    check_backend(args.backend)
+    if args.media_marker:
+        set_media_markers(args.media_marker)
+
+    options = dict(min_score=args.min_score, exclude_used=not args.include_used,
+                   jobs=resolve_jobs(args.jobs), backend=args.backend, limit=args.limit)
+    run_once(args.period, **options)
+    if args.watch is None:
+        return
+
+    source = period_file(args.period)
+    print(f'監看 {source}（每 {args.watch:g} 秒檢查一次，Ctrl+C 結束）')
+    stat_key = lambda: (os.stat(source).st_size, os.stat(source).st_mtime_ns)
+    last_stat = stat_key()
+    try:
+        while True:
+            time.sleep(args.watch)
+            current = stat_key()
+            if current == last_stat:
+                continue
+            # 等待匯出檔寫入完成（短暫等待後大小與修改時間不再變動）再處理
+            time.sleep(min(args.watch, 1.0))
+            if stat_key() != current:
+                continue
+            last_stat = current
+            run_once(args.period, **options)
+    except KeyboardInterrupt:
+        print('\n結束監看')
+
+
+if __name__ == '__main__':
+    main()
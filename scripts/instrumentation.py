@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+效能分析工具（--profile）
+各階段計時（含自身耗時，扣除巢狀階段）、計數器與記憶體峰值取樣，結束時列印摘要表並寫出 JSON 追蹤檔
+（traceEvents 可直接以 chrome://tracing 或 Perfetto 開啟），另可輸出 cProfile / pyinstrument 結果。
+未啟用時 timed_iter / timed_call 直接回傳原物件、stage 回傳共用的空 context，內層迴圈沒有額外負擔
+"""
+
+import contextlib
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+PROFILE_DIR = 'profile'
+TRACE_VERSION = 1
+SAMPLE_INTERVAL = 0.05   # 記憶體取樣間隔（秒）
+
+CPROFILE = 'cprofile'
+PYINSTRUMENT = 'pyinstrument'
+PROFILE_TOOLS = (CPROFILE, PYINSTRUMENT)
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def current_rss():
+    """目前的常駐記憶體（位元組）；無 /proc 的平台回傳目前為止的峰值，兩者皆無（Windows）時回傳 0"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+        except ImportError:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _Span:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._enter(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._exit(event=True)
+        return False
+
+
+class Profiler:
+    """
+    階段計時與計數器
+    stats: 名稱 -> [次數, 總耗時, 自身耗時, 記憶體峰值]；
+    自身耗時扣除在此階段內執行的其他階段（例如「分組」不含其中讀取的「解析 JSON」）
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stats = {}
+        self.counters = Counter()
+        self.events = []
+        self.peak_rss = 0
+        self._stack = []   # [名稱, 開始時間, 子階段耗時]
+        self._origin = None
+        self._started = None
+        self._elapsed = None
+        self._sampler = None
+        self._stop = threading.Event()
+
+    def enable(self, sample_interval=SAMPLE_INTERVAL):
+        self.enabled = True
+        self._origin = time.perf_counter()
+        self._started = datetime.now()
+        self.peak_rss = current_rss()
+        if sample_interval:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample, args=(sample_interval,), daemon=True)
+            self._sampler.start()
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._elapsed = time.perf_counter() - self._origin
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        self.peak_rss = max(self.peak_rss, current_rss())
+
+    def _sample(self, interval):
+        """背景取樣記憶體，記在當時最內層的階段上"""
+        while not self._stop.wait(interval):
+            self._record_rss(current_rss())
+
+    def _record_rss(self, rss):
+        if rss > self.peak_rss:
+            self.peak_rss = rss
+        try:
+            name = self._stack[-1][0]
+        except IndexError:
+            return
+        stat = self.stats.get(name)
+        if stat is not None and rss > stat[3]:
+            stat[3] = rss
+
+    def _enter(self, name):
+        if name not in self.stats:
+            self.stats[name] = [0, 0.0, 0.0, 0]
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def _exit(self, event=False):
+        end = time.perf_counter()
+        name, start, children = self._stack.pop()
+        elapsed = end - start
+        stat = self.stats[name]
+        stat[0] += 1
+        stat[1] += elapsed
+        stat[2] += elapsed - children
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        if event:
+            self._record_rss(current_rss())
+            self.events.append({'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                                'ts': round((start - self._origin) * 1e6),
+                                'dur': round(elapsed * 1e6)})
+
+    def stage(self, name):
+        """以 with 計時一個階段（同時記錄在追蹤檔的時間軸上）"""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _Span(self, name)
+
+    def timed_iter(self, name, iterable):
+        """計算取出每個項目所花的時間（串流處理的各層分別計時）；未啟用時直接回傳 iterable"""
+        if not self.enabled:
+            return iterable
+        return self._timed_iter(name, iterable)
+
+    def _timed_iter(self, name, iterable):
+        iterator = iter(iterable)
+        enter, exit_ = self._enter, self._exit
+        while True:
+            enter(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                exit_()
+                return
+            except BaseException:
+                exit_()
+                raise
+            exit_()
+            yield item
+
+    def timed_call(self, name, func):
+        """計時每次呼叫 func；未啟用時直接回傳 func"""
+        if not self.enabled:
+            return func
+        enter, exit_ = self._enter, self._exit
+
+        def timed(*args, **kwargs):
+            enter(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                exit_()
+        return timed
+
+    def count(self, name, n=1):
+        """累加計數器（內層迴圈中請先檢查 enabled，或在迴圈結束後一次累加）"""
+        if self.enabled:
+            self.counters[name] += n
+
+    @property
+    def total_seconds(self):
+        if self._origin is None:
+            return 0.0
+        if self.enabled:
+            return time.perf_counter() - self._origin
+        return self._elapsed
+
+    def summary(self):
+        total = self.total_seconds
+        return {
+            'version': TRACE_VERSION,
+            'started': self._started.isoformat(timespec='seconds') if self._started else None,
+            'total_seconds': total,
+            'peak_rss_bytes': self.peak_rss,
+            'stages': [{'name': name, 'calls': calls, 'seconds': inclusive, 'self_seconds': exclusive,
+                        'self_share': exclusive / total if total else None,
+                        'peak_rss_bytes': peak or None}
+                       for name, (calls, inclusive, exclusive, peak) in self.stats.items()],
+            'counters': dict(self.counters),
+        }
+
+    def print_summary(self, file=None):
+        file = file or sys.stdout
+        data = self.summary()
+        total = data['total_seconds']
+        accounted = sum(stage['self_seconds'] for stage in data['stages'])
+        out = lambda line='': print(line, file=file)
+        out('=' * 80)
+        out(f'效能分析（總計 {total:.3f} 秒，記憶體峰值 {data["peak_rss_bytes"] / 1024 / 1024:.1f} MB）')
+        out('=' * 80)
+        out(f"{'階段':<24}{'次數':>10}{'總耗時':>10}{'自身耗時':>10}{'占比':>8}{'記憶體峰值':>12}")
+        out('-' * 80)
+        for stage in sorted(data['stages'], key=lambda s: -s['self_seconds']):
+            peak = f"{stage['peak_rss_bytes'] / 1024 / 1024:.1f} MB" if stage['peak_rss_bytes'] else '-'
+            share = f"{stage['self_share']:.1%}" if stage['self_share'] is not None else '-'
+            out(f"{stage['name']:<24}{stage['calls']:>10,}{stage['seconds']:>10.3f}"
+                f"{stage['self_seconds']:>10.3f}{share:>8}{peak:>12}")
+        out(f"{'（未計時）':<24}{'':>10}{'':>10}{max(0.0, total - accounted):>10.3f}")
+        if data['counters']:
+            out()
+            out('計數器：')
+            for name, value in data['counters'].items():
+                out(f'  {name}: {value:,}')
+        out()
+
+    def write_trace(self, path):
+        from question_store import write_json_atomic
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        data = self.summary()
+        data['argv'] = sys.argv
+        data['traceEvents'] = self.events
+        write_json_atomic(path, data, indent=2)
+
+
+# 各腳本共用的分析器（預設停用）
+PROFILER = Profiler()
+
+
+def add_profile_arguments(parser):
+    group = parser.add_argument_group('效能分析')
+    group.add_argument('--profile', nargs='?', const='', default=None, metavar='TRACE',
+                       help=f'啟用效能分析，結束時列印摘要並寫出 JSON 追蹤檔'
+                            f'（預設 {PROFILE_DIR}/<腳本>-<時間>.json）')
+    group.add_argument('--profile-dump', default=None, metavar='FILE',
+                       help='另外輸出函式層級的分析結果（會拖慢執行，階段耗時僅供相對比較）')
+    group.add_argument('--profile-tool', default=CPROFILE, choices=PROFILE_TOOLS,
+                       help='--profile-dump 使用的工具：cprofile（pstats 格式）或 pyinstrument'
+                            '（.html 為網頁，其餘為文字；需安裝 pyinstrument）')
+
+
+class ProfileSession:
+    """依命令列參數啟用 PROFILER 與函式層級分析，finish() 時輸出結果；未啟用時不做任何事"""
+
+    def __init__(self, args, script):
+        self.script = script
+        self.trace_path = getattr(args, 'profile', None)
+        self.dump_path = getattr(args, 'profile_dump', None)
+        self.tool = getattr(args, 'profile_tool', CPROFILE)
+        self.active = self.trace_path is not None or self.dump_path is not None
+        self._profiler = None
+
+    def start(self):
+        if not self.active:
+            return self
+        if self.dump_path:
+            if self.tool == PYINSTRUMENT:
+                try:
+                    from pyinstrument import Profiler as InstrumentProfiler
+                except ImportError:
+                    raise ValueError('--profile-tool pyinstrument 需要安裝 pyinstrument（pip install pyinstrument）')
+                self._profiler = InstrumentProfiler()
+            else:
+                import cProfile
+                self._profiler = cProfile.Profile()
+        PROFILER.enable()
+        if self.tool == CPROFILE and self._profiler is not None:
+            self._profiler.enable()
+        elif self._profiler is not None:
+            self._profiler.start()
+        return self
+
+    def finish(self):
+        if not self.active or not PROFILER.enabled:
+            return
+        if self._profiler is not None:
+            if self.tool == CPROFILE:
+                self._profiler.disable()
+            else:
+                self._profiler.stop()
+        PROFILER.disable()
+
+        print()
+        PROFILER.print_summary()
+        trace_path = self.trace_path or os.path.join(
+            PROFILE_DIR, f"{self.script}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        PROFILER.write_trace(trace_path)
+        print(f'✓ 追蹤檔已保存至: {trace_path}')
+        if self._profiler is not None:
+            os.makedirs(os.path.dirname(self.dump_path) or '.', exist_ok=True)
+            if self.tool == CPROFILE:
+                self._profiler.dump_stats(self.dump_path)
+            else:
+                with open(self.dump_path, 'w', encoding='utf-8') as f:
+                    f.write(self._profiler.output_html() if self.dump_path.endswith('.html')
+                            else self._profiler.output_text(unicode=True))
+            print(f'✓ {self.tool} 結果已保存至: {self.dump_path}')
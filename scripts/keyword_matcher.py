@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+關鍵字比對引擎
+將 KEYWORDS 編譯為 Aho-Corasick 自動機，一次掃描找出文字中出現的所有關鍵字
+"""
+
+from collections import deque
+
+
+class KeywordMatcher:
+    """多關鍵字比對器（Aho-Corasick）"""
+
+    def __init__(self, keywords):
+        """
+        keywords: {標籤: [關鍵字, ...]}，格式同 extract_snippets.KEYWORDS
+
+        同一關鍵字在表中出現多次時（例如「真的假的」），每次出現都計 1 分，
+        與逐一 `keyword in text` 的計分方式一致。
+        """
+        self.keywords = []   # 去重後的關鍵字（依首次出現順序）
+        self.weights = {}    # 關鍵字 → 分數（在表中出現的次數）
+        self.tags = {}       # 關鍵字 → 所屬標籤
+        self.tag_order = list(keywords.keys())
+
+        for tag, words in keywords.items():
+            for word in words:
+                if word not in self.weights:
+                    self.keywords.append(word)
+                    self.weights[word] = 0
+                    self.tags[word] = []
+                self.weights[word] += 1
+                if tag not in self.tags[word]:
+                    self.tags[word].append(tag)
+
+        self._build()
+
+    def _build(self):
+        """建立 goto / fail / output 表"""
+        goto = [{}]
+        outputs = [set()]
+
+        for word in self.keywords:
+            state = 0
+            for ch in word:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    goto.append({})
+                    outputs.append(set())
+                    nxt = len(goto) - 1
+                    goto[state][ch] = nxt
+                state = nxt
+            outputs[state].add(word)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                target = goto[f].get(ch, 0)
+                fail[nxt] = target if target != nxt else 0
+                outputs[nxt] |= outputs[fail[nxt]]
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs = [frozenset(o) for o in outputs]
+
+    def match(self, text):
+        """回傳 text 中出現的關鍵字集合"""
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        state = 0
+        hit_states = set()
+
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if outputs[state]:
+                hit_states.add(state)
+
+        found = set()
+        for state in hit_states:
+            found |= outputs[state]
+        return found
+
+    def score_hits(self, hits):
+        """將關鍵字集合換算為 (分數, 標籤集合)"""
+        score = 0
+        tags = set()
+        for word in hits:
+            score += self.weights[word]
+            tags.update(self.tags[word])
+        return score, tags
@@ -5,9 +5,10 @@
 """
 
 import json
-import shutil
 import argparse
-from datetime import datetime
+from build_bundle import BUNDLE_DIR, print_refresh
+from near_duplicates import find_near_duplicates, DEFAULT_THRESHOLD
+from question_store import STORE_DIR, open_store, print_sync_status
 
 
 # 型別映射（與 generate_final_ai_questions.py 保持一致）
@@ -34,15 +35,6 @@ def load_reviewed_questions(source_file='intermediate/ai_generated_questions_rev
         return json.load(f)
 
 
-def load_existing_questions(target_file='final_questions_new.json'):
-    """載入現有題庫"""
-    try:
-        with open(target_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
-
-
 def convert_to_final_format(ai_question, question_id):
     """將 AI 生成的題目轉換為最終格式"""
     q_data = ai_question['question_data']
@@ -69,8 +61,8 @@ def convert_to_final_format(ai_question, question_id):
     return {
         "id": question_id,
         "type": q_type,
-        "category": TYPE_MAPPING[q_type]['category'],
-        "dimension": TYPE_MAPPING[q_type]['dimension'],
+        "category": TYPE_MAPPING.get(q_type, {}).get('category'),
+        "dimension": TYPE_MAPPING.get(q_type, {}).get('dimension'),
         "conversation": {
             "date": ai_question['date'],
             "context": ai_question['conversation'],
@@ -80,30 +72,80 @@ def convert_to_final_format(ai_question, question_id):
         "options": options,
         "correctAnswer": correct_answer,
         "explanation": q_data['explanation'],
-        "weight": DIFFICULTY_WEIGHTS[difficulty],
+        "weight": DIFFICULTY_WEIGHTS.get(difficulty),
         "difficulty": difficulty,
         "period": ai_question['period'],
         "tags": ai_question.get('tags', [])
     }
 
 
-def validate_merged_questions(questions):
-    """驗證合併後的題目"""
-    errors = []
-
-    # 檢查日期唯一性
-    dates = [q['conversation']['date'] for q in questions]
-    if len(dates) != len(set(dates)):
-        duplicates = [date for date in dates if dates.count(date) > 1]
-        errors.append(f"發現重複日期: {set(duplicates)}")
-
-    # 檢查 ID 唯一性
-    ids = [q['id'] for q in questions]
-    if len(ids) != len(set(ids)):
-        duplicates = [id for id in ids if ids.count(id) > 1]
-        errors.append(f"發現重複 ID: {set(duplicates)}")
-
-    return errors
+ORIGIN_EXISTING = '題庫'
+ORIGIN_INCOMING = '新題目'
+
+
+def validate_question(q):
+    """檢查單一題目的格式，回傳問題描述列表"""
+    problems = []
+    if q.get('type') not in TYPE_MAPPING:
+        problems.append(f"未知題型 {q.get('type')!r}")
+    if q.get('difficulty') not in DIFFICULTY_WEIGHTS:
+        problems.append(f"未知難度 {q.get('difficulty')!r}")
+
+    option_ids = []
+    correct = []
+    for opt in q.get('options') or ():
+        option_ids.append(opt.get('id'))
+        if opt.get('isCorrect') is True:
+            correct.append(opt.get('id'))
+    if len(option_ids) != len(set(option_ids)):
+        problems.append(f'選項 ID 重複: {option_ids}')
+    if len(correct) != 1:
+        problems.append(f'isCorrect 為 true 的選項有 {len(correct)} 個（應為 1 個）')
+    answer = q.get('correctAnswer')
+    if answer not in option_ids:
+        problems.append(f'correctAnswer {answer!r} 不在選項中')
+    elif len(correct) == 1 and answer != correct[0]:
+        problems.append(f'correctAnswer {answer!r} 與 isCorrect 選項 {correct[0]!r} 不一致')
+
+    conversation = q.get('conversation') or {}
+    context = conversation.get('context') or []
+    index = conversation.get('highlightIndex')
+    if type(index) is not int or not 0 <= index < len(context):
+        problems.append(f'highlightIndex {index!r} 超出對話範圍（共 {len(context)} 則）')
+    return problems
+
+
+def _describe(group):
+    return '、'.join(f"ID {q.get('id')}（{origin}）" for origin, q in group)
+
+
+def validate_merged_questions(existing, incoming):
+    """
+    驗證合併後的題目，回傳錯誤描述列表
+    單次走訪完成：日期與 ID 以字典記錄首次出現者（線性時間），
+    每筆錯誤都標明來自題庫或新題目
+    """
+    first_date, first_id = {}, {}
+    duplicate_dates, duplicate_ids = {}, {}
+    schema_errors = []
+
+    for origin, questions in ((ORIGIN_EXISTING, existing), (ORIGIN_INCOMING, incoming)):
+        for q in questions:
+            entry = (origin, q)
+            date = q['conversation']['date']
+            first = first_date.setdefault(date, entry)
+            if first is not entry:
+                duplicate_dates.setdefault(date, [first]).append(entry)
+            qid = q['id']
+            first = first_id.setdefault(qid, entry)
+            if first is not entry:
+                duplicate_ids.setdefault(qid, [first]).append(entry)
+            for problem in validate_question(q):
+                schema_errors.append(f'ID {qid}（{origin}）: {problem}')
+
+    errors = [f'重複日期 {date}: {_describe(group)}' for date, group in duplicate_dates.items()]
+    errors += [f'重複 ID {qid}: {_describe(group)}' for qid, group in duplicate_ids.items()]
+    return errors + schema_errors
 
 
 def print_statistics(questions):
@@ -155,8 +197,18 @@ def main():
                         help='審核通過的題目檔案')
     parser.add_argument('--target', default='final_questions_new.json',
                         help='最終題庫檔案')
+    parser.add_argument('--store', default=STORE_DIR,
+                        help='題庫儲存區目錄（日誌與快照）')
     parser.add_argument('--no-backup', action='store_true',
-                        help='不建立備份')
+                        help='不建立壓縮快照（批次只寫入日誌）')
+    parser.add_argument('--no-export', action='store_true',
+                        help='只寫入儲存區，不更新題庫檔（之後以 question_store.py export 匯出）')
+    parser.add_argument('--bundle', default=BUNDLE_DIR,
+                        help='網頁用的精簡題庫目錄（已建立時匯出後自動重建）')
+    parser.add_argument('--near-dup-threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='對話片段相似度門檻（MinHash 估計的 Jaccard 相似度）')
+    parser.add_argument('--reject-near-duplicates', action='store_true',
+                        help='發現相似片段時中止合併（預設只提出警告）')
 
     args = parser.parse_args()
 
@@ -175,18 +227,24 @@ def main():
         print('請先執行 review_ai_questions.py 審核題目')
         return
 
-    print(f'載入目標: {args.target}')
-    existing_questions = load_existing_questions(args.target)
+    print(f'載入題庫儲存區: {args.store}')
+    store, status = open_store(args.store, args.target)
+    print_sync_status(status, args.target, store)
+    existing_questions = list(store.questions)
     print(f'  ✓ 載入 {len(existing_questions)} 道題目')
     print()
 
-    # 建立備份
-    if not args.no_backup and existing_questions:
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_file = f'backups/final_questions_new_{timestamp}.json'
-        shutil.copy(args.target, backup_file)
-        print(f'✓ 備份已建立: {backup_file}')
+    # 審核檔案累積所有工作階段接受的題目，已合併過的題目略過
+    merged_keys = {(q['conversation']['date'], q['question']) for q in existing_questions}
+    pending = [q for q in reviewed_questions
+               if (q['date'], q['question_data']['question']) not in merged_keys]
+    if len(pending) < len(reviewed_questions):
+        print(f'⊙ 略過 {len(reviewed_questions) - len(pending)} 道已在題庫中的題目')
         print()
+    reviewed_questions = pending
+    if not reviewed_questions:
+        print('沒有需要合併的新題目')
+        return
 
     # 指派 ID
     print('指派 ID...')
@@ -207,9 +265,26 @@ def main():
     # 合併
     merged_questions = existing_questions + final_questions
 
+    # 相似片段檢查（與題庫及同批題目比對）
+    print('檢查相似片段...')
+    near_duplicates = find_near_duplicates(existing_questions, final_questions,
+                                           args.near_dup_threshold)
+    if near_duplicates:
+        print(f'⊙ 發現 {len(near_duplicates)} 組相似片段：')
+        for new_q, similar_q, sim in near_duplicates:
+            print(f"  - ID {new_q['id']} ({new_q['conversation']['date']}) 與 "
+                  f"ID {similar_q['id']} ({similar_q['conversation']['date']}) 相似度 {sim:.2f}")
+        if args.reject_near_duplicates:
+            print()
+            print('請移除相似題目後重試')
+            return
+    else:
+        print('  ✓ 沒有相似片段')
+    print()
+
     # 驗證
     print('驗證合併結果...')
-    errors = validate_merged_questions(merged_questions)
+    errors = validate_merged_questions(existing_questions, final_questions)
     if errors:
         print('✗ 發現問題：')
         for error in errors:
@@ -224,13 +299,24 @@ def main():
     # 統計資訊
     print_statistics(merged_questions)
 
-    # 寫入最終檔案
-    print(f'寫入 {args.target}...')
-    with open(args.target, 'w', encoding='utf-8') as f:
-        json.dump(merged_questions, f, ensure_ascii=False, indent=2)
-    print('  ✓ 寫入完成')
+    # 附加到日誌（只寫入新題目），累積足夠批次後壓縮成快照作為備份
+    print('寫入題庫儲存區...')
+    seq = store.append(final_questions, source=args.source)
+    print(f'  ✓ 已附加批次 {seq}')
+    if not args.no_backup and store.needs_compaction():
+        removed = store.compact()
+        print(f'  ✓ 快照已建立: {store.snapshot_path(seq)}')
+        if removed:
+            print(f'  ⊙ 刪除舊快照: {", ".join(map(str, removed))}')
     print()
 
+    if not args.no_export:
+        print(f'匯出 {args.target}...')
+        store.export(args.target)
+        print('  ✓ 匯出完成')
+        print_refresh(args.target, args.bundle)
+        print()
+
     print('=' * 80)
     print('合併完成！')
     print('=' * 80)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+訊息有效性過濾
+browse_dates 與 extract_snippets 共用的過濾規則：內容不可為空、長度需大於 1，
+且不可含媒體標記；所有媒體標記編譯為單一正規表示式，每則訊息只掃描一次
+"""
+
+import re
+from collections import Counter
+
+DEFAULT_MEDIA_MARKERS = ('[照片]', '[貼圖]', '[影片]', '☎')
+MIN_CONTENT_LENGTH = 2
+
+RULE_EMPTY = '空白訊息'
+RULE_TOO_SHORT = '內容過短'
+
+
+class MessageFilter:
+    """
+    編譯後的訊息過濾器，並累計各規則的排除數
+
+    可直接當作 chat_stream.iter_days 的 keep 函式；
+    iter() 用於串流訊息，filter() 用於整批訊息
+    """
+
+    def __init__(self, extra_markers=(), min_length=MIN_CONTENT_LENGTH):
+        self.markers = tuple(dict.fromkeys(DEFAULT_MEDIA_MARKERS + tuple(extra_markers or ())))
+        self.min_length = min_length
+        pattern = '|'.join(re.escape(marker) for marker in self.markers)
+        self._search = re.compile(pattern).search if self.markers else (lambda content: None)
+        self.accepted = 0
+        self.rejections = Counter()
+
+    def rejection_rule(self, msg):
+        """訊息被排除的規則（媒體標記以標記本身表示）；有效訊息回傳 None"""
+        content = msg.get('content', '')
+        if not content:
+            return RULE_EMPTY
+        if len(content) < self.min_length:
+            return RULE_TOO_SHORT
+        match = self._search(content)
+        return match.group() if match else None
+
+    def __call__(self, msg):
+        """判斷單則訊息是否有效"""
+        content = msg.get('content', '')
+        if content and len(content) >= self.min_length and self._search(content) is None:
+            self.accepted += 1
+            return True
+        self.rejections[self.rejection_rule(msg)] += 1
+        return False
+
+    def iter(self, messages):
+        """逐則產生有效訊息"""
+        for msg in messages:
+            if self(msg):
+                yield msg
+
+    def filter(self, messages):
+        """過濾整批訊息"""
+        return [msg for msg in messages if self(msg)]
+
+    @property
+    def rejected(self):
+        return sum(self.rejections.values())
+
+    def reset(self):
+        self.accepted = 0
+        self.rejections.clear()
+
+    def report(self):
+        """各規則排除數，依規則順序排列（未排除任何訊息的規則略過）"""
+        order = (RULE_EMPTY, RULE_TOO_SHORT) + self.markers
+        return [(rule, self.rejections[rule]) for rule in order if self.rejections[rule]]
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+欄位式精簡訊息儲存
+以欄位陣列取代每則訊息一個 dict：使用者編號、日期序數、分鐘數，
+以及一段連續的 UTF-8 內容緩衝區與位移陣列
+"""
+
+import datetime
+import json
+import argparse
+import tracemalloc
+from array import array
+
+from chat_stream import iter_messages
+
+NO_TIME = 0xFFFF
+CANONICAL_KEYS = ('date', 'time', 'datetime', 'user', 'content')
+DATE_ONLY_KEYS = ('date', 'user', 'content')
+
+
+def parse_date(date):
+    """'YYYY/MM/DD' → 日期序數"""
+    year, month, day = date.split('/')
+    return datetime.date(int(year), int(month), int(day)).toordinal()
+
+
+def format_date(ordinal):
+    """日期序數 → 'YYYY/MM/DD'"""
+    d = datetime.date.fromordinal(ordinal)
+    return f'{d.year:04d}/{d.month:02d}/{d.day:02d}'
+
+
+def parse_time(time):
+    """'HH:MM' → 當日分鐘數；格式不符時回傳 None"""
+    if len(time) != 5 or time[2] != ':':
+        return None
+    hour, minute = time[:2], time[3:]
+    if not (hour.isdigit() and minute.isdigit()):
+        return None
+    hour, minute = int(hour), int(minute)
+    if hour > 23 or minute > 59:
+        return None
+    return hour * 60 + minute
+
+
+def format_time(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+_TIME_STRINGS = [format_time(m) for m in range(24 * 60)]
+
+
+class PeriodStore:
+    """單一時期的欄位式訊息儲存（唯讀）"""
+
+    def __init__(self, users, user_ids, days, minutes, offsets, content, extras=None):
+        """
+        users: 使用者名稱表；user_ids / days / minutes: 每則訊息一筆；
+        offsets: 長度為訊息數 + 1 的內容位移；content: UTF-8 內容緩衝區（bytes 或 memoryview）；
+        extras: {訊息索引: 原始 dict}，存放格式不標準、無法完整還原的訊息
+        """
+        self.users = users
+        self.user_ids = user_ids
+        self.days = days
+        self.minutes = minutes
+        self.offsets = offsets
+        self.content = content
+        self.extras = extras or {}
+        self._day_index = None
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def content_at(self, i):
+        """第 i 則訊息的內容"""
+        return str(self.content[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    def message(self, i):
+        """還原第 i 則訊息為原始 dict 格式"""
+        extra = self.extras.get(i)
+        if extra is not None:
+            return dict(extra)
+
+        date = format_date(self.days[i])
+        minutes = self.minutes[i]
+        if minutes == NO_TIME:
+            return {'date': date, 'user': self.users[self.user_ids[i]],
+                    'content': self.content_at(i)}
+        time = format_time(minutes)
+        return {
+            'date': date,
+            'time': time,
+            'datetime': f'{date} {time}',
+            'user': self.users[self.user_ids[i]],
+            'content': self.content_at(i)
+        }
+
+    def messages(self, start, end):
+        """還原 [start, end) 範圍內的訊息（整段內容一次複製，日期與時間字串共用）"""
+        offsets = self.offsets
+        base = offsets[start]
+        blob = bytes(self.content[base:offsets[end]])
+        users = self.users
+        user_ids = self.user_ids
+        days = self.days
+        minutes = self.minutes
+        extras = self.extras
+
+        result = []
+        last_ordinal = None
+        date = None
+        for i in range(start, end):
+            if extras and i in extras:
+                result.append(dict(extras[i]))
+                continue
+            if days[i] != last_ordinal:
+                last_ordinal = days[i]
+                date = format_date(last_ordinal)
+            content = blob[offsets[i] - base:offsets[i + 1] - base].decode('utf-8')
+            m = minutes[i]
+            if m == NO_TIME:
+                result.append({'date': date, 'user': users[user_ids[i]], 'content': content})
+            else:
+                time = _TIME_STRINGS[m]
+                result.append({
+                    'date': date,
+                    'time': time,
+                    'datetime': f'{date} {time}',
+                    'user': users[user_ids[i]],
+                    'content': content
+                })
+        return result
+
+    @property
+    def day_index(self):
+        """{日期序數: (起始索引, 結束索引)}，依出現順序排列"""
+        if self._day_index is None:
+            index = {}
+            days = self.days
+            start = 0
+            for i in range(1, len(days) + 1):
+                if i == len(days) or days[i] != days[start]:
+                    if days[start] in index:
+                        raise ValueError(f'訊息未依日期排序：{format_date(days[start])} 重複出現')
+                    index[days[start]] = (start, i)
+                    start = i
+            self._day_index = index
+        return self._day_index
+
+    def dates(self):
+        """依出現順序列出所有日期"""
+        return [format_date(ordinal) for ordinal in self.day_index]
+
+    def day(self, date):
+        """取得單一日期的所有訊息（不存在時回傳空列表）"""
+        span = self.day_index.get(parse_date(date))
+        return self.messages(*span) if span else []
+
+    def iter_days(self, keep=None, dates=None):
+        """
+        逐日產生 (日期, 訊息列表)，介面與 chat_stream.iter_days 相同
+        dates: 只產生這些日期（其餘日期不會還原訊息）
+        """
+        wanted = None if dates is None else {parse_date(d) for d in dates}
+        for ordinal, (start, end) in self.day_index.items():
+            if wanted is not None and ordinal not in wanted:
+                continue
+            messages = self.messages(start, end)
+            if keep is not None:
+                messages = [m for m in messages if keep(m)]
+            if messages:
+                yield format_date(ordinal), messages
+
+    def nbytes(self):
+        """欄位資料佔用的位元組數（不含 Python 物件本身的固定開銷）"""
+        total = len(self.content)
+        for column in (self.user_ids, self.days, self.minutes, self.offsets):
+            total += len(column) * column.itemsize
+        total += sum(len(u.encode('utf-8')) for u in self.users)
+        total += sum(len(json.dumps(e, ensure_ascii=False).encode('utf-8'))
+                     for e in self.extras.values())
+        return total
+
+
+class PeriodStoreBuilder:
+    """逐則加入訊息以建立 PeriodStore"""
+
+    def __init__(self):
+        self.users = []
+        self._user_lookup = {}
+        self.user_ids = array('H')
+        self.days = array('i')
+        self.minutes = array('H')
+        self.offsets = array('Q', [0])
+        self.content = bytearray()
+        self.extras = {}
+
+    def _user_id(self, user):
+        uid = self._user_lookup.get(user)
+        if uid is None:
+            uid = len(self.users)
+            if uid > 0xFFFF:
+                raise ValueError('使用者數量超過 65535')
+            self.users.append(user)
+            self._user_lookup[user] = uid
+        return uid
+
+    def append(self, msg):
+        index = len(self.user_ids)
+        content = msg.get('content', '') or ''
+        user = msg.get('user', '') or ''
+        keys = tuple(msg.keys())
+
+        minutes = None
+        if keys == CANONICAL_KEYS:
+            minutes = parse_time(msg['time'])
+            if minutes is not None and msg['datetime'] != f"{msg['date']} {msg['time']}":
+                minutes = None
+        elif keys == DATE_ONLY_KEYS:
+            minutes = NO_TIME
+
+        if minutes is None or not isinstance(msg.get('content'), str) or not isinstance(msg.get('user'), str):
+            # 非標準格式的訊息完整保留，確保能原樣還原
+            self.extras[index] = dict(msg)
+            minutes = NO_TIME
+
+        self.user_ids.append(self._user_id(user))
+        self.days.append(parse_date(msg['date']))
+        self.minutes.append(minutes)
+        self.content += content.encode('utf-8') if isinstance(content, str) else b''
+        self.offsets.append(len(self.content))
+
+    def extend(self, messages):
+        for msg in messages:
+            self.append(msg)
+        return self
+
+    def build(self):
+        return PeriodStore(self.users, self.user_ids, self.days, self.minutes,
+                           self.offsets, bytes(self.content), self.extras)
+
+
+def store_from_export(path):
+    """由原始 JSON 匯出檔（串流讀取）建立 PeriodStore"""
+    return PeriodStoreBuilder().extend(iter_messages(path)).build()
+
+
+def memory_report(path):
+    """比較 dict 列表與欄位式儲存的記憶體用量，回傳 (訊息數, dict 位元組, 欄位式位元組)"""
+    tracemalloc.start()
+    with open(path, 'r', encoding='utf-8') as f:
+        messages = json.load(f)['messages']
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    count = len(messages)
+    del messages
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    store = store_from_export(path)
+    store_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    assert len(store) == count
+    return count, dict_bytes, store_bytes
+
+
+def main():
+    """主執行流程"""
+    parser = argparse.ArgumentParser(description='欄位式訊息儲存：記憶體用量比較')
+    parser.add_argument('file', help='原始對話資料（raw_data/chat_*.json）')
+    args = parser.parse_args()
+
+    count, dict_bytes, store_bytes = memory_report(args.file)
+    print(f'訊息數: {count}')
+    print(f'  dict 列表:  {dict_bytes / 1e6:8.1f} MB（每則 {dict_bytes / max(count, 1):.0f} 位元組）')
+    print(f'  欄位式儲存: {store_bytes / 1e6:8.1f} MB（每則 {store_bytes / max(count, 1):.0f} 位元組）')
+    print(f'  節省: {(1 - store_bytes / max(dict_bytes, 1)) * 100:.1f}%')
+
+
+if __name__ == '__main__':
+    main()
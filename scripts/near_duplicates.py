@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相似片段偵測（MinHash + LSH）
+以字元 shingle 的 MinHash 簽章估計兩個片段的 Jaccard 相似度，
+LSH 分段索引讓查詢只需比對少數候選，題庫成長到數千題時仍維持次線性
+"""
+
+import json
+import random
+import re
+import zlib
+import argparse
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 為選用套件，未安裝時以純 Python 計算簽章（結果相同）
+    np = None
+
+NUM_PERM = 64
+BANDS = 16            # 16 段 × 4 列：相似度約 0.5 以上的片段有很高機率落在同一段
+SHINGLE_SIZE = 3
+DEFAULT_THRESHOLD = 0.5
+
+# 雜湊族 (a·h + b) mod p：h 為 32 位元 CRC，a、b < 2^31，乘積不會超過 64 位元，
+# NumPy 的 uint64 運算與純 Python 結果完全相同
+_PRIME = (1 << 32) + 15
+_rng = random.Random(20190101)
+_PERMUTATIONS = [(_rng.randrange(1, 1 << 31), _rng.randrange(0, 1 << 31))
+                 for _ in range(NUM_PERM)]
+if np is not None:
+    _A = np.array([a for a, _ in _PERMUTATIONS], dtype=np.uint64).reshape(-1, 1)
+    _B = np.array([b for _, b in _PERMUTATIONS], dtype=np.uint64).reshape(-1, 1)
+
+_WHITESPACE = re.compile(r'\s+')
+_REPEATS = re.compile(r'(.)\1{2,}')
+
+
+def normalize(text):
+    """去除空白並將連續重複的字元縮為兩個（「哈哈哈哈哈」與「哈哈哈」視為相同）"""
+    return _REPEATS.sub(r'\1\1', _WHITESPACE.sub('', text.lower()))
+
+
+def shingles(messages, size=SHINGLE_SIZE):
+    """片段的字元 shingle 集合（不跨訊息）"""
+    result = set()
+    for msg in messages:
+        text = normalize(msg.get('content', '') or '')
+        if not text:
+            continue
+        if len(text) <= size:
+            result.add(text)
+            continue
+        for i in range(len(text) - size + 1):
+            result.add(text[i:i + size])
+    return result
+
+
+def minhash(shingle_set):
+    """MinHash 簽章（空集合回傳 None）"""
+    if not shingle_set:
+        return None
+    hashes = [zlib.crc32(s.encode('utf-8')) for s in shingle_set]
+    if np is not None:
+        values = (_A * np.array(hashes, dtype=np.uint64) + _B) % np.uint64(_PRIME)
+        return tuple(values.min(axis=1).tolist())
+    return tuple(min([(a * h + b) % _PRIME for h in hashes]) for a, b in _PERMUTATIONS)
+
+
+def signature(messages):
+    """訊息片段的 MinHash 簽章"""
+    return minhash(shingles(messages))
+
+
+def similarity(sig_a, sig_b):
+    """由簽章估計 Jaccard 相似度"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+class LSHIndex:
+    """MinHash 簽章的 LSH 分段索引"""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, bands=BANDS):
+        if NUM_PERM % bands:
+            raise ValueError(f'bands 必須整除 {NUM_PERM}')
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def _band_keys(self, sig):
+        rows = self.rows
+        return [sig[i * rows:(i + 1) * rows] for i in range(self.bands)]
+
+    def add(self, key, sig):
+        if sig is None:
+            return
+        self.signatures[key] = sig
+        for bucket, band in zip(self.buckets, self._band_keys(sig)):
+            bucket.setdefault(band, []).append(key)
+
+    def query(self, sig, threshold=None):
+        """回傳相似度達門檻的 [(鍵, 相似度)]，依相似度降序"""
+        if sig is None:
+            return []
+        threshold = self.threshold if threshold is None else threshold
+        candidates = set()
+        for bucket, band in zip(self.buckets, self._band_keys(sig)):
+            candidates.update(bucket.get(band, ()))
+        matches = [(key, similarity(sig, self.signatures[key])) for key in candidates]
+        matches = [(key, sim) for key, sim in matches if sim >= threshold]
+        matches.sort(key=lambda item: -item[1])
+        return matches
+
+
+def question_messages(question):
+    """題目的對話片段"""
+    return question.get('conversation', {}).get('context', [])
+
+
+def build_bank_index(questions, threshold=DEFAULT_THRESHOLD):
+    """以題庫的對話片段建立索引，鍵為題目 ID"""
+    index = LSHIndex(threshold)
+    for q in questions:
+        index.add(q['id'], signature(question_messages(q)))
+    return index
+
+
+def find_near_duplicates(existing, incoming, threshold=DEFAULT_THRESHOLD):
+    """
+    找出與題庫或同批其他題目相似的新題目
+    回傳 [(新題目, 相似題目, 相似度)]；incoming 依序加入索引，先出現者視為原題
+    """
+    index = build_bank_index(existing, threshold)
+    by_id = {q['id']: q for q in existing}
+    results = []
+    for i, q in enumerate(incoming):
+        sig = signature(question_messages(q))
+        for key, sim in index.query(sig):
+            results.append((q, by_id[key], sim))
+        key = ('incoming', i)
+        by_id[key] = q
+        index.add(key, sig)
+    return results
+
+
+def load_questions(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    """主執行流程"""
+    parser = argparse.ArgumentParser(description='找出題庫中對話片段相似的題目')
+    parser.add_argument('--questions', default='final_questions_new.json',
+                        help='題庫檔案')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='相似度門檻（Jaccard 估計值，0-1）')
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    index = LSHIndex(args.threshold)
+    by_id = {q['id']: q for q in questions}
+    pairs = []
+    for q in questions:
+        sig = signature(question_messages(q))
+        pairs.extend((by_id[key], q, sim) for key, sim in index.query(sig))
+        index.add(q['id'], sig)
+
+    print('=' * 80)
+    print(f'相似片段檢查 - {args.questions}（門檻 {args.threshold}）')
+    print('=' * 80)
+    print()
+    if not pairs:
+        print('✓ 沒有相似的對話片段')
+        return
+
+    print(f'⊙ 找到 {len(pairs)} 組相似片段：')
+    print()
+    for original, duplicate, sim in pairs:
+        print(f"ID {original['id']} ({original['conversation']['date']}) ↔ "
+              f"ID {duplicate['id']} ({duplicate['conversation']['date']}) | 相似度 {sim:.2f}")
+        for label, q in (('  A', original), ('  B', duplicate)):
+            text = ' / '.join(m.get('content', '') for m in question_messages(q))
+            print(f'{label}: {text[:70]}')
+        print()
+
+
+if __name__ == '__main__':
+    main()
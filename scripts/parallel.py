@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+行程池平行處理輔助工具
+將工作切成區塊交給多個行程處理，並依輸入順序產生結果（與單行程結果相同）
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+DEFAULT_CHUNK_SIZE = 64
+
+
+def resolve_jobs(jobs):
+    """解析 --jobs 參數（0 表示使用所有 CPU 核心）"""
+    if not jobs:
+        return os.cpu_count() or 1
+    return max(1, jobs)
+
+
+def chunked(items, size):
+    """將可迭代物件切成固定大小的串列"""
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def imap_chunks(func, items, jobs=1, chunk_size=DEFAULT_CHUNK_SIZE, payload=None):
+    """
+    依序產生 (item, 結果)
+
+    func 接收一個區塊的 payload 串列並回傳等長的結果串列，需為模組層級函式以便傳給子行程。
+    payload(item) 決定實際送出的資料；payload 為 None 的項目不需處理，func 應對其回傳 None，
+    整個區塊都不需處理時不會送出。
+    items 以串流方式讀取，同時在途的區塊數受限，記憶體不會隨輸入大小成長。
+    """
+    if payload is None:
+        payload = lambda item: item
+
+    def prepared():
+        for chunk in chunked(items, chunk_size):
+            args = [payload(item) for item in chunk]
+            yield chunk, args, any(arg is not None for arg in args)
+
+    if jobs <= 1:
+        for chunk, args, needed in prepared():
+            results = func(args) if needed else [None] * len(chunk)
+            yield from zip(chunk, results)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for chunk, args, needed in prepared():
+            future = executor.submit(func, args) if needed else None
+            pending.append((chunk, future))
+            if len(pending) >= jobs * 2:
+                yield from _drain_one(pending)
+        while pending:
+            yield from _drain_one(pending)
+
+
+def _drain_one(pending):
+    chunk, future = pending.popleft()
+    results = future.result() if future is not None else [None] * len(chunk)
+    return zip(chunk, results)
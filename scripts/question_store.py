@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+題庫儲存區（只增不改的日誌 + 壓縮快照）
+每次合併只在 journal.jsonl 尾端附加一行批次紀錄；累積一定批數後將
+「最新快照 + 日誌」壓縮成新快照，舊快照保留數份作為備份。
+遊戲讀取的 final_questions_new.json 由匯出步驟產生，所有整檔寫入都先寫暫存檔再改名
+"""
+
+import hashlib
+import json
+import os
+import re
+import argparse
+from datetime import datetime
+
+STORE_DIR = 'question_store'
+STORE_VERSION = 1
+COMPACT_EVERY = 10     # 日誌累積這麼多批次後壓縮成新快照
+KEEP_SNAPSHOTS = 5     # 保留的快照份數（其餘為備份，超過時刪除最舊者）
+
+_SNAPSHOT_NAME = re.compile(r'snapshot_(\d+)\.json$')
+
+
+def _fsync_dir(path):
+    """確保改名操作寫入磁碟（不支援開啟目錄的平台略過）"""
+    try:
+        fd = os.open(path or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_bytes_atomic(path, content):
+    """寫入暫存檔並 fsync 後改名，中途當機時原檔保持完整"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(os.path.dirname(path))
+
+
+def write_json_atomic(path, data, indent=None):
+    write_bytes_atomic(path, json.dumps(data, ensure_ascii=False, indent=indent).encode('utf-8'))
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class QuestionStore:
+    """
+    題庫儲存區：snapshots/snapshot_{序號}.json 為壓縮快照，
+    journal.jsonl 為快照之後附加的批次（每行一批，含遞增序號）
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.snapshot_dir = os.path.join(root, 'snapshots')
+        self.journal_path = os.path.join(root, 'journal.jsonl')
+        self.export_path = os.path.join(root, 'export.json')
+        self.questions = []
+        self.seq = 0              # 最後一批的序號
+        self.snapshot_seq = None  # 最新快照的序號（尚無快照為 None）
+        self.journal_batches = 0  # 最新快照之後的批次數
+        self._journal_end = 0     # 日誌中完整紀錄的結尾位置（之後為當機時寫到一半的內容）
+        self._load()
+
+    @property
+    def exists(self):
+        return self.snapshot_seq is not None or self.seq > 0
+
+    def snapshot_path(self, seq):
+        return os.path.join(self.snapshot_dir, f'snapshot_{seq:06d}.json')
+
+    def snapshot_seqs(self):
+        """現有快照的序號（由舊到新）"""
+        try:
+            names = os.listdir(self.snapshot_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(int(m.group(1)) for m in map(_SNAPSHOT_NAME.match, names) if m)
+
+    def _load(self):
+        seqs = self.snapshot_seqs()
+        if seqs:
+            with open(self.snapshot_path(seqs[-1]), 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            if snapshot.get('version') != STORE_VERSION:
+                raise ValueError(f"不支援的快照版本: {snapshot.get('version')}")
+            self.questions = snapshot['questions']
+            self.seq = self.snapshot_seq = snapshot['seq']
+
+        try:
+            f = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            offset = 0
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # 最後一行沒有換行：附加時當機，該批次未完成提交，忽略
+                    break
+                try:
+                    batch = json.loads(line)
+                except json.JSONDecodeError:
+                    raise ValueError(f'日誌損毀（位置 {offset}）: {self.journal_path}')
+                offset += len(line)
+                if self.snapshot_seq is not None and batch['seq'] <= self.snapshot_seq:
+                    continue  # 已壓縮進快照（壓縮後、清理日誌前當機時會留下）
+                self.questions.extend(batch['questions'])
+                self.seq = batch['seq']
+                self.journal_batches += 1
+            self._journal_end = offset
+
+    def append(self, questions, source=None):
+        """附加一批題目並 fsync，回傳批次序號"""
+        os.makedirs(self.root, exist_ok=True)
+        batch = {
+            'seq': self.seq + 1,
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'source': source,
+            'questions': questions,
+        }
+        line = (json.dumps(batch, ensure_ascii=False) + '\n').encode('utf-8')
+        with open(self.journal_path, 'ab') as f:
+            # 截去上次當機留下的不完整紀錄
+            if f.tell() > self._journal_end:
+                f.truncate(self._journal_end)
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_end += len(line)
+        self.seq = batch['seq']
+        self.questions.extend(questions)
+        self.journal_batches += 1
+        return self.seq
+
+    def needs_compaction(self):
+        return self.snapshot_seq is None or self.journal_batches >= COMPACT_EVERY
+
+    def compact(self):
+        """將目前題庫寫成新快照、清空日誌，並刪除超過保留份數的舊快照"""
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        write_json_atomic(self.snapshot_path(self.seq), {
+            'version': STORE_VERSION,
+            'seq': self.seq,
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'questions': self.questions,
+        })
+        # 快照寫入完成後才清空日誌；兩步之間當機時，載入會略過已壓縮的批次
+        write_bytes_atomic(self.journal_path, b'')
+        self._journal_end = 0
+        self.snapshot_seq = self.seq
+        self.journal_batches = 0
+
+        removed = []
+        for seq in self.snapshot_seqs()[:-KEEP_SNAPSHOTS]:
+            os.remove(self.snapshot_path(seq))
+            removed.append(seq)
+        return removed
+
+    def replace_all(self, questions):
+        """以外部題庫取代目前內容（寫成新快照，不保留日誌）"""
+        self.questions = list(questions)
+        self.seq += 1
+        return self.compact()
+
+    def export(self, target):
+        """匯出遊戲使用的題庫檔"""
+        write_json_atomic(target, self.questions, indent=2)
+        self.record_export(target)
+
+    def record_export(self, target):
+        """記錄題庫檔目前的雜湊，之後可偵測外部修改"""
+        write_json_atomic(self.export_path, {
+            'target': os.path.abspath(target),
+            'seq': self.seq,
+            'sha256': file_sha256(target) if os.path.exists(target) else None,
+        })
+
+    def target_modified(self, target):
+        """題庫檔在上次匯出後是否被外部修改（尚未匯出新批次只代表題庫檔較舊，不算修改）"""
+        try:
+            with open(self.export_path, 'r', encoding='utf-8') as f:
+                info = json.load(f)
+        except FileNotFoundError:
+            return os.path.exists(target)
+        current = file_sha256(target) if os.path.exists(target) else None
+        return current != info.get('sha256')
+
+    def target_is_current(self, target):
+        """題庫檔是否與儲存區內容一致"""
+        try:
+            with open(self.export_path, 'r', encoding='utf-8') as f:
+                info = json.load(f)
+        except FileNotFoundError:
+            return False
+        return info.get('seq') == self.seq and not self.target_modified(target)
+
+
+def load_target(target):
+    try:
+        with open(target, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def open_store(root=STORE_DIR, target='final_questions_new.json'):
+    """
+    開啟儲存區，並與題庫檔同步，回傳 (store, 狀態)
+    狀態：'created'（由題庫檔建立）、'imported'（題庫檔被外部修改，已重新匯入）、'ok'
+    """
+    store = QuestionStore(root)
+    if not store.exists:
+        store.replace_all(load_target(target))
+        store.record_export(target)
+        return store, 'created'
+    if store.target_modified(target) and os.path.exists(target):
+        store.replace_all(load_target(target))
+        store.record_export(target)
+        return store, 'imported'
+    return store, 'ok'
+
+
+def print_sync_status(status, target, store):
+    if status == 'created':
+        print(f'✓ 已由 {target} 建立題庫儲存區（{len(store.questions)} 道題目）')
+    elif status == 'imported':
+        print(f'⊙ {target} 在上次匯出後被修改，已重新匯入（{len(store.questions)} 道題目）')
+
+
+def main():
+    """主執行流程"""
+    parser = argparse.ArgumentParser(description='題庫儲存區管理')
+    parser.add_argument('command', nargs='?', default='status',
+                        choices=['status', 'export', 'compact', 'import'],
+                        help='status：顯示狀態；export：匯出題庫檔；'
+                             'compact：壓縮成新快照；import：以題庫檔取代儲存區內容')
+    parser.add_argument('--store', default=STORE_DIR, help='儲存區目錄')
+    parser.add_argument('--target', default='final_questions_new.json', help='題庫檔案')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        store = QuestionStore(args.store)
+        store.replace_all(load_target(args.target))
+        store.record_export(args.target)
+        print(f'✓ 已由 {args.target} 匯入 {len(store.questions)} 道題目')
+        return
+
+    store, status = open_store(args.store, args.target)
+    print_sync_status(status, args.target, store)
+
+    if args.command == 'export':
+        from build_bundle import print_refresh
+        store.export(args.target)
+        print(f'✓ 已匯出 {len(store.questions)} 道題目至 {args.target}')
+        print_refresh(args.target)
+    elif args.command == 'compact':
+        removed = store.compact()
+        print(f'✓ 已建立快照 {store.snapshot_path(store.seq)}')
+        if removed:
+            print(f'  ⊙ 刪除舊快照: {", ".join(map(str, removed))}')
+    else:
+        print(f'儲存區: {args.store}')
+        print(f'  題目數: {len(store.questions)}')
+        print(f'  最新批次: {store.seq}')
+        print(f'  快照: {", ".join(map(str, store.snapshot_seqs())) or "無"}')
+        print(f'  快照後的日誌批次: {store.journal_batches}')
+        current = store.target_is_current(args.target)
+        print(f'  {args.target}: {"✓ 與儲存區一致" if current else "⊙ 與儲存區不一致（可執行 export 或 import）"}')
+
+
+if __name__ == '__main__':
+    main()
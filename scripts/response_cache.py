@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI 生成回應的本機快取（SQLite）
+以「對話片段、題型、難度、few-shot 範例、提示詞版本、後端與模型」的雜湊為鍵，
+重新執行生成時，這些內容都沒變的日期直接沿用先前的回應；
+總大小超過上限時依最後使用時間淘汰最久未用的回應（LRU）
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import argparse
+
+from score_cache import CACHE_DIR, messages_digest
+
+CACHE_FILE = os.path.join(CACHE_DIR, 'ai_responses.sqlite')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    date TEXT,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used INTEGER NOT NULL   -- 使用序號（遞增），LRU 淘汰依據
+);
+CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_used);
+'''
+
+
+def response_key(conversation, q_type, difficulty, examples, prompt_version, backend, model=None):
+    """回應的內容定址鍵"""
+    payload = json.dumps({
+        'snippet': messages_digest(conversation),
+        'type': q_type,
+        'difficulty': difficulty,
+        'examples': hashlib.sha1(json.dumps(examples, ensure_ascii=False, sort_keys=True)
+                                 .encode('utf-8')).hexdigest(),
+        'prompt_version': prompt_version,
+        'backend': backend,
+        'model': model,
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """大小有上限的 LRU 回應快取"""
+
+    def __init__(self, path=CACHE_FILE, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        row = self.conn.execute('SELECT MAX(last_used), SUM(size) FROM responses').fetchone()
+        self._tick = row[0] or 0
+        self.total_bytes = row[1] or 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def _next_tick(self):
+        self._tick += 1
+        return self._tick
+
+    def get(self, key):
+        """取得快取的回應並更新使用時間；不存在時回傳 None"""
+        row = self.conn.execute('SELECT response FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.conn:
+            self.conn.execute('UPDATE responses SET last_used = ? WHERE key = ?',
+                              (self._next_tick(), key))
+        return row[0]
+
+    def put(self, key, response, date=None):
+        """寫入回應，必要時淘汰最久未用的回應"""
+        size = len(response.encode('utf-8'))
+        with self.conn:
+            old = self.conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self.conn.execute('''
+                INSERT OR REPLACE INTO responses (key, date, response, size, created, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (key, date, response, size, time.time(), self._next_tick()))
+        self.total_bytes += size - (old[0] if old else 0)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def discard(self, key):
+        """移除單一回應（例如快取的回應無法解析時）"""
+        with self.conn:
+            row = self.conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self.conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self.total_bytes -= row[0]
+
+    def evict(self, max_bytes=None):
+        """依最後使用時間由舊到新刪除，直到總大小不超過上限，回傳刪除數"""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        excess = self.total_bytes - limit
+        if excess <= 0:
+            return 0
+        freed = 0
+        doomed = []
+        for key, size in self.conn.execute('SELECT key, size FROM responses ORDER BY last_used'):
+            if freed >= excess:
+                break
+            doomed.append((key,))
+            freed += size
+        with self.conn:
+            self.conn.executemany('DELETE FROM responses WHERE key = ?', doomed)
+        removed = len(doomed)
+        self.total_bytes -= freed
+        self.evicted += removed
+        return removed
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute('DELETE FROM responses')
+        self.total_bytes = 0
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    """主執行流程"""
+    parser = argparse.ArgumentParser(description='AI 生成回應快取管理')
+    parser.add_argument('command', nargs='?', default='status', choices=['status', 'clear', 'evict'],
+                        help='status：顯示狀態；clear：清空；evict：淘汰至 --max-mb 以下')
+    parser.add_argument('--cache', default=CACHE_FILE, help='快取檔案')
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help='快取大小上限（MB）')
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.cache, int(args.max_mb * 1024 * 1024))
+    try:
+        if args.command == 'clear':
+            count = len(cache)
+            cache.clear()
+            print(f'✓ 已清除 {count} 筆回應')
+        elif args.command == 'evict':
+            removed = cache.evict()
+            print(f'✓ 淘汰 {removed} 筆回應，目前 {cache.total_bytes / 1024:.1f} KB')
+        else:
+            print(f'快取: {args.cache}')
+            print(f'  回應數: {len(cache)}')
+            print(f'  大小: {cache.total_bytes / 1024:.1f} KB（上限 {args.max_mb:g} MB）')
+    finally:
+        cache.close()
+
+
+if __name__ == '__main__':
+    main()
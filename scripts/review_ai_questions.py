@@ -3,14 +3,24 @@
 """
 互動式審核介面
 逐題檢視 AI 生成的題目，接受/拒絕/重新生成
+驗證結果與品質評分在審核前預先算好（validate_questions.py），可依評分排序、篩選與批次接受；
+每個決定立即寫入審核紀錄（review_journal.py），下次從第一道未決定的題目繼續
 """
 
 import json
 import sys
-from validate_questions import validate_all, calculate_quality_score
+import argparse
+from generation_pipeline import DRAFT_FILE
+from parallel import resolve_jobs
+from question_store import write_json_atomic
+from review_journal import (open_journal, JOURNAL_FILE, REVIEWED_FILE, REJECTED_FILE,
+                            ACCEPT, REJECT, SKIP)
+from validate_questions import annotate_questions, print_summary, MIN_ACCEPT_SCORE
 
+SORT_ORDERS = ('quality', 'draft')
 
-def load_draft_questions(draft_file='intermediate/new_questions_draft.json'):
+
+def load_draft_questions(draft_file=DRAFT_FILE):
     """載入 AI 生成的初稿題目"""
     with open(draft_file, 'r', encoding='utf-8') as f:
         return json.load(f)
@@ -72,13 +82,13 @@ def display_question(question, index, total):
     print(f"解釋：{q_data['explanation']}")
     print()
 
-    # 驗證結果
-    is_valid, errors = validate_all(q_data, question['conversation'])
-    if is_valid:
+    # 驗證結果（審核前預先計算）
+    validation = question['validation']
+    if validation['valid']:
         print("驗證結果：✓ 所有檢查通過")
     else:
         print("驗證結果：✗ 發現問題")
-        for error in errors:
+        for error in validation['errors']:
             print(f"  - {error}")
     print()
 
@@ -118,8 +128,58 @@ def review_question(question, index, total):
             print("無效選項，請重新選擇")
 
 
+def prepare_queue(questions, sort='quality', min_score=None, only_valid=False):
+    """回傳 (審核佇列, 篩選掉的題目)；quality 排序時通過驗證的題目在前、分數由高到低"""
+    queue, filtered = [], []
+    for question in questions:
+        if (only_valid and not question['validation']['valid']) or \
+                (min_score is not None and question['quality_score'] < min_score):
+            filtered.append(question)
+        else:
+            queue.append(question)
+    if sort == 'quality':
+        queue.sort(key=lambda q: (not q['validation']['valid'], -q['quality_score']))
+    return queue, filtered
+
+
+def bulk_accept(queue, threshold):
+    """列出通過驗證且評分 ≥ threshold 的題目，確認後一次接受；回傳 (已接受, 剩餘佇列)"""
+    candidates = [q for q in queue if q['validation']['valid'] and q['quality_score'] >= threshold]
+    if not candidates:
+        print(f'⊙ 沒有通過驗證且評分 ≥ {threshold:g} 的題目')
+        print()
+        return [], queue
+
+    print(f'通過驗證且評分 ≥ {threshold:g} 的題目（{len(candidates)} 道）：')
+    for q in candidates:
+        print(f"  {q['quality_score']:4.1f}  {q['date']}  {q['type']:<20} {q['question_data']['question']}")
+    print()
+    choice = input(f'全部接受這 {len(candidates)} 道題目？[y/N] ').strip().lower()
+    print()
+    if choice != 'y':
+        return [], queue
+    chosen = set(map(id, candidates))
+    return candidates, [q for q in queue if id(q) not in chosen]
+
+
 def main():
     """主執行流程"""
+    parser = argparse.ArgumentParser(description='AI 題目審核介面')
+    parser.add_argument('--draft', default=DRAFT_FILE, help='初稿檔案')
+    parser.add_argument('--sort', default='quality', choices=SORT_ORDERS,
+                        help='審核順序：quality（通過驗證者在前，評分由高到低）或 draft（初稿順序）')
+    parser.add_argument('--min-score', type=float,
+                        help='只審核評分不低於此值的題目（其餘視為跳過）')
+    parser.add_argument('--only-valid', action='store_true',
+                        help='只審核通過驗證的題目')
+    parser.add_argument('--accept-above', type=float, nargs='?', const=MIN_ACCEPT_SCORE,
+                        help=f'先批次接受通過驗證且評分不低於此值的題目（預設 {MIN_ACCEPT_SCORE:g}）')
+    parser.add_argument('--jobs', type=int, default=0,
+                        help='預先驗證時平行處理的行程數（0 表示使用所有 CPU 核心）')
+    parser.add_argument('--journal', default=JOURNAL_FILE,
+                        help='審核紀錄檔案（記錄每個決定，下次從未決定的題目繼續）')
+    args = parser.parse_args()
+
     print('=' * 80)
     print('AI 題目審核介面')
     print('=' * 80)
@@ -128,42 +188,84 @@ def main():
     # 載入初稿
     print('載入 AI 生成的題目...')
     try:
-        questions = load_draft_questions()
+        questions = load_draft_questions(args.draft)
         print(f'  ✓ 載入 {len(questions)} 道題目')
-        print()
     except FileNotFoundError:
-        print('錯誤：找不到 intermediate/ai_generated_questions_draft.json')
-        print('請先執行 generate_ai_auto_questions.py')
+        print(f'錯誤：找不到 {args.draft}')
+        print('請先執行 generate_ai_auto_questions.py 或 generation_pipeline.py')
         sys.exit(1)
 
-    # 審核結果
+    # 尚未預先驗證（或內容已變動）的題目在此一次算完並存回初稿
+    updated = annotate_questions(questions, resolve_jobs(args.jobs))
+    if updated:
+        write_json_atomic(args.draft, questions, indent=2)
+        print(f'  ✓ 驗證並評分 {updated} 道題目')
+    print_summary(questions)
+    print()
+
+    journal, imported = open_journal(args.journal)
+    if imported:
+        print(f'⊙ 匯入先前審核的 {imported} 道題目至 {args.journal}')
+    fresh, previously_skipped = journal.pending(questions)
+    decided = len(questions) - len(fresh) - len(previously_skipped)
+    if journal.sessions:
+        print(f'⊙ 接續先前的審核：已決定 {decided} 道，先前跳過 {len(previously_skipped)} 道（排在最後）')
+
+    # 先前跳過的題目排在從未審核的題目之後
+    queue, filtered = prepare_queue(fresh, args.sort, args.min_score, args.only_valid)
+    queue_skipped, filtered_skipped = prepare_queue(previously_skipped, args.sort,
+                                                    args.min_score, args.only_valid)
+    queue += queue_skipped
+    filtered += filtered_skipped
+    if filtered:
+        print(f'⊙ 依條件略過 {len(filtered)} 道題目')
+    print()
+
+    # 本次審核結果（每個決定立即寫入審核紀錄）
     accepted = []
     rejected = []
     skipped = []
+    reviewed = 0
 
-    for i, question in enumerate(questions):
-        result = review_question(question, i, len(questions))
-
-        if result == 'accept':
-            accepted.append(question)
-            print(f"✓ 已接受題目 {i+1}")
-            print()
-        elif result[0] == 'reject':
-            reason = result[1] if len(result) > 1 else ''
-            question['rejection_reason'] = reason
-            rejected.append(question)
-            print(f"✗ 已拒絕題目 {i+1}")
-            print()
-        elif result == 'skip':
-            skipped.append(question)
-            print(f"⊙ 已跳過題目 {i+1}")
-            print()
-        elif result == 'quit':
-            print()
-            print(f"審核結束（已審核 {i}/{len(questions)} 道題目）")
-            # 將未審核的題目加入 skipped
-            skipped.extend(questions[i:])
-            break
+    try:
+        if args.accept_above is not None:
+            bulk, queue = bulk_accept(queue, args.accept_above)
+            if bulk:
+                journal.record_many([(q, ACCEPT, None) for q in bulk])
+                accepted.extend(bulk)
+                print(f'✓ 批次接受 {len(bulk)} 道題目')
+                print()
+
+        for i, question in enumerate(queue):
+            result = review_question(question, i, len(queue))
+
+            if result == 'accept':
+                journal.record(question, ACCEPT)
+                accepted.append(question)
+                print(f"✓ 已接受題目 {i+1}")
+                print()
+            elif result[0] == 'reject':
+                reason = result[1] if len(result) > 1 else ''
+                journal.record(question, REJECT, reason)
+                question['rejection_reason'] = reason
+                rejected.append(question)
+                print(f"✗ 已拒絕題目 {i+1}")
+                print()
+            elif result == 'skip':
+                journal.record(question, SKIP)
+                skipped.append(question)
+                print(f"⊙ 已跳過題目 {i+1}")
+                print()
+            elif result == 'quit':
+                print()
+                print(f"審核結束（已審核 {i}/{len(queue)} 道題目，下次從未決定的題目繼續）")
+                break
+            reviewed = i + 1
+    except (KeyboardInterrupt, EOFError):
+        print()
+        print(f'審核中斷（已審核 {reviewed}/{len(queue)} 道題目，已做的決定都已保存）')
+
+    remaining = len(queue) - reviewed
 
     # 統計結果
     print()
@@ -172,33 +274,32 @@ def main():
     print('=' * 80)
     print()
     print(f'總題目數: {len(questions)}')
-    print(f'已接受: {len(accepted)}')
-    print(f'已拒絕: {len(rejected)}')
-    print(f'已跳過: {len(skipped)}')
+    print(f'本次已接受: {len(accepted)}')
+    print(f'本次已拒絕: {len(rejected)}')
+    print(f'本次已跳過: {len(skipped)}')
+    print(f'尚未審核: {remaining + len(filtered)}')
+    totals = journal.counts()
+    print(f"累計（{journal.session} 個工作階段）: 接受 {totals[ACCEPT]}，"
+          f"拒絕 {totals[REJECT]}，跳過 {totals[SKIP]}")
     print()
 
-    # 保存結果
-    if accepted:
-        reviewed_file = 'intermediate/ai_generated_questions_reviewed.json'
-        with open(reviewed_file, 'w', encoding='utf-8') as f:
-            json.dump(accepted, f, ensure_ascii=False, indent=2)
-        print(f'✓ 已接受的題目保存至: {reviewed_file}')
-
-    if rejected:
-        rejected_file = 'intermediate/ai_rejected_questions.json'
-        with open(rejected_file, 'w', encoding='utf-8') as f:
-            json.dump(rejected, f, ensure_ascii=False, indent=2)
-        print(f'✓ 已拒絕的題目保存至: {rejected_file}')
+    # 由審核紀錄重建輸出檔（包含先前工作階段的決定）
+    total_accepted, total_rejected = journal.export(REVIEWED_FILE, REJECTED_FILE)
+    if total_accepted:
+        print(f'✓ 已接受的 {total_accepted} 道題目保存至: {REVIEWED_FILE}')
+    if total_rejected:
+        print(f'✓ 已拒絕的 {total_rejected} 道題目保存至: {REJECTED_FILE}')
 
-    if skipped:
-        print(f'⊙ {len(skipped)} 道題目被跳過，請稍後再審核')
+    if skipped or remaining or filtered:
+        print(f'⊙ {len(skipped) + remaining + len(filtered)} 道題目尚未決定，'
+              f'再次執行 review_ai_questions.py 即可繼續')
 
     print()
     print('=' * 80)
     print('審核完成！')
     print('=' * 80)
 
-    if accepted:
+    if total_accepted:
         print()
         print('下一步：')
         print('  執行 merge_ai_questions.py 將接受的題目合併到題庫')
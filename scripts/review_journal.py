@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+審核紀錄（只增不改的 JSONL 日誌）
+每做一個決定就附加一行並 fsync，中途結束或當機都不會遺失已做的決定；
+下次審核從第一道未決定的題目繼續，已接受/已拒絕的檔案由所有工作階段的紀錄重建
+"""
+
+import hashlib
+import json
+import os
+import argparse
+from datetime import datetime
+
+from question_store import write_json_atomic
+
+JOURNAL_FILE = 'intermediate/ai_review_journal.jsonl'
+REVIEWED_FILE = 'intermediate/ai_generated_questions_reviewed.json'
+REJECTED_FILE = 'intermediate/ai_rejected_questions.json'
+
+ACCEPT = 'accept'
+REJECT = 'reject'
+SKIP = 'skip'
+DECISIONS = (ACCEPT, REJECT, SKIP)
+
+# 審核介面附加的欄位，不影響題目的識別
+_REVIEW_FIELDS = ('validation', 'quality_score', 'rejection_reason')
+
+
+def question_key(question):
+    """以題目內容識別題目（重新生成的題目內容不同，視為新題目）"""
+    content = {k: v for k, v in question.items() if k not in _REVIEW_FIELDS}
+    payload = json.dumps(content, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class ReviewJournal:
+    """
+    審核紀錄：每行一個決定 {'key', 'decision', 'reason', 'session', 'time', 'question'}
+    同一題有多個決定時以最後一個為準（例如先跳過、之後再接受）
+    """
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self.decisions = {}   # key -> 最後一個決定的紀錄（依決定的先後排序）
+        self.sessions = 0
+        self._end = 0         # 完整紀錄的結尾位置（之後為當機時寫到一半的內容）
+        self._load()
+        self.session = self.sessions + 1
+
+    @property
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _load(self):
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            offset = 0
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # 寫到一半的最後一行：該決定未完成提交，忽略
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    raise ValueError(f'審核紀錄損毀（位置 {offset}）: {self.path}')
+                offset += len(line)
+                self.decisions.pop(entry['key'], None)
+                self.decisions[entry['key']] = entry
+                self.sessions = max(self.sessions, entry.get('session', 0))
+            self._end = offset
+
+    def record_many(self, items):
+        """附加多個決定 [(題目, 決定, 原因)]，一次 fsync"""
+        if not items:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        now = datetime.now().isoformat(timespec='seconds')
+        entries = []
+        for question, decision, reason in items:
+            if decision not in DECISIONS:
+                raise ValueError(f'無效的審核決定: {decision}')
+            entries.append({
+                'key': question_key(question),
+                'decision': decision,
+                'reason': reason,
+                'session': self.session,
+                'time': now,
+                'question': question,
+            })
+        data = ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries).encode('utf-8')
+        with open(self.path, 'ab') as f:
+            # 截去上次當機留下的不完整紀錄
+            if f.tell() > self._end:
+                f.truncate(self._end)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._end += len(data)
+        for entry in entries:
+            self.decisions.pop(entry['key'], None)  # 重新決定的題目移到最後
+            self.decisions[entry['key']] = entry
+
+    def record(self, question, decision, reason=None):
+        """附加一個決定並 fsync"""
+        self.record_many([(question, decision, reason)])
+
+    def decision_of(self, question):
+        entry = self.decisions.get(question_key(question))
+        return entry['decision'] if entry else None
+
+    def questions(self, decision):
+        """最後決定為 decision 的題目（依決定順序）"""
+        result = []
+        for entry in self.decisions.values():
+            if entry['decision'] == decision:
+                question = dict(entry['question'])
+                if decision == REJECT:
+                    question['rejection_reason'] = entry.get('reason') or ''
+                result.append(question)
+        return result
+
+    def counts(self):
+        counts = dict.fromkeys(DECISIONS, 0)
+        for entry in self.decisions.values():
+            counts[entry['decision']] += 1
+        return counts
+
+    def pending(self, questions):
+        """
+        回傳 (從未決定的題目, 先前跳過的題目)，皆維持原順序；
+        已接受/已拒絕的題目不再出現
+        """
+        fresh, skipped = [], []
+        for question in questions:
+            decision = self.decision_of(question)
+            if decision is None:
+                fresh.append(question)
+            elif decision == SKIP:
+                skipped.append(question)
+        return fresh, skipped
+
+    def export(self, reviewed_file=REVIEWED_FILE, rejected_file=REJECTED_FILE):
+        """由所有工作階段的紀錄重建已接受/已拒絕的檔案，回傳 (接受數, 拒絕數)"""
+        accepted = self.questions(ACCEPT)
+        rejected = self.questions(REJECT)
+        if accepted or os.path.exists(reviewed_file):
+            write_json_atomic(reviewed_file, accepted, indent=2)
+        if rejected or os.path.exists(rejected_file):
+            write_json_atomic(rejected_file, rejected, indent=2)
+        return len(accepted), len(rejected)
+
+
+def _load_list(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def open_journal(path=JOURNAL_FILE, reviewed_file=REVIEWED_FILE, rejected_file=REJECTED_FILE):
+    """
+    開啟審核紀錄；尚無紀錄時匯入先前（沒有紀錄的版本）寫出的已接受/已拒絕檔案，
+    回傳 (journal, 匯入的題數)
+    """
+    journal = ReviewJournal(path)
+    if journal.exists:
+        return journal, 0
+    items = [(q, ACCEPT, None) for q in _load_list(reviewed_file)]
+    items += [(q, REJECT, q.get('rejection_reason')) for q in _load_list(rejected_file)]
+    journal.record_many(items)
+    return journal, len(items)
+
+
+def main():
+    """主執行流程"""
+    parser = argparse.ArgumentParser(description='審核紀錄狀態與匯出')
+    parser.add_argument('command', nargs='?', default='status', choices=['status', 'export'],
+                        help='status：顯示各決定的題數；export：由紀錄重建已接受/已拒絕的檔案')
+    parser.add_argument('--journal', default=JOURNAL_FILE, help='審核紀錄檔案')
+    args = parser.parse_args()
+
+    journal = ReviewJournal(args.journal)
+    if not journal.exists:
+        print(f'⊙ 尚無審核紀錄: {args.journal}')
+        return
+    if args.command == 'export':
+        accepted, rejected = journal.export()
+        print(f'✓ 已接受 {accepted} 道 → {REVIEWED_FILE}')
+        print(f'✓ 已拒絕 {rejected} 道 → {REJECTED_FILE}')
+        return
+    counts = journal.counts()
+    print(f'審核紀錄: {args.journal}（{journal.sessions} 個工作階段）')
+    print(f'  已接受: {counts[ACCEPT]}')
+    print(f'  已拒絕: {counts[REJECT]}')
+    print(f'  已跳過: {counts[SKIP]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抽題用的預先計算表
+依題型、難度分組的索引表（索引指向依 ID 排序後的題目），以及每個題數的
+各題型配額；前端據此以 Fisher–Yates 直接抽出 k 題，不必每局重新掃描題庫
+"""
+
+import json
+import math
+import argparse
+
+# 各題型的抽題比例（與 data.js 的 TYPE_RATIOS 保持一致，順序即分配順序）
+TYPE_RATIOS = {
+    'detail-observation': 0.35,    # 細節觀察 -> 觀察力
+    'context-recall': 0.30,        # 情境回憶 -> 記憶力
+    'opinion-expression': 0.15,    # 評價觀點 -> 默契度
+    'action-motivation': 0.10,     # 行為動機 -> 同理心
+    'action-intention': 0.05,      # 行為意圖 -> 默契度
+    'preference-memory': 0.05      # 偏好記憶 -> 細心度
+}
+
+# 預先計算配額的題數（開始畫面的 10 / 25 / 50 題與較短的測驗長度）
+QUESTION_COUNTS = (5, 10, 15, 20, 25, 50)
+
+
+def index_tables(questions):
+    """回傳 (依題型的索引表, 依難度的索引表)；索引為題目依 ID 排序後的位置"""
+    by_type, by_difficulty = {}, {}
+    for i, q in enumerate(sorted(questions, key=lambda q: q['id'])):
+        by_type.setdefault(q['type'], []).append(i)
+        by_difficulty.setdefault(q['difficulty'], []).append(i)
+    return by_type, by_difficulty
+
+
+def plan_quotas(count, type_counts, ratios=TYPE_RATIOS):
+    """
+    題數 count 的配額：{'types': {題型: 題數}, 'fill': 補足題數}
+    前幾個題型取 floor(count × 比例)，最後一個題型分到剩餘名額；
+    題型題數不足時以 fill 從所有未選中的題目補足（與 data.js 的 planQuotas 相同）
+    """
+    quotas = {}
+    allocated = 0
+    items = list(ratios.items())
+    for index, (q_type, ratio) in enumerate(items):
+        if index == len(items) - 1:
+            wanted = count - allocated
+        else:
+            # 與 JavaScript 的 Math.floor(count * ratio) 相同（同為倍精度浮點數運算）
+            wanted = math.floor(count * ratio)
+            allocated += wanted
+        quotas[q_type] = min(wanted, type_counts.get(q_type, 0))
+    total = sum(type_counts.values())
+    chosen = sum(quotas.values())
+    return {'types': quotas, 'fill': max(0, min(count, total) - chosen)}
+
+
+def sampling_tables(questions, counts=QUESTION_COUNTS):
+    """manifest 中的 sampling 區段；題數不少於題庫總數的配額省略（前端直接洗牌全部題目）"""
+    by_type, by_difficulty = index_tables(questions)
+    type_counts = {q_type: len(indices) for q_type, indices in by_type.items()}
+    return {
+        'order': 'id',
+        'total': len(questions),
+        'byType': by_type,
+        'byDifficulty': by_difficulty,
+        'ratios': TYPE_RATIOS,
+        'plans': {str(count): plan_quotas(count, type_counts)
+                  for count in counts if count < len(questions)},
+    }
+
+
+def main():
+    """主執行流程"""
+    parser = argparse.ArgumentParser(description='顯示各題數的抽題配額')
+    parser.add_argument('--questions', default='final_questions_new.json',
+                        help='題庫檔案')
+    args = parser.parse_args()
+
+    with open(args.questions, 'r', encoding='utf-8') as f:
+        questions = json.load(f)
+    tables = sampling_tables(questions)
+
+    print('=' * 80)
+    print(f"抽題配額 - {args.questions}（共 {tables['total']} 題）")
+    print('=' * 80)
+    print()
+    print('題型題數：' + '，'.join(f'{t} {len(ix)}' for t, ix in tables['byType'].items()))
+    print('難度題數：' + '，'.join(f'{d} {len(ix)}' for d, ix in tables['byDifficulty'].items()))
+    print()
+    for count, plan in tables['plans'].items():
+        quotas = '，'.join(f'{t} {n}' for t, n in plan['types'].items())
+        print(f"{count:>3} 題: {quotas}，補足 {plan['fill']}")
+
+
+if __name__ == '__main__':
+    main()
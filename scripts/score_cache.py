@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+每日評分結果的磁碟快取
+以「時期 + 當日訊息雜湊 + 關鍵字與評分規則版本」為鍵，舊的對話紀錄不需重複評分
+"""
+
+import hashlib
+import json
+import os
+
+from extract_snippets import KEYWORDS, QUESTION_MARKS
+
+CACHE_DIR = 'cache'
+
+# 評分規則（視窗長度、加分方式、同分處理等）有變動時遞增，使舊快取失效
+SCORING_VERSION = 1
+
+
+def scoring_fingerprint():
+    """關鍵字表與評分規則的版本指紋"""
+    payload = json.dumps({
+        'version': SCORING_VERSION,
+        'keywords': KEYWORDS,
+        'question_marks': QUESTION_MARKS,
+    }, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def messages_digest(messages):
+    """單日訊息的內容雜湊"""
+    h = hashlib.sha1()
+    for m in messages:
+        h.update(f"{m.get('time', '')}\x1f{m.get('user', '')}\x1f{m.get('content', '')}\x1e".encode('utf-8'))
+    return h.hexdigest()
+
+
+class ScoreCache:
+    """單一時期的每日評分快取"""
+
+    def __init__(self, period, cache_dir=CACHE_DIR):
+        self.period = period
+        self.path = os.path.join(cache_dir, f'date_scores_{period}.json')
+        self.fingerprint = scoring_fingerprint()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        # 關鍵字表或評分規則變動時整份快取作廢
+        if data.get('fingerprint') == self.fingerprint and data.get('period') == self.period:
+            self.entries = data.get('dates', {})
+
+    def get(self, date, digest):
+        """取得快取結果；內容已變動或不存在時回傳 None"""
+        entry = self.entries.get(date)
+        if entry is not None and entry['digest'] == digest:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def put(self, date, digest, score, tags, start, length, total_messages):
+        """寫入單日評分結果"""
+        self.entries[date] = {
+            'digest': digest,
+            'score': score,
+            'tags': tags,
+            'start': start,
+            'length': length,
+            'total_messages': total_messages,
+        }
+        self._dirty = True
+
+    def save(self):
+        """寫回磁碟（先寫暫存檔再取代，避免中斷時損毀快取）"""
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'period': self.period,
+                'fingerprint': self.fingerprint,
+                'dates': self.entries,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
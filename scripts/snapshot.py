@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+對話資料的二進位快照
+將 raw_data 匯出檔轉為欄位式二進位檔，以 mmap 開啟後可直接存取單日訊息，
+不需解析整份 JSON；快照記錄來源檔的 SHA-256，來源變動時自動失效
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+import argparse
+from array import array
+
+from message_store import PeriodStore, store_from_export
+
+MAGIC = b'FTSNAP\x00\x00'
+FORMAT_VERSION = 1
+SNAPSHOT_DIR = 'snapshots'
+
+# 區段順序固定；每個區段以 8 位元組對齊，方便以 memoryview.cast 直接讀取
+SECTIONS = ('users', 'user_ids', 'days', 'minutes', 'offsets', 'content',
+            'extras', 'day_ordinals', 'day_starts')
+
+# magic, 版本, 位元組序, 來源 SHA-256, 來源大小, 來源 mtime, 訊息數, 日期數, 索引 CRC32
+_HEADER = struct.Struct('<8sIB32sQqQII')
+_SECTION = struct.Struct('<QQ')
+HEADER_SIZE = _HEADER.size + _SECTION.size * len(SECTIONS)
+
+
+def snapshot_path(source_path):
+    """來源匯出檔對應的快照路徑（raw_data/snapshots/chat_*.snap）"""
+    directory, name = os.path.split(source_path)
+    return os.path.join(directory, SNAPSHOT_DIR, os.path.splitext(name)[0] + '.snap')
+
+
+def source_digest(path, chunk_size=1 << 20):
+    """來源檔的 SHA-256"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.digest()
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def build_snapshot(source_path, output_path=None):
+    """由 JSON 匯出檔建立快照，回傳快照路徑"""
+    output_path = output_path or snapshot_path(source_path)
+    stat = os.stat(source_path)
+    digest = source_digest(source_path)
+    store = store_from_export(source_path)
+
+    day_ordinals = array('i')
+    day_starts = array('Q')
+    for ordinal, (start, _) in store.day_index.items():
+        day_ordinals.append(ordinal)
+        day_starts.append(start)
+    day_starts.append(len(store))
+
+    payloads = {
+        'users': json.dumps(store.users, ensure_ascii=False).encode('utf-8'),
+        'user_ids': store.user_ids.tobytes(),
+        'days': store.days.tobytes(),
+        'minutes': store.minutes.tobytes(),
+        'offsets': store.offsets.tobytes(),
+        'content': bytes(store.content),
+        'extras': json.dumps({str(k): v for k, v in store.extras.items()},
+                             ensure_ascii=False).encode('utf-8'),
+        'day_ordinals': day_ordinals.tobytes(),
+        'day_starts': day_starts.tobytes(),
+    }
+    index_crc = _index_crc(payloads['users'], payloads['extras'],
+                           payloads['day_ordinals'], payloads['day_starts'])
+
+    sections = []
+    position = _align(HEADER_SIZE)
+    for name in SECTIONS:
+        sections.append((position, len(payloads[name])))
+        position = _align(position + len(payloads[name]))
+
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, sys.byteorder == 'little', digest,
+                          stat.st_size, stat.st_mtime_ns, len(store), len(day_ordinals), index_crc)
+    header += b''.join(_SECTION.pack(offset, length) for offset, length in sections)
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        for name, (offset, length) in zip(SECTIONS, sections):
+            f.write(b'\x00' * (offset - f.tell()))
+            f.write(payloads[name])
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def _index_crc(*parts):
+    crc = 0
+    for part in parts:
+        crc = zlib.crc32(part, crc)
+    return crc
+
+
+class Snapshot:
+    """以 mmap 開啟的快照（唯讀）"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        if len(view) < HEADER_SIZE:
+            raise ValueError(f'{path} 不是有效的快照檔')
+        (magic, version, little_endian, self.source_sha256, self.source_size,
+         self.source_mtime_ns, count, day_count, index_crc) = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} 不是有效的快照檔')
+        if version != FORMAT_VERSION:
+            raise ValueError(f'{path} 的快照版本 {version} 與目前版本 {FORMAT_VERSION} 不符，請重新建立')
+        if bool(little_endian) != (sys.byteorder == 'little'):
+            raise ValueError(f'{path} 的位元組序與本機不同，請重新建立')
+
+        sections = {}
+        for i, name in enumerate(SECTIONS):
+            offset, length = _SECTION.unpack_from(view, _HEADER.size + i * _SECTION.size)
+            if offset + length > len(view):
+                raise ValueError(f'{path} 已損毀（區段 {name} 超出檔案範圍）')
+            sections[name] = view[offset:offset + length]
+
+        if _index_crc(sections['users'], sections['extras'],
+                      sections['day_ordinals'], sections['day_starts']) != index_crc:
+            raise ValueError(f'{path} 已損毀（索引檢查碼不符）')
+
+        users = json.loads(bytes(sections['users']))
+        extras = {int(k): v for k, v in json.loads(bytes(sections['extras'])).items()}
+        self.store = PeriodStore(users,
+                                 sections['user_ids'].cast('H'),
+                                 sections['days'].cast('i'),
+                                 sections['minutes'].cast('H'),
+                                 sections['offsets'].cast('Q'),
+                                 sections['content'],
+                                 extras)
+        if len(self.store) != count:
+            raise ValueError(f'{path} 已損毀（訊息數不符）')
+
+        # 日期索引直接取自快照，不需掃描整個 days 欄位
+        day_ordinals = sections['day_ordinals'].cast('i')
+        day_starts = sections['day_starts'].cast('Q')
+        if len(day_ordinals) != day_count:
+            raise ValueError(f'{path} 已損毀（日期數不符）')
+        self.store._day_index = {day_ordinals[i]: (day_starts[i], day_starts[i + 1])
+                                 for i in range(day_count)}
+
+    def is_fresh(self, source_path):
+        """確認快照與來源檔一致（大小與修改時間相同時略過完整雜湊）"""
+        try:
+            stat = os.stat(source_path)
+        except FileNotFoundError:
+            return False
+        if stat.st_size != self.source_size:
+            return False
+        if stat.st_mtime_ns == self.source_mtime_ns:
+            return True
+        return source_digest(source_path) == self.source_sha256
+
+    def dates(self):
+        return self.store.dates()
+
+    def day(self, date):
+        return self.store.day(date)
+
+    def iter_days(self, keep=None, dates=None):
+        return self.store.iter_days(keep, dates)
+
+
+def open_snapshot(source_path):
+    """開啟來源檔對應的快照；快照不存在、損毀或已過期時回傳 None"""
+    path = snapshot_path(source_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        snapshot = Snapshot(path)
+    except ValueError:
+        return None
+    return snapshot if snapshot.is_fresh(source_path) else None
+
+
+def main():
+    """主執行流程"""
+    parser = argparse.ArgumentParser(description='對話資料二進位快照工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='由 JSON 匯出檔建立快照')
+    build_parser.add_argument('files', nargs='+', help='原始對話資料（raw_data/chat_*.json）')
+
+    info_parser = subparsers.add_parser('info', help='顯示快照資訊並檢查是否過期')
+    info_parser.add_argument('files', nargs='+', help='原始對話資料（raw_data/chat_*.json）')
+
+    args = parser.parse_args()
+
+    for source in args.files:
+        if args.command == 'build':
+            path = build_snapshot(source)
+            print(f'✓ {source} → {path}（{os.path.getsize(path) / 1e6:.1f} MB）')
+        else:
+            path = snapshot_path(source)
+            if not os.path.exists(path):
+                print(f'✗ {source}: 尚未建立快照')
+                continue
+            snapshot = Snapshot(path)
+            dates = snapshot.dates()
+            status = '✓ 最新' if snapshot.is_fresh(source) else '✗ 已過期，請重新建立'
+            print(f'{source}: {status}')
+            print(f'  訊息數: {len(snapshot.store)}，日期數: {len(dates)}'
+                  f'（{dates[0] if dates else "-"} ~ {dates[-1] if dates else "-"}）')
+
+
+if __name__ == '__main__':
+    main()
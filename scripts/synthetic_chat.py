@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成 LINE 對話匯出檔（效能測試用）
+以固定種子產生與 raw_data/chat_*.json 相同格式的繁體中文對話，可調整每日訊息數、
+媒體訊息比例與關鍵字密度；基本詞彙不含任何評分關鍵字，關鍵字只由密度參數注入。
+訊息逐則寫出，產生 1000 萬則訊息也不需把資料留在記憶體中
+"""
+
+import json
+import os
+import random
+import argparse
+from datetime import date, timedelta
+
+from extract_snippets import KEYWORDS
+from message_filter import DEFAULT_MEDIA_MARKERS
+
+DEFAULT_USERS = ('李宜潔', '量角器📐')
+DEFAULT_MESSAGES_PER_DAY = 40
+DEFAULT_MEDIA_RATE = 0.08
+DEFAULT_KEYWORD_DENSITY = 0.15
+DEFAULT_SHORT_RATE = 0.05
+
+# 與 browse_dates.PERIOD_FILES 相同的檔名；年份超過最後一個時期的日期都寫入最後一個檔案
+PERIODS = (
+    (2020, 'raw_data/chat_2019_2020.json'),
+    (2022, 'raw_data/chat_2021_2022.json'),
+    (None, 'raw_data/chat_2023_2025.json'),
+)
+FIRST_DATE = date(2019, 1, 1)
+LAST_DATE = date(2025, 12, 31)
+
+ALL_KEYWORDS = sorted({kw for kws in KEYWORDS.values() for kw in kws})
+
+
+def _neutral(words):
+    """移除含有評分關鍵字的詞，使關鍵字密度完全由參數決定"""
+    return [w for w in words if not any(kw in w for kw in ALL_KEYWORDS)]
+
+
+SUBJECTS = _neutral(['我', '你', '我們', '他', '她', '老師', '同學', '我媽', '室友', '學長', '大家', '妳'])
+ADVERBS = _neutral(['剛剛', '今天', '明天', '等一下', '已經', '還沒', '晚點', '下禮拜', '昨天', '一直', '好像', '其實'])
+VERBS = _neutral(['要去', '在', '想', '準備', '不想', '可以', '忘記', '趕快', '先去', '陪', '幫忙', '順便'])
+OBJECTS = _neutral(['吃飯', '上課', '報告', '睡覺', '打工', '看電影', '回家', '買東西', '寫作業', '開會',
+                    '搭捷運', '洗澡', '練習', '排隊', '領包裹', '去圖書館', '吃火鍋', '訂位', '運動', '整理房間'])
+ENDINGS = _neutral(['啦', '吧', '嗎', '了', '～', '！', '。', '...', '哦', '嘛', '囉', '😂', '🥲', '👍', '🙏', ''])
+REPLIES = _neutral(['好', '對', '可以', '沒有', '不行', '好啊', '等等', '了解', '先這樣', '沒關係', '再說',
+                    '我也是', '不知道', '隨便', '都可以', '應該吧', '收到', '馬上'])
+SHORT_REPLIES = _neutral(['好', '對', '沒', '行', '哦', '嗚'])
+MEDIA_CONTENTS = [m for m in DEFAULT_MEDIA_MARKERS if m != '☎'] + ['☎ 通話時間 0:42', '☎ 未接來電']
+
+
+def period_path(day):
+    for last_year, path in PERIODS:
+        if last_year is None or day.year <= last_year:
+            return path
+
+
+def _sentence(rng):
+    kind = rng.random()
+    if kind < 0.3:
+        return rng.choice(REPLIES) + rng.choice(ENDINGS)
+    parts = [rng.choice(SUBJECTS)]
+    if rng.random() < 0.6:
+        parts.append(rng.choice(ADVERBS))
+    parts.append(rng.choice(VERBS))
+    parts.append(rng.choice(OBJECTS))
+    parts.append(rng.choice(ENDINGS))
+    return ''.join(parts)
+
+
+def _content(rng, media_rate, keyword_density, short_rate):
+    """回傳 (內容, 種類)；種類為 media / short / keyword / text"""
+    r = rng.random()
+    if r < media_rate:
+        return rng.choice(MEDIA_CONTENTS), 'media'
+    if r < media_rate + short_rate:
+        return rng.choice(SHORT_REPLIES), 'short'
+    text = _sentence(rng)
+    if rng.random() < 0.25:
+        text += rng.choice([' ', '，']) + _sentence(rng)
+    if rng.random() < keyword_density:
+        keyword = rng.choice(ALL_KEYWORDS)
+        text = keyword + text if rng.random() < 0.5 else text + keyword
+        return text, 'keyword'
+    return text, 'text'
+
+
+def iter_synthetic_messages(total, seed=0, messages_per_day=DEFAULT_MESSAGES_PER_DAY,
+                            media_rate=DEFAULT_MEDIA_RATE, keyword_density=DEFAULT_KEYWORD_DENSITY,
+                            short_rate=DEFAULT_SHORT_RATE, users=DEFAULT_USERS, stats=None):
+    """
+    依日期順序逐則產生 total 則訊息（與 LINE 匯出檔相同的欄位）
+    每日訊息數約為 messages_per_day（常態分布，標準差為一半）；
+    日期較少時平均分散在 2019–2025，較多時逐日排列並延伸到 2025 年之後
+    stats: 選用的 dict，累計 days 與各種類的訊息數
+    """
+    rng = random.Random(seed)
+    days_needed = -(-total // max(1, messages_per_day))
+    step = max(1, ((LAST_DATE - FIRST_DATE).days + 1) // max(1, days_needed))
+    day = FIRST_DATE
+    produced = 0
+    user = users[0]
+    while produced < total:
+        count = max(1, round(rng.gauss(messages_per_day, messages_per_day / 2)))
+        count = min(count, total - produced)
+        date_str = day.strftime('%Y/%m/%d')
+        for minute in sorted(rng.randrange(24 * 60) for _ in range(count)):
+            # 大多數時候輪流發言，偶爾同一人連續傳好幾則
+            if rng.random() < 0.6:
+                user = users[(users.index(user) + 1) % len(users)]
+            content, kind = _content(rng, media_rate, keyword_density, short_rate)
+            time_str = f'{minute // 60:02d}:{minute % 60:02d}'
+            if stats is not None:
+                stats[kind] = stats.get(kind, 0) + 1
+            yield {
+                'date': date_str,
+                'time': time_str,
+                'datetime': f'{date_str} {time_str}',
+                'user': user,
+                'content': content,
+            }
+        produced += count
+        if stats is not None:
+            stats['days'] = stats.get('days', 0) + 1
+        day += timedelta(days=step)
+
+
+def write_corpus(output_dir, total, seed=0, chat_name='合成對話', **options):
+    """
+    在 output_dir 下寫入 raw_data/chat_*.json（依日期分到三個時期檔案），
+    回傳統計 {'messages', 'days', 'bytes', 'files': {路徑: 訊息數}, 各種類的訊息數}
+    """
+    stats = {'messages': 0, 'files': {}}
+    current_path = None
+    f = None
+    try:
+        for msg in iter_synthetic_messages(total, seed, stats=stats, **options):
+            path = period_path(date(*map(int, msg['date'].split('/'))))
+            if path != current_path:
+                if f is not None:
+                    f.write('\n  ]\n}\n')
+                    f.close()
+                current_path = path
+                full_path = os.path.join(output_dir, path)
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                f = open(full_path, 'w', encoding='utf-8')
+                f.write('{\n  "chat": ' + json.dumps(chat_name, ensure_ascii=False) + ',\n  "messages": [\n    ')
+                stats['files'][path] = 0
+            elif stats['files'][path]:
+                f.write(',\n    ')
+            f.write(json.dumps(msg, ensure_ascii=False))
+            stats['files'][path] += 1
+            stats['messages'] += 1
+        if f is not None:
+            f.write('\n  ]\n}\n')
+    finally:
+        if f is not None:
+            f.close()
+    stats['bytes'] = sum(os.path.getsize(os.path.join(output_dir, path)) for path in stats['files'])
+    return stats
+
+
+def parse_count(value):
+    """'10k'、'1.5m'、'10M' 或整數 → 訊息數"""
+    text = str(value).strip().lower().replace('_', '').replace(',', '')
+    scale = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    number = text[:-1] if scale > 1 else text
+    try:
+        count = int(float(number) * scale)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'無效的訊息數: {value}')
+    if count <= 0:
+        raise argparse.ArgumentTypeError(f'訊息數需大於 0: {value}')
+    return count
+
+
+def add_corpus_arguments(parser):
+    """合成資料的參數（bench_pipeline.py 共用）"""
+    parser.add_argument('--seed', type=int, default=0, help='亂數種子')
+    parser.add_argument('--messages-per-day', type=int, default=DEFAULT_MESSAGES_PER_DAY,
+                        help='平均每日訊息數')
+    parser.add_argument('--media-rate', type=float, default=DEFAULT_MEDIA_RATE,
+                        help='媒體訊息（[照片]、[貼圖]、☎ 等）的比例')
+    parser.add_argument('--keyword-density', type=float, default=DEFAULT_KEYWORD_DENSITY,
+                        help='含評分關鍵字的訊息比例')
+    parser.add_argument('--short-rate', type=float, default=DEFAULT_SHORT_RATE,
+                        help='單字訊息（會被過濾）的比例')
+
+
+def corpus_options(args):
+    return {
+        'messages_per_day': args.messages_per_day,
+        'media_rate': args.media_rate,
+        'keyword_density': args.keyword_density,
+        'short_rate': args.short_rate,
+    }
+
+
+def main():
+    """主執行流程"""
+    parser = argparse.ArgumentParser(description='產生合成的 LINE 對話匯出檔')
+    parser.add_argument('--messages', type=parse_count, default=parse_count('10k'),
+                        help='訊息總數（可用 10k、1m 等寫法）')
+    parser.add_argument('--output', required=True,
+                        help='輸出目錄（寫入其下的 raw_data/chat_*.json）')
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    stats = write_corpus(args.output, args.messages, args.seed, **corpus_options(args))
+    print(f"✓ {stats['messages']:,} 則訊息，{stats['days']:,} 天，{stats['bytes'] / 1024 / 1024:.1f} MB")
+    for path, count in stats['files'].items():
+        print(f'  {os.path.join(args.output, path)}: {count:,} 則')
+    print(f"  媒體 {stats.get('media', 0):,}，單字 {stats.get('short', 0):,}，"
+          f"含關鍵字 {stats.get('keyword', 0):,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+標籤與關鍵字的倒排索引
+每個時期建立一次 {標籤/關鍵字: 含有它的日期}，與原始資料存放在一起；
+--tag 過濾時只需評分可能符合的日期，並支援 AND / OR / NOT 組合條件
+"""
+
+import json
+import os
+import re
+import argparse
+
+from extract_snippets import KEYWORDS, WINDOW_SCORER
+from score_cache import scoring_fingerprint
+from snapshot import source_digest
+
+# 獨立子目錄，避免與 raw_data/chat_*.json 匯出檔混在一起
+INDEX_DIR = 'tag_index'
+
+# 常見的繁簡寫法對應到 KEYWORDS 中的標籤名稱
+TAG_ALIASES = {
+    '笑點': '笑点',
+    '溫馨': '温馨',
+    '认真': '認真',
+}
+
+_TOKEN = re.compile(r'\s*(\(|\)|&&|\|\||[&|!]|[^\s()&|!]+)')
+_OPERATORS = {'AND': 'and', '&': 'and', '&&': 'and',
+              'OR': 'or', '|': 'or', '||': 'or',
+              'NOT': 'not', '!': 'not'}
+
+
+def normalize_term(term):
+    """標籤別名正規化"""
+    return TAG_ALIASES.get(term, term)
+
+
+def parse_tag_expression(text):
+    """
+    解析標籤條件，例如「溫馨 AND 特殊事件」、「NOT 有梗」、「(笑点 OR 有梗) AND 生日」
+    優先順序 NOT > AND > OR；相鄰的兩個條件視為 AND。
+    回傳語法樹：('term', 名稱) / ('not', x) / ('and', a, b) / ('or', a, b)
+    """
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match:
+            raise ValueError(f'無法解析標籤條件: {text}')
+        tokens.append(match.group(1))
+        pos = match.end()
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+
+    known = set(KEYWORDS) | {kw for words in KEYWORDS.values() for kw in words}
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def advance():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def parse_or():
+        node = parse_and()
+        while peek() is not None and _OPERATORS.get(peek().upper()) == 'or':
+            advance()
+            node = ('or', node, parse_and())
+        return node
+
+    def parse_and():
+        node = parse_not()
+        while peek() is not None and peek() != ')' and _OPERATORS.get(peek().upper()) != 'or':
+            if _OPERATORS.get(peek().upper()) == 'and':
+                advance()
+            node = ('and', node, parse_not())
+        return node
+
+    def parse_not():
+        token = peek()
+        if token is None:
+            raise ValueError(f'標籤條件不完整: {text}')
+        if _OPERATORS.get(token.upper()) == 'not':
+            advance()
+            return ('not', parse_not())
+        if token == '(':
+            advance()
+            node = parse_or()
+            if peek() != ')':
+                raise ValueError(f'標籤條件缺少右括號: {text}')
+            advance()
+            return node
+        if token == ')' or token.upper() in _OPERATORS:
+            raise ValueError(f'標籤條件中出現非預期的 {token!r}: {text}')
+        term = normalize_term(advance())
+        if term not in known:
+            raise ValueError(f'未知的標籤或關鍵字: {term}（標籤：{"/".join(KEYWORDS)}）')
+        return ('term', term)
+
+    if not tokens:
+        raise ValueError('標籤條件為空')
+    tree = parse_or()
+    if peek() is not None:
+        raise ValueError(f'標籤條件中出現非預期的 {peek()!r}: {text}')
+    return tree
+
+
+def expression_terms(tree):
+    """語法樹中出現的所有條件名稱"""
+    if tree[0] == 'term':
+        return {tree[1]}
+    return set().union(*(expression_terms(child) for child in tree[1:]))
+
+
+def matches_expression(tree, tags, keywords=()):
+    """判斷片段是否符合條件（標籤比對片段標籤，關鍵字比對片段命中的關鍵字）"""
+    kind = tree[0]
+    if kind == 'term':
+        return tree[1] in tags if tree[1] in KEYWORDS else tree[1] in keywords
+    if kind == 'not':
+        return not matches_expression(tree[1], tags, keywords)
+    if kind == 'and':
+        return matches_expression(tree[1], tags, keywords) and matches_expression(tree[2], tags, keywords)
+    return matches_expression(tree[1], tags, keywords) or matches_expression(tree[2], tags, keywords)
+
+
+def index_path(source_path):
+    """來源匯出檔對應的索引路徑（raw_data/tag_index/chat_*.json）"""
+    directory, name = os.path.split(source_path)
+    return os.path.join(directory, INDEX_DIR, name)
+
+
+class TagIndex:
+    """單一時期的倒排索引：{標籤或關鍵字: 日期集合}"""
+
+    def __init__(self, postings, meta=None):
+        self.postings = postings
+        self.meta = meta or {}
+
+    def dates(self, term):
+        return self.postings.get(term, set())
+
+    def candidates(self, tree):
+        """
+        可能符合條件的日期集合；None 表示無法縮小範圍（需評分所有日期）
+
+        索引記錄的是「當日任一有效訊息」命中的標籤，最佳片段只會是其子集，
+        因此正向條件可以縮小範圍；NOT 條件無法由當日資料判斷片段，一律保留。
+        """
+        kind = tree[0]
+        if kind == 'term':
+            return self.dates(tree[1])
+        if kind == 'not':
+            return None
+        left = self.candidates(tree[1])
+        right = self.candidates(tree[2])
+        if kind == 'and':
+            if left is None:
+                return right
+            if right is None:
+                return left
+            return left & right
+        if left is None or right is None:
+            return None
+        return left | right
+
+    @classmethod
+    def build(cls, days):
+        """由 (日期, 有效訊息列表) 建立索引（只收錄可評分的日期）"""
+        postings = {}
+        for date, messages in days:
+            if len(messages) < 2:
+                continue
+            day_mask = 0
+            for mask in WINDOW_SCORER.masks(messages):
+                day_mask |= mask
+            for term in WINDOW_SCORER.mask_keywords(day_mask) | WINDOW_SCORER.mask_tags(day_mask):
+                postings.setdefault(term, set()).add(date)
+        return cls(postings)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'meta': self.meta,
+                       'postings': {term: sorted(dates) for term, dates in self.postings.items()}},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls({term: set(dates) for term, dates in data['postings'].items()}, data['meta'])
+
+
+def _source_meta(source_path):
+    stat = os.stat(source_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _is_fresh(meta, source_path):
+    """索引是否與來源檔及目前的關鍵字表一致"""
+    if meta.get('fingerprint') != scoring_fingerprint():
+        return False
+    current = _source_meta(source_path)
+    if current['size'] != meta.get('size'):
+        return False
+    if current['mtime_ns'] == meta.get('mtime_ns'):
+        return True
+    return source_digest(source_path).hex() == meta.get('sha256')
+
+
+def load_tag_index(source_path, days_factory, rebuild=False):
+    """
+    載入來源檔的倒排索引；不存在或已過期時重新建立並保存
+    days_factory: 無參數函式，回傳 (日期, 有效訊息列表) 串流（只在需要重建時呼叫）
+    回傳 (索引, 是否重新建立)
+    """
+    path = index_path(source_path)
+    if not rebuild and os.path.exists(path):
+        try:
+            index = TagIndex.load(path)
+        except (ValueError, KeyError):
+            index = None
+        if index is not None and _is_fresh(index.meta, source_path):
+            return index, False
+
+    meta = _source_meta(source_path)
+    index = TagIndex.build(days_factory())
+    meta.update({'sha256': source_digest(source_path).hex(),
+                 'fingerprint': scoring_fingerprint()})
+    index.meta = meta
+    index.save(path)
+    return index, True
+
+
+def main():
+    """主執行流程"""
+    # 延遲匯入：browse_dates 會匯入本模組
+    from browse_dates import PERIOD_FILES, iter_period_days
+
+    parser = argparse.ArgumentParser(description='建立標籤倒排索引並查詢符合條件的日期數')
+    parser.add_argument('--period', default='all',
+                        choices=['all'] + list(PERIOD_FILES.keys()),
+                        help='時期選擇')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='強制重新建立索引')
+    parser.add_argument('expression', nargs='?', default=None,
+                        help='標籤條件，例如「溫馨 AND 特殊事件」')
+    args = parser.parse_args()
+
+    tree = parse_tag_expression(args.expression) if args.expression else None
+    periods = PERIOD_FILES if args.period == 'all' else [args.period]
+    for period in periods:
+        source = PERIOD_FILES[period]
+        index, rebuilt = load_tag_index(source, lambda: iter_period_days(period), args.rebuild)
+        status = '已重新建立' if rebuilt else '已是最新'
+        print(f'{period}: {status}（{index_path(source)}）')
+        if tree is not None:
+            candidates = index.candidates(tree)
+            count = '全部日期' if candidates is None else f'{len(candidates)} 個日期'
+            print(f'  候選: {count}')
+
+
+if __name__ == '__main__':
+    main()
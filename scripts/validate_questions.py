@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI 生成題目的驗證與品質評分
+validate_all 檢查格式、語言、引用、錯誤選項與長度；calculate_quality_score 給出 0-10 分。
+審核前以行程池一次算完整份初稿，結果連同內容雜湊存回初稿，
+審核介面直接讀取，內容未變動的題目不會重算
+"""
+
+import hashlib
+import json
+import re
+import argparse
+
+from parallel import imap_chunks, resolve_jobs, DEFAULT_CHUNK_SIZE
+
+# 驗證規則或評分方式改變時遞增，使初稿中的舊結果失效
+VALIDATOR_VERSION = 1
+
+# 建議接受的最低品質評分
+MIN_ACCEPT_SCORE = 7.0
+
+WRONG_ANSWER_COUNT = 3
+MAX_QUESTION_LENGTH = 60
+MAX_OPTION_LENGTH = 30
+MAX_EXPLANATION_LENGTH = 150
+
+REQUIRED_FIELDS = {
+    'question': str,
+    'correct_answer': str,
+    'wrong_answers': list,
+    'explanation': str,
+}
+
+# 常見的簡體字（出現即視為非繁體中文）
+SIMPLIFIED_CHARS = set('这们说么时为个来会对吗没还过进发后关门问题间种样实现给让从开见觉认识记忆选项错误难简单')
+CJK_PATTERN = re.compile(r'[一-鿿]')
+QUOTE_PATTERN = re.compile(r'「([^」]+)」')
+
+
+def _text(value):
+    return value if isinstance(value, str) else ''
+
+
+def _conversation_text(conversation):
+    return '\n'.join(_text(msg.get('content')) for msg in conversation)
+
+
+def check_schema(q_data, conversation):
+    errors = []
+    for field, expected in REQUIRED_FIELDS.items():
+        value = q_data.get(field)
+        if not isinstance(value, expected) or not value:
+            errors.append(f'缺少或格式錯誤的欄位: {field}')
+    wrong = q_data.get('wrong_answers')
+    if isinstance(wrong, list):
+        if len(wrong) != WRONG_ANSWER_COUNT:
+            errors.append(f'錯誤選項應為 {WRONG_ANSWER_COUNT} 個，實際 {len(wrong)} 個')
+        if not all(isinstance(w, str) and w.strip() for w in wrong):
+            errors.append('錯誤選項含有空白或非文字內容')
+    index = q_data.get('highlight_index')
+    if index is not None and (not isinstance(index, int) or isinstance(index, bool)
+                              or not 0 <= index < len(conversation)):
+        errors.append(f'highlight_index 超出對話範圍: {index!r}')
+    return errors
+
+
+def check_language(q_data, conversation):
+    errors = []
+    for field in ('question', 'explanation'):
+        text = _text(q_data.get(field))
+        if text and not CJK_PATTERN.search(text):
+            errors.append(f'{field} 不是中文')
+    generated = ''.join(_text(q_data.get(field)) for field in ('question', 'correct_answer', 'explanation'))
+    generated += ''.join(_text(w) for w in q_data.get('wrong_answers') or [])
+    # 對話原文中的字不算（引用原話時保留原本用字）
+    original = set(_conversation_text(conversation))
+    simplified = sorted({ch for ch in generated if ch in SIMPLIFIED_CHARS and ch not in original})
+    if simplified:
+        errors.append(f"使用了簡體字: {''.join(simplified)}")
+    return errors
+
+
+def check_grounding(q_data, conversation):
+    text = _conversation_text(conversation)
+    explanation = _text(q_data.get('explanation'))
+    quotes = QUOTE_PATTERN.findall(explanation)
+    if not quotes:
+        return ['解釋沒有以「」引用對話']
+    missing = [quote for quote in quotes if quote not in text]
+    if len(missing) == len(quotes):
+        return [f'解釋引用的內容不在對話中: 「{missing[0]}」']
+    return []
+
+
+def check_distractors(q_data, conversation):
+    correct = _text(q_data.get('correct_answer')).strip()
+    wrong = [_text(w).strip() for w in q_data.get('wrong_answers') or []]
+    errors = []
+    if correct and correct in wrong:
+        errors.append('錯誤選項與正確答案相同')
+    if len(set(wrong)) != len(wrong):
+        errors.append('錯誤選項重複')
+    return errors
+
+
+def check_lengths(q_data, conversation):
+    errors = []
+    question = _text(q_data.get('question'))
+    if len(question) > MAX_QUESTION_LENGTH:
+        errors.append(f'題目過長（{len(question)} > {MAX_QUESTION_LENGTH} 字）')
+    options = [_text(q_data.get('correct_answer'))] + [_text(w) for w in q_data.get('wrong_answers') or []]
+    longest = max(len(opt) for opt in options)
+    if longest > MAX_OPTION_LENGTH:
+        errors.append(f'選項過長（{longest} > {MAX_OPTION_LENGTH} 字）')
+    explanation = _text(q_data.get('explanation'))
+    if len(explanation) > MAX_EXPLANATION_LENGTH:
+        errors.append(f'解釋過長（{len(explanation)} > {MAX_EXPLANATION_LENGTH} 字）')
+    return errors
+
+
+CHECKS = (check_schema, check_language, check_grounding, check_distractors, check_lengths)
+
+
+def validate_all(q_data, conversation):
+    """執行所有驗證，回傳 (是否通過, 錯誤訊息列表)"""
+    errors = []
+    for check in CHECKS:
+        errors.extend(check(q_data, conversation))
+    return not errors, errors
+
+
+def calculate_quality_score(q_data, conversation, errors=None):
+    """
+    0-10 分的品質評分：
+    驗證通過情況 4 分（每個問題扣 1 分）、引用品質 2 分、題目具體性 2 分、選項平衡性 2 分
+    """
+    if errors is None:
+        _, errors = validate_all(q_data, conversation)
+    score = max(0.0, 4.0 - len(errors))
+
+    # 引用品質：引用的原話越完整、越多句在對話中，分數越高
+    text = _conversation_text(conversation)
+    quotes = QUOTE_PATTERN.findall(_text(q_data.get('explanation')))
+    grounded = [quote for quote in quotes if quote in text]
+    if grounded:
+        score += 1.0 + min(1.0, sum(len(quote) for quote in grounded) / 20)
+
+    # 題目具體性：提到對話中的人或用語，且不是過短的泛問
+    question = _text(q_data.get('question'))
+    users = {_text(msg.get('user')) for msg in conversation} - {''}
+    if any(user in question for user in users):
+        score += 1.0
+    score += min(1.0, len(question) / 20)
+
+    # 選項平衡性：錯誤選項與正確答案長度相近，答案不會一眼看出
+    correct_length = len(_text(q_data.get('correct_answer')))
+    wrong_lengths = [len(_text(w)) for w in q_data.get('wrong_answers') or []]
+    if correct_length and wrong_lengths:
+        ratios = [min(n, correct_length) / max(n, correct_length) for n in wrong_lengths]
+        score += 2.0 * sum(ratios) / len(ratios)
+
+    return round(min(10.0, score), 1)
+
+
+def review_digest(question):
+    """題目內容與驗證版本的雜湊；不變時沿用初稿中已算好的結果"""
+    payload = json.dumps([VALIDATOR_VERSION, question.get('question_data'), question.get('conversation')],
+                         ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def has_current_review(question, digest=None):
+    review = question.get('validation')
+    if not isinstance(review, dict) or 'quality_score' not in question:
+        return False
+    return review.get('digest') == (digest or review_digest(question))
+
+
+def _review_chunk(chunk):
+    """行程池工作單元：驗證並評分一批題目（None 表示已有結果）"""
+    results = []
+    for item in chunk:
+        if item is None:
+            results.append(None)
+            continue
+        q_data, conversation = item
+        is_valid, errors = validate_all(q_data, conversation)
+        results.append((is_valid, errors, calculate_quality_score(q_data, conversation, errors)))
+    return results
+
+
+def annotate_questions(questions, jobs=1, chunk_size=DEFAULT_CHUNK_SIZE, force=False):
+    """
+    為初稿題目加上 validation（{'valid', 'errors', 'digest'}）與 quality_score，
+    jobs > 1 時以行程池平行計算；回傳重新計算的題數
+    """
+    digests = [review_digest(q) for q in questions]
+    items = list(zip(questions, digests))
+
+    def payload(item):
+        question, digest = item
+        if not force and has_current_review(question, digest):
+            return None
+        return question.get('question_data') or {}, question.get('conversation') or []
+
+    updated = 0
+    for (question, digest), result in imap_chunks(_review_chunk, items, jobs, chunk_size, payload):
+        if result is None:
+            continue
+        is_valid, errors, score = result
+        question['validation'] = {'valid': is_valid, 'errors': errors, 'digest': digest}
+        question['quality_score'] = score
+        updated += 1
+    return updated
+
+
+def print_summary(questions, min_score=MIN_ACCEPT_SCORE):
+    valid = [q for q in questions if q['validation']['valid']]
+    recommended = [q for q in valid if q['quality_score'] >= min_score]
+    scores = [q['quality_score'] for q in questions]
+    print(f'  驗證通過: {len(valid)}/{len(questions)}')
+    if scores:
+        print(f'  平均品質: {sum(scores) / len(scores):.1f}/10.0')
+    print(f'  建議接受（通過驗證且 ≥ {min_score:g} 分）: {len(recommended)}')
+
+
+def main():
+    """主執行流程"""
+    from generation_pipeline import DRAFT_FILE
+    from question_store import write_json_atomic
+
+    parser = argparse.ArgumentParser(description='審核前預先驗證並評分整份初稿')
+    parser.add_argument('--draft', default=DRAFT_FILE, help='初稿檔案（結果寫回同一檔案）')
+    parser.add_argument('--jobs', type=int, default=0,
+                        help='平行處理的行程數（0 表示使用所有 CPU 核心）')
+    parser.add_argument('--force', action='store_true',
+                        help='忽略已存的結果，全部重新計算')
+    args = parser.parse_args()
+
+    print('=' * 80)
+    print('審核前驗證與品質評分')
+    print('=' * 80)
+    print()
+
+    try:
+        with open(args.draft, 'r', encoding='utf-8') as f:
+            questions = json.load(f)
+    except FileNotFoundError:
+        print(f'錯誤：找不到 {args.draft}')
+        return
+
+    updated = annotate_questions(questions, resolve_jobs(args.jobs), force=args.force)
+    if updated:
+        write_json_atomic(args.draft, questions, indent=2)
+        print(f'✓ 計算 {updated} 道題目，沿用 {len(questions) - updated} 道，已寫回 {args.draft}')
+    else:
+        print(f'⊙ {len(questions)} 道題目的結果皆為最新')
+    print_summary(questions)
+
+
+if __name__ == '__main__':
+    main()
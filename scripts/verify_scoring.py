@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+評分一致性檢查工具
+以原始逐一掃描的實作為基準，確認最佳化後的評分結果完全相同
+"""
+
+import json
+import time
+import argparse
+from collections import defaultdict
+from extract_snippets import (score_conversation, score_conversation_reference,
+                              extract_snippets)
+from browse_dates import filter_valid_messages, score_date, _score_chunk
+from batch_scoring import BACKENDS, PYTHON_BACKEND, check_backend
+
+
+def iter_windows(messages):
+    """列舉所有 2-5 則訊息的視窗"""
+    for length in range(2, min(6, len(messages) + 1)):
+        for start_idx in range(len(messages) - length + 1):
+            yield messages[start_idx:start_idx + length]
+
+
+def score_date_reference(messages):
+    """原始 score_date：逐一切片並重新評分每個視窗"""
+    best_score = -1
+    best_snippet = None
+
+    for window in iter_windows(messages):
+        score, _ = score_conversation_reference(window)
+        if score > best_score:
+            best_score = score
+            best_snippet = window
+
+    if best_snippet is None:
+        best_snippet = messages[:min(4, len(messages))]
+    best_score, tags = score_conversation_reference(best_snippet)
+    return best_score, tags, best_snippet
+
+
+def extract_snippets_reference(by_date, target_count=12):
+    """原始 extract_snippets 的視窗挑選邏輯"""
+    snippets = []
+    for date, messages in by_date.items():
+        valid_msgs = filter_valid_messages(messages)
+        for start_idx in range(len(valid_msgs) - 1):
+            for length in [2, 3, 4, 5]:
+                if start_idx + length <= len(valid_msgs):
+                    snippet = valid_msgs[start_idx:start_idx + length]
+                    score, tags = score_conversation_reference(snippet)
+                    if score > 2:
+                        snippets.append((date, snippet, score, tags))
+
+    snippets.sort(key=lambda x: x[2], reverse=True)
+
+    selected = []
+    used_dates = set()
+    for snippet in snippets:
+        if snippet[0] not in used_dates and len(selected) < target_count:
+            selected.append(snippet)
+            used_dates.add(snippet[0])
+    return selected
+
+
+def check_conversation_scoring(by_date):
+    """比對 score_conversation 與基準實作，回傳 (視窗數, 不一致清單)"""
+    checked = 0
+    mismatches = []
+    for date, messages in by_date.items():
+        for window in iter_windows(messages):
+            checked += 1
+            expected = score_conversation_reference(window)
+            actual = score_conversation(window)
+            if actual != expected:
+                mismatches.append((date, window, expected, actual))
+    return checked, mismatches
+
+
+def check_date_scoring(by_date):
+    """比對 score_date 與基準實作，回傳不一致清單"""
+    mismatches = []
+    for date, messages in by_date.items():
+        valid = filter_valid_messages(messages)
+        if len(valid) < 2:
+            continue
+        expected_score, expected_tags, expected_snippet = score_date_reference(valid)
+        score, tags, snippet = score_date(valid)
+        if (score, set(tags), snippet) != (expected_score, expected_tags, expected_snippet):
+            mismatches.append((date, snippet, (expected_score, expected_tags), (score, set(tags))))
+    return mismatches
+
+
+def check_batch_scoring(by_date, backend):
+    """比對批次評分後端與逐日 score_date，回傳不一致清單"""
+    days = [(date, filter_valid_messages(messages)) for date, messages in by_date.items()]
+    days = [(date, valid) for date, valid in days if len(valid) >= 2]
+    expected = _score_chunk([valid for _, valid in days])
+    actual = _score_chunk([valid for _, valid in days], backend)
+    mismatches = []
+    for (date, valid), exp, act in zip(days, expected, actual):
+        if exp != act:
+            mismatches.append((date, valid[act[2]:act[2] + act[3]], exp, act))
+    return mismatches
+
+
+def check_extract_snippets(filename, by_date, backend=PYTHON_BACKEND):
+    """比對 extract_snippets 與基準實作，回傳不一致清單"""
+    expected = extract_snippets_reference(by_date)
+    actual = extract_snippets(filename, backend=backend)
+    mismatches = []
+    if len(expected) != len(actual):
+        mismatches.append(('-', [], len(expected), len(actual)))
+    for exp, act in zip(expected, actual):
+        date, snippet, score, tags = exp
+        if (date, snippet, score, tags) != (act['date'], act['messages'], act['score'], set(act['tags'])):
+            mismatches.append((date, snippet, (score, tags), (act['score'], set(act['tags']))))
+    return mismatches
+
+
+def report(mismatches):
+    """列印不一致項目，有不一致時結束程式"""
+    if mismatches:
+        print(f'  ✗ 發現 {len(mismatches)} 個不一致')
+        for date, window, expected, actual in mismatches[:10]:
+            print(f'    {date}: 預期 {expected}，實際 {actual}')
+            for msg in window:
+                print(f'      {msg.get("user")}: {msg.get("content")}')
+        raise SystemExit(1)
+    print('  ✓ 結果完全一致')
+
+
+def main():
+    """主執行流程"""
+    parser = argparse.ArgumentParser(description='評分一致性檢查工具')
+    parser.add_argument('file', help='原始對話資料（raw_data/chat_*.json）')
+    parser.add_argument('--backend', default=PYTHON_BACKEND, choices=BACKENDS,
+                        help='額外檢查的批次評分後端')
+    args = parser.parse_args()
+    check_backend(args.backend)
+
+    with open(args.file, 'r', encoding='utf-8') as f:
+        messages = json.load(f)['messages']
+
+    by_date = defaultdict(list)
+    for msg in messages:
+        by_date[msg['date']].append(msg)
+
+    print(f'檢查 score_conversation（{len(by_date)} 個日期）...')
+    start = time.perf_counter()
+    checked, mismatches = check_conversation_scoring(by_date)
+    elapsed = time.perf_counter() - start
+    print(f'  視窗數: {checked}（{elapsed:.2f} 秒）')
+    report(mismatches)
+
+    print('檢查 score_date...')
+    report(check_date_scoring(by_date))
+
+    if args.backend != PYTHON_BACKEND:
+        print(f'檢查 {args.backend} 批次評分...')
+        report(check_batch_scoring(by_date, args.backend))
+
+    print('檢查 extract_snippets...')
+    report(check_extract_snippets(args.file, by_date, args.backend))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+滑動視窗評分引擎
+每則訊息只比對一次關鍵字（位元遮罩），再由相鄰訊息合併出所有 2-5 則訊息視窗的分數
+"""
+
+# 視窗列舉順序（決定同分時誰先勝出）
+LENGTH_MAJOR = 'length'   # 先長度後起點（browse_dates.score_date）
+START_MAJOR = 'start'     # 先起點後長度（extract_snippets.extract_snippets）
+
+MIN_WINDOW = 2
+MAX_WINDOW = 5
+WINDOW_BONUS = 2
+QUESTION_BONUS = 1
+
+
+def window_count(total):
+    """total 則訊息的 2-5 則訊息視窗數"""
+    return sum(max(0, total - length + 1) for length in range(MIN_WINDOW, MAX_WINDOW + 1))
+
+
+class WindowScorer:
+    """以關鍵字位元遮罩計算視窗分數，結果與 score_conversation 相同"""
+
+    def __init__(self, matcher, question_marks=('?', '？')):
+        # 視窗分數 = 各訊息命中關鍵字的聯集，前提是關鍵字不會跨訊息命中
+        for word in matcher.keywords:
+            if ' ' in word:
+                raise ValueError(f'關鍵字不可包含空白: {word!r}')
+
+        self.matcher = matcher
+        self.bits = {word: 1 << i for i, word in enumerate(matcher.keywords)}
+
+        # 依權重分層：分數 = Σ popcount(mask & level_masks[j])
+        self._level_masks = []
+        for level in range(max(matcher.weights.values(), default=0)):
+            level_mask = 0
+            for word, weight in matcher.weights.items():
+                if weight > level:
+                    level_mask |= self.bits[word]
+            self._level_masks.append(level_mask)
+
+        self._tag_masks = []
+        for tag in matcher.tag_order:
+            tag_mask = 0
+            for word in matcher.keywords:
+                if tag in matcher.tags[word]:
+                    tag_mask |= self.bits[word]
+            self._tag_masks.append((tag, tag_mask))
+
+        self._question_mask = 0
+        for mark in question_marks:
+            self._question_mask |= self.bits.get(mark, 0)
+
+        self._score_cache = {}
+
+    def message_mask(self, content):
+        """單則訊息的關鍵字位元遮罩"""
+        mask = 0
+        for word in self.matcher.match(content):
+            mask |= self.bits[word]
+        return mask
+
+    def masks(self, messages):
+        """訊息列表的位元遮罩（每則訊息只掃描一次）"""
+        return [self.message_mask(m.get('content', '')) for m in messages]
+
+    def keyword_score(self, mask):
+        """遮罩的關鍵字分數（含問號加分，不含視窗長度加分）"""
+        score = self._score_cache.get(mask)
+        if score is None:
+            score = sum(bin(mask & level).count('1') for level in self._level_masks)
+            if mask & self._question_mask:
+                score += QUESTION_BONUS
+            self._score_cache[mask] = score
+        return score
+
+    def mask_tags(self, mask):
+        """遮罩命中的標籤集合"""
+        return {tag for tag, tag_mask in self._tag_masks if mask & tag_mask}
+
+    def mask_keywords(self, mask):
+        """遮罩命中的關鍵字集合"""
+        return {word for word, bit in self.bits.items() if mask & bit}
+
+    def iter_windows(self, masks):
+        """列舉所有 2-5 則訊息視窗，產生 (起點, 長度, 分數, 遮罩)"""
+        total = len(masks)
+        for start in range(total - 1):
+            acc = masks[start]
+            for length in range(MIN_WINDOW, min(MAX_WINDOW, total - start) + 1):
+                acc |= masks[start + length - 1]
+                yield start, length, self.keyword_score(acc) + WINDOW_BONUS, acc
+
+    def best_window(self, masks, order=LENGTH_MAJOR):
+        """
+        找出最高分視窗，回傳 (分數, 起點, 長度, 遮罩)；訊息不足 2 則時回傳 None
+
+        同分時依 order 指定的列舉順序取第一個，與原本逐一切片的迴圈一致。
+        """
+        best = None
+        best_key = None
+        for start, length, score, mask in self.iter_windows(masks):
+            if order == LENGTH_MAJOR:
+                key = (score, -length, -start)
+            else:
+                key = (score, -start, -length)
+            if best_key is None or key > best_key:
+                best_key = key
+                best = (score, start, length, mask)
+        return best